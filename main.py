@@ -1,19 +1,72 @@
+import time
+# Marca de arranque del proceso, antes de las importaciones pesadas, para medir el arranque en frío
+INICIO_PROCESO = time.perf_counter()
 import logging
 from datetime import datetime
 import traceback
 import platform
 import os
+import argparse
+import signal
+import queue
+import threading
 import psutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import variables_globales as vg
 from utilidades.limpieza import cerrarProcesos as Limpieza
 from modulos.bot_00_configuracion import bot_run as Bot_00_Configuracion
 from modulos.bot_01_ci_bcp import bot_run as Bot_01_CI_BCP
+from modulos.bot_01_ci_bcp import etapa_descarga as Bot_01_Descarga, etapa_entrega as Bot_01_Entrega
 from modulos.bot_02_bbva_ci_soles import bot_run as Bot_02_CI_BBVA_SOLES
+from modulos.bot_02_bbva_ci_soles import etapa_descarga as Bot_02_Descarga, etapa_entrega as Bot_02_Entrega
 from modulos.bot_03_bbva_ci_dolares import bot_run as Bot_03_CI_BBVA_DOLARES
+from modulos.bot_03_bbva_ci_dolares import etapa_descarga as Bot_03_Descarga, etapa_entrega as Bot_03_Entrega
+from modulos.bot_04_bbva_ci_cuentas import bot_run as Bot_04_CI_BBVA
+from modulos.bot_04_bbva_ci_cuentas import etapa_descarga as Bot_04_Descarga, etapa_entrega as Bot_04_Entrega
+from modulos.bbva_netcash import sesion_unica
+from modulos.backfill import BANCOS_BACKFILL, ejecutar_backfill, parsear_fecha
 from utilidades.notificaiones_whook import WebhookNotifier
+from utilidades.logger import init_logger
+from utilidades.limpieza import cerrar_chrome_tras_error
+from utilidades.planificador import Planificador
+from utilidades.navegador import precalentar_pools, metricas_pools, cerrar_pools
+from utilidades.metricas import registrar_resumenes
+from utilidades.reintentos import configurar_presupuesto
+from utilidades.trazas import span, exportar_eventos, incorporar_eventos, guardar_traza
 
 logger = logging.getLogger("Main - Orquestador")
 
+# Bots que ejecuta el orquestador, en orden
+BOTS = [
+    ("Bot 01 - BCP", Bot_01_CI_BCP),
+    ("Bot 02 - BBVA Soles", Bot_02_CI_BBVA_SOLES),
+    ("Bot 03 - BBVA Dólares", Bot_03_CI_BBVA_DOLARES),
+]
+
+# Etapas de cada bot para el modo pipeline: (nombre, descarga, entrega)
+ETAPAS_BOTS = [
+    ("Bot 01 - BCP", Bot_01_Descarga, Bot_01_Entrega),
+    ("Bot 02 - BBVA Soles", Bot_02_Descarga, Bot_02_Entrega),
+    ("Bot 03 - BBVA Dólares", Bot_03_Descarga, Bot_03_Entrega),
+]
+
+# Con [bbva] sesion_unica, Bot 04 reemplaza a Bot 02 y Bot 03: todas las cuentas BBVA en un solo login
+BOTS_SESION_UNICA = [
+    ("Bot 01 - BCP", Bot_01_CI_BCP),
+    ("Bot 04 - BBVA", Bot_04_CI_BBVA),
+]
+
+ETAPAS_SESION_UNICA = [
+    ("Bot 01 - BCP", Bot_01_Descarga, Bot_01_Entrega),
+    ("Bot 04 - BBVA", Bot_04_Descarga, Bot_04_Entrega),
+]
+
+def bots_configurados(cfg):
+    return BOTS_SESION_UNICA if sesion_unica(cfg) else BOTS
+
+def etapas_configuradas(cfg):
+    return ETAPAS_SESION_UNICA if sesion_unica(cfg) else ETAPAS_BOTS
+
 def obtener_info_sistema():
     """
     Recopila información del sistema para diagnóstico.
@@ -36,10 +89,160 @@ def obtener_info_sistema():
         logger.warning(f"No se pudo obtener información completa del sistema: {e}")
         return {"error": str(e)}
 
-def main():
-    inicio = datetime.now()
-    
-    # Limpieza de ambiente
+def ejecutar_bot_en_proceso(bot_name, bot_function, cfg, mensaje):
+    """
+    Ejecuta un bot dentro de un proceso trabajador del modo paralelo.
+
+    Args:
+        bot_name (str): Nombre del bot
+        bot_function (callable): Función bot_run del bot
+        cfg: Configuración cargada
+        mensaje (str): Mensaje inicial para el bot
+
+    Returns:
+        tuple: (bot_name, resultado, mensaje, segundos, eventos de traza del proceso)
+    """
+    # En plataformas que usan 'spawn' el proceso hijo no hereda la configuración del logger
+    if not logging.getLogger().handlers:
+        init_logger(ruta_log=cfg["archivos"]["archivos_log"], nivel=logging.INFO)
+
+    configurar_presupuesto(cfg)
+    inicio_bot = time.perf_counter()
+    try:
+        with span(bot_name, "orquestador", modo="paralelo"):
+            resultado, mensaje = bot_function(cfg, mensaje)
+    except Exception as e:
+        logger.error(f"{bot_name} terminó con excepción en el proceso {os.getpid()}: {e}")
+        resultado, mensaje = False, str(e)
+    finally:
+        # Los navegadores del pool pertenecen a este proceso trabajador
+        logger.info(f"Métricas del pool de navegadores ({bot_name}): {metricas_pools()}")
+        registrar_resumenes(bot_name)
+        cerrar_pools()
+    return bot_name, resultado, mensaje, time.perf_counter() - inicio_bot, exportar_eventos()
+
+def ejecutar_bots_secuencial(cfg, webhook):
+    """
+    Ejecuta los bots uno tras otro, pasando el mensaje de cada bot al siguiente.
+
+    Returns:
+        dict: Segundos de ejecución por bot
+    """
+    tiempos = {}
+    mensaje = ""
+    for bot_name, bot_function in bots_configurados(cfg):
+        logger.info(f"==================== INICIANDO {bot_name} ====================")
+        webhook.send_notification(f"Iniciando {bot_name}")
+        inicio_bot = time.perf_counter()
+        with span(bot_name, "orquestador", modo="secuencial"):
+            resultado, mensaje = bot_function(cfg, mensaje)
+        tiempos[bot_name] = time.perf_counter() - inicio_bot
+        logger.info(f"{bot_name} completado exitosamente en {tiempos[bot_name]:.1f} s")
+        webhook.send_notification(f"{bot_name} completado exitosamente")
+        if not resultado:
+            logger.error(f"{bot_name} completado con errores: {mensaje}")
+            webhook.send_notification(f"{bot_name} completado con errores: {mensaje}")
+    return tiempos
+
+def ejecutar_bots_paralelo(cfg, webhook):
+    """
+    Ejecuta cada bot en su propio proceso, con su propio Chrome, carpeta de descarga y perfil.
+
+    Returns:
+        dict: Segundos de ejecución por bot
+    """
+    max_procesos = int(cfg['orquestacion']['max_procesos'])
+    bots = bots_configurados(cfg)
+    logger.info(f"Modo paralelo: {len(bots)} bots con hasta {max_procesos} procesos")
+    tiempos = {}
+    with ProcessPoolExecutor(max_workers=max_procesos) as executor:
+        futuros = []
+        for bot_name, bot_function in bots:
+            logger.info(f"==================== INICIANDO {bot_name} (paralelo) ====================")
+            webhook.send_notification(f"Iniciando {bot_name}")
+            futuros.append(executor.submit(ejecutar_bot_en_proceso, bot_name, bot_function, cfg, ""))
+
+        for futuro in as_completed(futuros):
+            bot_name, resultado, mensaje, segundos, eventos = futuro.result()
+            incorporar_eventos(eventos)
+            tiempos[bot_name] = segundos
+            logger.info(f"{bot_name} completado en {segundos:.1f} s")
+            webhook.send_notification(f"{bot_name} completado en {segundos:.1f} s")
+            if not resultado:
+                logger.error(f"{bot_name} completado con errores: {mensaje}")
+                webhook.send_notification(f"{bot_name} completado con errores: {mensaje}")
+    return tiempos
+
+def ejecutar_bots_pipeline(cfg, webhook):
+    """
+    Ejecuta los bots como un pipeline de dos etapas unidas por una cola. El hilo principal
+    hace las descargas con el navegador, bot tras bot, y un hilo de entrega sube cada archivo
+    a Google Drive y GESCOM mientras el siguiente bot ya está haciendo login y navegando.
+
+    Returns:
+        dict: Segundos de ejecución por etapa de cada bot
+    """
+    cola_entregas = queue.Queue()
+    tiempos = {}
+
+    def trabajador_entregas():
+        while True:
+            item = cola_entregas.get()
+            if item is None:
+                break
+            bot_name, entrega, ruta_archivo = item
+            logger.info(f"[entrega] Iniciando entrega de {bot_name}")
+            inicio_entrega = time.perf_counter()
+            try:
+                with span(f"{bot_name} (entrega)", "orquestador", modo="pipeline"):
+                    resultado, mensaje = entrega(cfg, ruta_archivo)
+            except Exception as e:
+                logger.error(f"[entrega] Excepción en la entrega de {bot_name}: {e}")
+                resultado, mensaje = False, str(e)
+            tiempos[f"{bot_name} (entrega)"] = time.perf_counter() - inicio_entrega
+            if resultado:
+                logger.info(f"[entrega] {bot_name} completado exitosamente")
+                webhook.send_notification(f"{bot_name} completado exitosamente")
+            else:
+                logger.error(f"[entrega] {bot_name} completado con errores: {mensaje}")
+                webhook.send_notification(f"{bot_name} completado con errores: {mensaje}")
+
+    hilo_entregas = threading.Thread(target=trabajador_entregas, name="entregas", daemon=True)
+    hilo_entregas.start()
+    try:
+        for bot_name, descarga, entrega in etapas_configuradas(cfg):
+            logger.info(f"==================== INICIANDO {bot_name} (pipeline) ====================")
+            webhook.send_notification(f"Iniciando {bot_name}")
+            inicio_descarga = time.perf_counter()
+            try:
+                with span(f"{bot_name} (descarga)", "orquestador", modo="pipeline"):
+                    descargado = descarga(cfg)
+            except Exception as e:
+                logger.error(f"[descarga] Excepción en la descarga de {bot_name}: {e}")
+                cerrar_chrome_tras_error(cfg)
+                descargado = False
+            tiempos[f"{bot_name} (descarga)"] = time.perf_counter() - inicio_descarga
+
+            if descargado:
+                logger.info(f"[descarga] {bot_name} descargado, encolando entrega")
+                cola_entregas.put((bot_name, entrega, descargado))
+            elif descargado is None:
+                # Consulta sin movimientos (Bot 02/03): no es un error y no hay nada que entregar
+                logger.info(f"[descarga] {bot_name} sin movimientos para descargar, no se encola entrega")
+                webhook.send_notification(f"{bot_name}: Sin movimientos para descargar")
+            else:
+                logger.error(f"[descarga] {bot_name} sin archivo descargado, no se encola entrega")
+                webhook.send_notification(f"{bot_name} completado con errores: descarga no exitosa")
+    finally:
+        # Señal de fin para el hilo de entregas y espera a que vacíe la cola
+        cola_entregas.put(None)
+        hilo_entregas.join()
+    return tiempos
+
+def limpiar_ambiente():
+    """
+    Cierra los procesos de Chrome, ChromeDriver y Excel que hayan quedado de ejecuciones anteriores.
+    """
     # Definir lista de procesos a cerrar según el sistema operativo
     if platform.system() == "Windows":
         lista_procesos = ["chrome.exe", "chromedriver.exe", "excel.exe"]
@@ -51,6 +254,46 @@ def main():
         lista_procesos = []
     Limpieza(lista_procesos)
 
+def ejecutar_ciclo(cfg, webhook):
+    """
+    Ejecuta los bots según el modo configurado y registra el resumen de tiempos.
+
+    Args:
+        cfg: Configuración cargada
+        webhook (WebhookNotifier): Notificador de webhook
+    """
+    modo = cfg['orquestacion']['modo']
+    configurar_presupuesto(cfg)
+    inicio_bots = time.perf_counter()
+    with span("ciclo", "orquestador", modo=modo):
+        if modo != "paralelo":
+            # Lanza los navegadores en segundo plano; el de BBVA queda listo mientras trabaja el BCP
+            precalentar_pools(cfg, ["bcp", "bbva"])
+        if modo == "paralelo":
+            tiempos = ejecutar_bots_paralelo(cfg, webhook)
+        elif modo == "pipeline":
+            tiempos = ejecutar_bots_pipeline(cfg, webhook)
+        else:
+            tiempos = ejecutar_bots_secuencial(cfg, webhook)
+    tiempo_bots = time.perf_counter() - inicio_bots
+
+    # Resumen de tiempos: la suma por bot es lo que costaría la ejecución secuencial
+    suma_bots = sum(tiempos.values())
+    for bot_name, segundos in tiempos.items():
+        logger.info(f"Tiempo {bot_name}: {segundos:.1f} s")
+    logger.info(f"Modo {modo}: tiempo de pared {tiempo_bots:.1f} s, suma por bot {suma_bots:.1f} s, "
+                f"aceleración x{suma_bots / tiempo_bots if tiempo_bots else 1:.2f}")
+    if modo != "paralelo":
+        logger.info(f"Métricas del pool de navegadores: {metricas_pools()}")
+        registrar_resumenes()
+    guardar_traza(cfg)
+
+def main():
+    inicio = datetime.now()
+
+    # Limpieza de ambiente
+    limpiar_ambiente()
+
     logger.info(f"==================== INICIO DE ORQUESTACIÓN ====================")
     logger.info(f"Inicio de orquestación - {inicio.strftime('%Y-%m-%d %H:%M:%S')}")
 
@@ -74,21 +317,7 @@ def main():
         webhook.send_notification("Iniciando proceso de orquestación de bots")
 
         # Ejecución de los bots
-        mensaje = ""  # Initialize mensaje variable
-        for bot_name, bot_function in [
-            ("Bot 01 - BCP", Bot_01_CI_BCP),
-            ("Bot 02 - BBVA Soles", Bot_02_CI_BBVA_SOLES),
-            ("Bot 03 - BBVA Dólares", Bot_03_CI_BBVA_DOLARES),
-            
-        ]:
-            logger.info(f"==================== INICIANDO {bot_name} ====================")
-            webhook.send_notification(f"Iniciando {bot_name}")
-            resultado, mensaje = bot_function(cfg, mensaje)
-            logger.info(f"{bot_name} completado exitosamente")
-            webhook.send_notification(f"{bot_name} completado exitosamente")
-            if not resultado:
-                logger.error(f"{bot_name} completado con errores: {mensaje}")
-                webhook.send_notification(f"{bot_name} completado con errores: {mensaje}")
+        ejecutar_ciclo(cfg, webhook)
 
     except Exception as e:
         error_msg = f"Error en main: {str(e)}"
@@ -97,6 +326,7 @@ def main():
         webhook.send_notification(error_msg)
 
     finally:
+        cerrar_pools()
         # Calcular tiempo total de ejecución
         fin = datetime.now()
         tiempo_total = fin - inicio
@@ -106,5 +336,101 @@ def main():
         logger.info("Fin del proceso ...")
         webhook.send_notification(f"Proceso finalizado. Tiempo total: {tiempo_total}")
 
+def main_residente():
+    """
+    Modo residente: limpia el ambiente y carga la configuración una sola vez, y ejecuta ciclos
+    según la sección [residente] (intervalo o expresión cron). La configuración, la ruta de
+    ChromeDriver, los navegadores del pool y los clientes de Google quedan cargados entre ciclos.
+    """
+    limpiar_ambiente()
+
+    cfg = Bot_00_Configuracion()
+    if not cfg:
+        logger.error("Error al cargar la configuración. Abortando modo residente.")
+        vg.system_exception = True
+        return
+
+    logger.info(f"==================== INICIO DE MODO RESIDENTE ====================")
+    logger.info(f"Información del sistema: {obtener_info_sistema()}")
+    webhook = WebhookNotifier(cfg['env_vars']['webhook_rpa_url'])
+
+    def ciclo():
+        numero = planificador.numero_ciclo
+        inicio_ciclo = time.perf_counter()
+        # El primer ciclo paga importaciones, limpieza de procesos y carga de configuración
+        if numero == 1:
+            tipo_arranque = "frío"
+            arranque = inicio_ciclo - INICIO_PROCESO
+        else:
+            tipo_arranque = "caliente"
+            arranque = 0.0
+        logger.info(f"==================== INICIO DE CICLO {numero} (arranque en {tipo_arranque}) ====================")
+        webhook.send_notification(f"Iniciando ciclo {numero} del modo residente")
+        try:
+            ejecutar_ciclo(cfg, webhook)
+        except Exception as e:
+            logger.error(f"Error en ciclo {numero}: {e}")
+            logger.error(traceback.format_exc())
+            webhook.send_notification(f"Error en ciclo {numero}: {e}")
+        duracion = time.perf_counter() - inicio_ciclo
+        logger.info(f"Ciclo {numero} (arranque en {tipo_arranque}): arranque {arranque:.1f} s, "
+                    f"ejecución {duracion:.1f} s, total {arranque + duracion:.1f} s")
+        webhook.send_notification(f"Ciclo {numero} finalizado. Tiempo total: {arranque + duracion:.1f} s")
+
+    planificador = Planificador(
+        ciclo,
+        intervalo_minutos=cfg['residente']['intervalo_minutos'],
+        expresion_cron=cfg['residente']['cron'],
+    )
+    signal.signal(signal.SIGINT, planificador.detener)
+    signal.signal(signal.SIGTERM, planificador.detener)
+    try:
+        planificador.iniciar()
+    finally:
+        cerrar_pools()
+
+def main_backfill(desde, hasta, bancos=None):
+    """
+    Modo backfill: recupera los movimientos de un rango de fechas de cada banco, repartiendo los
+    tramos entre varios navegadores según la sección [backfill], y los entrega a GESCOM.
+    """
+    limpiar_ambiente()
+
+    cfg = Bot_00_Configuracion()
+    if not cfg:
+        logger.error("Error al cargar la configuración. Abortando backfill.")
+        vg.system_exception = True
+        return
+
+    logger.info(f"==================== INICIO DE BACKFILL {desde} - {hasta} ====================")
+    webhook = WebhookNotifier(cfg['env_vars']['webhook_rpa_url'])
+    webhook.send_notification(f"Iniciando backfill del {desde} al {hasta}")
+    try:
+        with span("backfill", "orquestador", desde=str(desde), hasta=str(hasta)):
+            resumen = ejecutar_backfill(cfg, desde, hasta, bancos, webhook)
+        logger.info(f"Resumen del backfill: {resumen}")
+    except Exception as e:
+        logger.error(f"Error en backfill: {e}")
+        logger.error(traceback.format_exc())
+        webhook.send_notification(f"Error en backfill: {e}")
+    finally:
+        logger.info(f"Métricas del pool de navegadores: {metricas_pools()}")
+        registrar_resumenes()
+        guardar_traza(cfg)
+        cerrar_pools()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Orquestador de bots de cash-in BCP y BBVA")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Ejecutar en modo residente según la sección [residente] de config.ini")
+    parser.add_argument("--backfill", nargs=2, type=parsear_fecha, metavar=("DESDE", "HASTA"),
+                        help="Recuperar los movimientos de un rango de fechas (AAAA-MM-DD, ambas incluidas)")
+    parser.add_argument("--bancos", nargs="+", choices=sorted(BANCOS_BACKFILL),
+                        help="Bancos del backfill; por defecto todos")
+    args = parser.parse_args()
+    if args.backfill:
+        main_backfill(*args.backfill, bancos=args.bancos)
+    elif args.daemon:
+        main_residente()
+    else:
+        main()
\ No newline at end of file
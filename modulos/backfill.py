@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from utilidades.navegador import obtener_pool
+from utilidades.reintentos import configurar_presupuesto
+from utilidades.trazas import span
+from modulos.bot_01_ci_bcp import bcp_cash_in_descarga_txt, etapa_entrega as bcp_entrega
+from modulos.bot_04_bbva_ci_cuentas import etapa_entrega as bbva_entrega
+from modulos.bbva_netcash import cuentas_configuradas, descargar_cuentas
+
+logger = logging.getLogger("Backfill")
+
+# Recuperación de días que GESCOM no recibió: el rango se parte en tramos que el portal acepta en
+# una sola consulta, los tramos se reparten entre varios navegadores por banco y cada tramo se
+# entrega por el camino normal (Google Drive + GESCOM).
+# Uso: python main.py --backfill 2026-03-01 2026-03-31 [--bancos bcp bbva]
+
+def _clave_sesion(banco):
+    # Una sesión guardada por hilo del ejecutor: los navegadores simultáneos de un banco no se
+    # restauran ni sobrescriben las cookies entre sí, y cada hilo reutiliza la suya en sus tramos
+    return f"{banco}_{threading.current_thread().name}"
+
+def _descargar_bcp(cfg, desde, hasta):
+    return bcp_cash_in_descarga_txt(cfg, desde, hasta, clave_sesion=_clave_sesion("bcp"))
+
+def _descargar_bbva(cfg, desde, hasta):
+    return descargar_cuentas(cfg, cuentas_configuradas(cfg), cfg['rutas']['ruta_input_bbva'], desde, hasta,
+                             clave_sesion=_clave_sesion("bbva"))
+
+# Banco → (descarga del tramo, entrega del resultado); la entrega es la misma de Bot 01 y Bot 04
+BANCOS_BACKFILL = {
+    "bcp": (_descargar_bcp, bcp_entrega),
+    "bbva": (_descargar_bbva, bbva_entrega),
+}
+
+def parsear_fecha(texto):
+    """
+    Returns:
+        date: Fecha en formato AAAA-MM-DD
+    """
+    return datetime.strptime(texto, "%Y-%m-%d").date()
+
+def dividir_rango(desde, hasta, dias_por_tramo):
+    """
+    Parte el rango [desde, hasta] (ambos incluidos) en tramos consecutivos de hasta dias_por_tramo días.
+
+    Returns:
+        list: Tuplas (desde, hasta) de cada tramo
+    """
+    dias_por_tramo = max(1, int(dias_por_tramo))
+    tramos = []
+    inicio = desde
+    while inicio <= hasta:
+        fin = min(inicio + timedelta(days=dias_por_tramo - 1), hasta)
+        tramos.append((inicio, fin))
+        inicio = fin + timedelta(days=1)
+    return tramos
+
+def _dias(tramo):
+    return (tramo[1] - tramo[0]).days + 1
+
+class _Progreso:
+    """
+    Avance de un banco: tramos y días completados y ritmo en días por minuto.
+    """
+
+    def __init__(self, banco, tramos):
+        self.banco = banco
+        self.total_tramos = len(tramos)
+        self.total_dias = sum(_dias(t) for t in tramos)
+        self.dias = 0
+        self.terminados = 0
+        self.fallidos = []
+        self.inicio = time.perf_counter()
+        self.bloqueo = threading.Lock()
+
+    def registrar(self, tramo, exito, mensaje):
+        with self.bloqueo:
+            self.terminados += 1
+            if exito:
+                self.dias += _dias(tramo)
+            else:
+                self.fallidos.append(tramo)
+            logger.info(f"Backfill {self.banco} {tramo[0]:%d/%m/%Y}-{tramo[1]:%d/%m/%Y}: "
+                        f"{'ok' if exito else 'con errores'} ({mensaje}). "
+                        f"{self.terminados}/{self.total_tramos} tramos, {self.dias}/{self.total_dias} días, "
+                        f"{self.dias_por_minuto():.2f} días/min")
+
+    def dias_por_minuto(self):
+        minutos = (time.perf_counter() - self.inicio) / 60
+        return self.dias / minutos if minutos else 0.0
+
+    def resumen(self):
+        return {
+            "tramos": self.total_tramos,
+            "dias": self.dias,
+            "dias_totales": self.total_dias,
+            "minutos": round((time.perf_counter() - self.inicio) / 60, 2),
+            "dias_por_minuto": round(self.dias_por_minuto(), 2),
+            "tramos_fallidos": [f"{d:%Y-%m-%d} {h:%Y-%m-%d}" for d, h in self.fallidos],
+        }
+
+def _procesar_tramo(cfg, banco, tramo):
+    """
+    Descarga y entrega un tramo de un banco en un navegador del pool.
+
+    Returns:
+        tuple: (exito, mensaje)
+    """
+    descargar, entregar = BANCOS_BACKFILL[banco]
+    with span(f"backfill {banco} {tramo[0]:%Y-%m-%d}", "backfill", hasta=f"{tramo[1]:%Y-%m-%d}"):
+        resultados = descargar(cfg, *tramo)
+        if not resultados:
+            return False, "login o descarga no exitosa"
+        # Los rangos pasados se entregan completos: la marca de agua solo sigue el día en curso
+        return entregar(cfg, resultados, incremental=False)
+
+def ejecutar_backfill(cfg, desde, hasta, bancos=None, webhook=None):
+    """
+    Descarga y entrega los movimientos de [desde, hasta] de cada banco. Cada banco parte el rango
+    según '<banco>_dias_por_tramo' y procesa sus tramos con hasta '<banco>_concurrencia' navegadores
+    simultáneos (cada uno con su propio login y su propia sesión guardada), según la sección [backfill].
+
+    Args:
+        cfg: Configuración cargada
+        desde (date): Primer día del rango
+        hasta (date): Último día del rango (incluido)
+        bancos (list): Bancos a recuperar; por defecto todos los de BANCOS_BACKFILL
+        webhook (WebhookNotifier): Notificador para el avance
+
+    Returns:
+        dict: Resumen por banco (días, minutos, días por minuto y tramos fallidos para repetir)
+
+    Raises:
+        ValueError: Si el rango está invertido o termina en el futuro
+    """
+    if desde > hasta:
+        raise ValueError(f"Rango de backfill inválido: {desde} es posterior a {hasta}")
+    if hasta > date.today():
+        raise ValueError(f"Rango de backfill inválido: {hasta} es una fecha futura")
+    bancos = bancos or list(BANCOS_BACKFILL)
+    seccion = cfg['backfill']
+    planes = {banco: dividir_rango(desde, hasta, seccion[f"{banco}_dias_por_tramo"]) for banco in bancos}
+    # Cada tramo cuenta con el presupuesto de reintentos de una ejecución normal
+    configurar_presupuesto(cfg, factor=sum(len(tramos) for tramos in planes.values()))
+
+    progresos, ejecutores, futuros = {}, [], {}
+    try:
+        for banco, tramos in planes.items():
+            concurrencia = min(max(1, int(seccion[f"{banco}_concurrencia"])), len(tramos))
+            # El pool del banco admite tantos navegadores como sesiones simultáneas del backfill
+            obtener_pool(cfg, banco, tamano=concurrencia)
+            progresos[banco] = _Progreso(banco, tramos)
+            logger.info(f"Backfill {banco}: {_dias((desde, hasta))} días en {len(tramos)} tramos, "
+                        f"{concurrencia} navegadores simultáneos")
+            ejecutor = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix=f"backfill-{banco}")
+            ejecutores.append(ejecutor)
+            for tramo in tramos:
+                futuros[ejecutor.submit(_procesar_tramo, cfg, banco, tramo)] = (banco, tramo)
+
+        for futuro in as_completed(futuros):
+            banco, tramo = futuros[futuro]
+            try:
+                exito, mensaje = futuro.result()
+            except Exception as e:
+                logger.error(f"Excepción en el backfill {banco} {tramo[0]}-{tramo[1]}: {e}")
+                exito, mensaje = False, str(e)
+            progresos[banco].registrar(tramo, exito, mensaje)
+            if not exito and webhook:
+                webhook.send_notification(f"Backfill {banco} {tramo[0]:%d/%m/%Y}-{tramo[1]:%d/%m/%Y} con errores: {mensaje}")
+    finally:
+        for ejecutor in ejecutores:
+            ejecutor.shutdown(wait=True)
+
+    resumen = {banco: progreso.resumen() for banco, progreso in progresos.items()}
+    for banco, datos in resumen.items():
+        logger.info(f"Backfill {banco} terminado: {datos}")
+        if webhook:
+            webhook.send_notification(f"Backfill {banco}: {datos['dias']}/{datos['dias_totales']} días en "
+                                      f"{datos['minutos']} min ({datos['dias_por_minuto']} días/min), "
+                                      f"tramos fallidos: {datos['tramos_fallidos'] or 'ninguno'}")
+    return resumen
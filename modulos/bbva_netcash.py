@@ -0,0 +1,446 @@
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+import time
+from datetime import datetime
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.common.action_chains import ActionChains
+import logging
+import base64
+from pathlib import Path
+import requests
+from utilidades.google_drive import obtener_uploader
+from utilidades.navegador import obtener_pool
+from utilidades.sesiones import iniciar_sesion
+from utilidades.esperas import MotorEsperas
+from utilidades.localizador import Localizador
+from utilidades.paginas import esperar_pagina, navegar, recargar
+from utilidades.reintentos import PresupuestoAgotado, crear_politica
+from utilidades.trazas import span, trazar
+from utilidades.hibrido import ExportacionPendiente, descarga_directa, descarga_por_enlace, hibrido_habilitado, reanudar_descarga
+from utilidades.incremental import filtrar_nuevas
+from utilidades.entregas import verificar_entrega
+
+logger = logging.getLogger("BBVA Netcash")
+
+# Formato del archivo en GESCOM (también identifica las entregas en el libro de entregas)
+FORMATO_GESCOM = "Bbva_Recaudación"
+
+# Formato de los campos fecini/fecfin de la consulta
+FORMATO_FECHA = "%d/%m/%Y"
+
+# Motor común de BBVA Netcash: login, menú Cobros → Recaudos pagados y descarga del TXT de cada cuenta.
+# Lo usan Bot 02 y Bot 03 (una cuenta por sesión) y Bot 04 (todas las cuentas en un solo login).
+
+def cuentas_configuradas(cfg):
+    """
+    Returns:
+        list: Alias de las cuentas de [bbva] cuentas (ej. ['soles', 'dolares'])
+    """
+    cuentas = cfg['bbva']['cuentas']
+    if isinstance(cuentas, str):
+        cuentas = [c.strip() for c in cuentas.split(",")]
+    return [c for c in cuentas if c]
+
+def sesion_unica(cfg):
+    return str(cfg['bbva']['sesion_unica']).lower() == "true"
+
+@trazar(categoria="bbva")
+def login(driver, cfg):
+    """
+    Realiza el proceso de login en BBVA Netcash. Si falla, lanza una excepción.
+    """
+    try:
+        logger.info("Iniciando login BBVA Netcash")
+        wait = WebDriverWait(driver, 15)
+        esperas = MotorEsperas(driver)
+
+        # Limpiar cookies y storage
+        driver.delete_all_cookies()
+        navegar(driver, "bbva_login", timeout=20, obligatoria=False)
+        driver.execute_script("window.localStorage.clear();")
+        driver.execute_script("window.sessionStorage.clear();")
+
+        # Ingresar código de empresa - esperar que esté presente y sea clickeable
+        company_code_input = wait.until(
+            EC.element_to_be_clickable((By.XPATH, "//input[@name='cod_emp']"))
+        )
+        company_code_input.clear()
+        company_code_input.send_keys(cfg['env_vars']['bbva']['code'])
+        esperas.esperar("bbva_codigo_empresa", lambda d: company_code_input.get_attribute("value"), timeout=5, presupuesto=1)
+
+        # Ingresar código de usuario - esperar que esté presente y sea clickeable
+        user_code_input = wait.until(
+            EC.element_to_be_clickable((By.XPATH, "//input[@name='cod_usu']"))
+        )
+        user_code_input.clear()
+        user_code_input.send_keys(cfg['env_vars']['bbva']['user'])
+        esperas.esperar("bbva_codigo_usuario", lambda d: user_code_input.get_attribute("value"), timeout=5, presupuesto=1)
+
+        # Ingresar contraseña - esperar que esté presente y sea clickeable
+        password_input = wait.until(
+            EC.element_to_be_clickable((By.XPATH, "//input[@name='eai_password']"))
+        )
+        password_input.clear()
+        password_input.send_keys(cfg['env_vars']['bbva']['password'])
+        esperas.esperar("bbva_password", lambda d: password_input.get_attribute("value"), timeout=5, presupuesto=3)
+
+        # Click en Ingresar - esperar que el botón esté clickeable
+        login_button = wait.until(
+            EC.element_to_be_clickable((By.XPATH, "//button[text()='Ingresar']"))
+        )
+        driver.execute_script("arguments[0].click();", login_button)
+        esperas.esperar("bbva_formulario_enviado", EC.staleness_of(login_button), timeout=30, presupuesto=5)
+        esperas.red_inactiva("bbva_post_login", timeout=30, presupuesto=5)
+
+        # Refrescar después del login
+        recargar(driver, "bbva_inicio", timeout=30, obligatoria=False)
+
+        logger.info("Login exitoso en BBVA Netcash")
+
+    except Exception as e:
+        logger.error(f"Error durante el login BBVA Netcash: {e}")
+        raise e
+
+def sesion_activa(driver):
+    """
+    Sonda de sesión restaurada: está autenticada si carga la plantilla de la aplicación con el menú lateral.
+    """
+    return esperar_pagina(driver, "bbva_inicio", timeout=10, obligatoria=False) is not None
+
+@trazar(categoria="bbva")
+def select_charges(driver):
+    logger.info("Seleccionando menú de cobros en la interfaz BBVA.")
+    esperas = MotorEsperas(driver)
+    charges_menu_item = Localizador(driver).buscar(
+        "bbva_menu_cobros", "bbva-btge-sidebar-menu >>> bbva-web-navigation-menu-item[icon='bbva:paysheetdollar']", timeout=20
+    )
+    charges_menu_item.click()
+    esperas.elemento_presente(
+        "bbva_pagina_cobros", (By.CSS_SELECTOR, "bbva-btge-menurization-landing-solution-page"), timeout=20, presupuesto=3, obligatoria=True
+    )
+    logger.info("Menú de cobros seleccionado.")
+
+@trazar(categoria="bbva")
+def select_paid_collection(driver):
+    logger.info("Seleccionando opción 'Recaudos pagados'.")
+    # Menú dentro del iframe de la página de soluciones; deja el driver en ese iframe
+    link_element = Localizador(driver).buscar(
+        "bbva_recaudos_pagados",
+        "bbva-btge-menurization-landing-solution-page >>> bbva-core-iframe >>> iframe"
+        " >>> bbva-btge-menurization-landing-solution-home-page >>> bbva-web-link:texto(Recaudos pagados)",
+        timeout=20,
+    )
+    logger.info("Encontrado enlace 'Recaudos pagados', haciendo clic.")
+    driver.execute_script("arguments[0].click();", link_element)
+
+    # Esperar que la lista de cuentas se cargue
+    driver.switch_to.default_content()
+    esperar_pagina(driver, "bbva_legacy", timeout=20, obligatoria=False)
+    logger.info("Opción 'Recaudos pagados' seleccionada.")
+
+@trazar(categoria="bbva")
+def download_txt(driver, descargas, cuenta, hibrido=False, desde=None, hasta=None):
+    """
+    Desde la lista de cuentas de Recaudos pagados, consulta los movimientos de la cuenta
+    (por defecto, los del día) y descarga el TXT.
+
+    Args:
+        driver (webdriver.Chrome): Driver con la lista de cuentas cargada
+        descargas (SeguidorDescargas): Descargas de la sesión
+        cuenta (str): Texto del enlace de la cuenta (ej. 'LIGO- LA MAGICA SOLES')
+        hibrido (bool): Intentar bajar el enlace de descarga por HTTP antes de hacer clic
+        desde (date): Fecha inicial de la consulta; por defecto, la que propone el portal (hoy)
+        hasta (date): Fecha final de la consulta; por defecto, igual a desde
+
+    Returns:
+        Path: Archivo descargado, o None si la consulta no tiene movimientos
+    """
+    logger.info(f"Iniciando descarga del TXT de la cuenta {cuenta}.")
+    esperas = MotorEsperas(driver)
+
+    driver.switch_to.default_content()
+
+    # Steps 1-3: legacy-page >>> bbva-core-iframe >>> iframe#bbvaIframe, resueltos en una sola llamada
+    Localizador(driver).entrar_frame("bbva_iframe_legacy", "legacy-page >>> bbva-core-iframe >>> iframe", timeout=20)
+    logger.debug("Dentro del iframe #bbvaIframe.")
+
+    # Step 4: esperar iframe#kyop-central-load-area y cambiar a él
+    esperas.frame_cargado("bbva_iframe_kyop", (By.CSS_SELECTOR, "iframe#kyop-central-load-area"), timeout=20, presupuesto=0, obligatoria=True)
+    logger.debug("Dentro del iframe #kyop-central-load-area.")
+
+    # Step 5: esperar y hacer clic en el enlace de la cuenta
+    account_link = esperas.elemento_clicable(
+        "bbva_enlace_cuenta", (By.XPATH, f"//a[contains(@href, '{cuenta}')]"), timeout=30, presupuesto=10, obligatoria=True
+    )
+    ActionChains(driver).move_to_element(account_link).click().perform()
+    logger.info(f"Enlace de cuenta {cuenta} seleccionado.")
+
+    # Esperar que el campo de fecha inicial esté presente y clickeable
+    start_date_input = esperas.elemento_clicable(
+        "bbva_fecha_inicial", (By.XPATH, "//input[@name='fecini']"), timeout=20, presupuesto=5, obligatoria=True
+    )
+
+    # Movimiento más humano para interactuar con campos de fecha
+    driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", start_date_input)
+    esperas.elemento_en_vista("bbva_scroll_fecha_inicial", start_date_input, timeout=5, presupuesto=1)
+    ActionChains(driver).move_to_element(start_date_input).click().perform()
+    esperas.foco("bbva_foco_fecha_inicial", start_date_input, timeout=5, presupuesto=2)
+    if desde is None:
+        start_date_input.send_keys(Keys.ENTER)
+    else:
+        # Backfill: la fecha se escribe sobre la que propone el portal
+        start_date_input.send_keys(Keys.CONTROL, "a")
+        start_date_input.send_keys(desde.strftime(FORMATO_FECHA))
+    esperas.esperar("bbva_valor_fecha_inicial", lambda d: start_date_input.get_attribute("value"), timeout=5, presupuesto=1)
+    start_date_input.send_keys(Keys.TAB)
+    esperas.foco("bbva_salida_fecha_inicial", start_date_input, timeout=5, presupuesto=3, tiene_foco=False)
+
+    # Esperar que el campo de fecha final esté presente y clickeable
+    end_date_input = esperas.elemento_clicable(
+        "bbva_fecha_final", (By.XPATH, "//input[@name='fecfin']"), timeout=10, presupuesto=0, obligatoria=True
+    )
+
+    # Movimiento más humano para el segundo campo
+    driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", end_date_input)
+    esperas.elemento_en_vista("bbva_scroll_fecha_final", end_date_input, timeout=5, presupuesto=1)
+    ActionChains(driver).move_to_element(end_date_input).click().perform()
+    esperas.foco("bbva_foco_fecha_final", end_date_input, timeout=5, presupuesto=2)
+    if desde is None:
+        end_date_input.send_keys(Keys.ENTER)
+    else:
+        end_date_input.send_keys(Keys.CONTROL, "a")
+        end_date_input.send_keys((hasta or desde).strftime(FORMATO_FECHA))
+    esperas.esperar("bbva_valor_fecha_final", lambda d: end_date_input.get_attribute("value"), timeout=5, presupuesto=1)
+    end_date_input.send_keys(Keys.TAB)
+    esperas.foco("bbva_salida_fecha_final", end_date_input, timeout=5, presupuesto=3, tiene_foco=False)
+
+    def click_consultar():
+        try:
+            logger.info("Esperando el botón 'Consultar'...")
+
+            # Espera hasta que el botón esté presente y clickeable
+            consult_button = esperas.elemento_clicable(
+                "bbva_boton_consultar", (By.XPATH, "//input[@value='Consultar']"), timeout=10, presupuesto=0, obligatoria=True
+            )
+
+            # Scroll hacia el botón para asegurar que esté visible
+            driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", consult_button)
+            esperas.elemento_en_vista("bbva_scroll_consultar", consult_button, timeout=5, presupuesto=3)
+
+            # Simular movimiento de mouse humano
+            ActionChains(driver).move_to_element(consult_button).perform()
+
+            driver.execute_script("arguments[0].click();", consult_button)
+            logger.info("Se hizo clic en el botón 'Consultar' con JavaScript.")
+
+        except Exception as e:
+            logger.error(f"Error al intentar hacer clic en el botón 'Consultar': {e}")
+            raise e
+
+    click_consultar()
+    # La consulta termina cuando aparece el enlace de descarga o el mensaje de que no hay movimientos
+    esperas.elemento_presente(
+        "bbva_consulta_procesada", (By.XPATH, "//a[@title='Descargar Txt'] | //div[@class='msj msj_err']"), timeout=60, presupuesto=10
+    )
+
+    # Verificar si aparece el mensaje de error de no hay movimientos
+    try:
+        error_element = driver.find_element(By.XPATH, "//div[@class='msj msj_err']")
+        if error_element.is_displayed():
+            logger.warning(error_element.text)
+            # None: consulta sin movimientos (no se reintenta); False queda para los fallos
+            return None
+    except Exception:
+        pass
+
+    try:
+        download_link = esperas.elemento_clicable(
+            "bbva_enlace_descarga", (By.XPATH, "//a[@title='Descargar Txt']"), timeout=10, presupuesto=0, obligatoria=True
+        )
+        logger.info("Botón de descarga TXT encontrado exitosamente")
+
+        # Scroll hacia el link de descarga y hacer clic más humano
+        driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", download_link)
+        esperas.elemento_en_vista("bbva_scroll_descarga", download_link, timeout=5, presupuesto=2)
+        # En modo híbrido se intenta bajar el destino del enlace por HTTP antes de hacer clic
+        ruta_archivo = descarga_por_enlace(driver, "bbva", download_link.get_attribute("href"), descargas.carpeta) if hibrido else None
+        if not ruta_archivo:
+            vigilante = descargas.vigilar()
+            ActionChains(driver).move_to_element(download_link).click().perform()
+            ruta_archivo = esperas.esperar(
+                "bbva_archivo_descargado", lambda d: vigilante.completado(), timeout=60, presupuesto=10, obligatoria=True
+            )
+        logger.info("Archivo TXT descargado exitosamente.")
+
+    except Exception as e:
+        logger.warning(f"No se encontró el botón de descarga TXT: {e}")
+        # Si no aparece el botón de descarga, lanzar excepción para reiniciar desde cobros
+        raise Exception("Botón de descarga TXT no encontrado - se requiere reinicio desde selección de cobros")
+    return ruta_archivo
+
+def descargar_cuentas(cfg, cuentas, ruta_descarga, desde=None, hasta=None, clave_sesion="bbva"):
+    """
+    Hace un solo login en BBVA Netcash y descarga el TXT de cada cuenta en la misma sesión.
+    Entre cuentas se vuelve a la lista de cuentas por el menú (Cobros → Recaudos pagados),
+    sin nuevo login ni nuevo navegador.
+
+    Args:
+        cfg: Configuración cargada
+        cuentas (list): Alias de las cuentas (ver [bbva] cuenta_<alias>)
+        ruta_descarga (str): Carpeta de descarga del arriendo del navegador
+        desde (date): Fecha inicial de la consulta; por defecto, hoy
+        hasta (date): Fecha final de la consulta; por defecto, igual a desde
+        clave_sesion (str): Identificador de la sesión guardada (el backfill usa una por navegador simultáneo)
+
+    Returns:
+        dict: Alias → Path del archivo, None si la cuenta no tiene movimientos o False si falló;
+            False si falló el login
+    """
+    pool = obtener_pool(cfg, "bbva")
+    driver = None
+    exito = False
+    resultados = {}
+    try:
+        logger.info(f"Iniciando descarga de movimientos BBVA de las cuentas: {', '.join(cuentas)}")
+        inicio = time.perf_counter()
+        driver = pool.arrendar(ruta_descarga)
+        arranque = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        # Antes de cada reintento se actualiza la página
+        crear_politica(cfg, intentos=int(cfg['reintentos']['reintentos_max'])).ejecutar(
+            "BBVA login",
+            lambda: iniciar_sesion(driver, cfg, clave_sesion,
+                                   sonda=lambda: sesion_activa(driver),
+                                   login=lambda: login(driver, cfg)),
+            antes_de_reintentar=driver.refresh,
+        )
+        duracion_login = time.perf_counter() - inicio
+        logger.info(f"Login exitoso (navegador {arranque:.1f} s, login {duracion_login:.1f} s)")
+
+        for alias in cuentas:
+            cuenta = cfg['bbva'][f"cuenta_{alias}"]
+            inicio = time.perf_counter()
+            try:
+                # Modo híbrido: descarga por HTTP con las cookies del navegador, sin recorrer los iframes
+                try:
+                    ruta_archivo = descarga_directa(
+                        cfg, driver, f"bbva_{alias}", pool.descargas(driver).carpeta,
+                        fecha=(desde or datetime.now()).strftime(FORMATO_FECHA),
+                        fecha_hasta=(hasta or desde or datetime.now()).strftime(FORMATO_FECHA), cuenta=cuenta,
+                    )
+                except ExportacionPendiente as e:
+                    # La exportación ya está pedida: se reintenta su descarga una vez, sin volver a pedirla
+                    ruta_archivo = reanudar_descarga(driver, "bbva", e, pool.descargas(driver).carpeta,
+                                                     timeout=float(cfg['hibrido']['timeout']))
+                if not ruta_archivo:
+                    # Cada intento (y cada cuenta) parte del menú lateral, que sigue disponible en la sesión
+                    def flujo_cobros():
+                        select_charges(driver)
+                        select_paid_collection(driver)
+                        return download_txt(driver, pool.descargas(driver), cuenta, hibrido=hibrido_habilitado(cfg),
+                                            desde=desde, hasta=hasta)
+
+                    # Antes de cada reintento solo se vuelve al contexto principal, sin recargar la página completa
+                    ruta_archivo = crear_politica(cfg, intentos=int(cfg['reintentos']['reintentos_max'])).ejecutar(
+                        f"BBVA {alias} flujo desde cobros", flujo_cobros, antes_de_reintentar=driver.switch_to.default_content
+                    )
+                resultados[alias] = ruta_archivo
+            except PresupuestoAgotado:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la descarga de la cuenta BBVA {alias}: {e}")
+                resultados[alias] = False
+            finally:
+                driver.switch_to.default_content()
+            logger.info(f"Cuenta BBVA {alias}: {'sin movimientos' if resultados[alias] is None else resultados[alias]} "
+                        f"en {time.perf_counter() - inicio:.1f} s")
+
+        if len(cuentas) > 1:
+            # Cada cuenta adicional se ahorra el arriendo del navegador y el login de una sesión propia
+            ahorro = arranque + duracion_login
+            logger.info(f"Sesión única BBVA: {len(cuentas)} cuentas en un login, ahorro estimado {ahorro:.1f} s "
+                        f"por cuenta adicional ({ahorro * (len(cuentas) - 1):.1f} s en total)")
+        exito = all(r is not False for r in resultados.values())
+        return resultados
+    except PresupuestoAgotado:
+        raise
+    except Exception as e:
+        logger.error(f"Ocurrió un error en la sesión BBVA: {e}")
+        return False
+    finally:
+        if driver:
+            # Tras un error el navegador se descarta; si todo fue bien vuelve al pool para reutilizarse
+            pool.liberar(driver, descartar=not exito)
+            logger.info("Driver devuelto al pool")
+
+def cargar_gescom(cfg, alias, ruta_archivo, incremental=True):
+    """
+    Sube el TXT de la cuenta a Google Drive y lo envía a GESCOM. Con [incremental] habilitado solo
+    se envían las filas posteriores a la marca de agua de la cuenta, y nada si no hay filas nuevas.
+
+    Args:
+        incremental (bool): Aplicar la marca de agua (el backfill envía sus rangos completos)
+
+    Returns:
+        True si GESCOM lo aceptó (o no había filas nuevas, o el libro de entregas indica que ya se
+        entregó); (False, mensaje) en caso contrario
+    """
+    try:
+        logger.info(f"Iniciando carga de archivo de la cuenta {alias} a GESCOM.")
+        ruta_archivo = Path(ruta_archivo)
+        # El libro de entregas usa el hash del archivo descargado, no el de las filas nuevas (dos
+        # incrementos con una misma fila repetida tienen el mismo hash y son movimientos distintos)
+        entrega = verificar_entrega(cfg, FORMATO_GESCOM, alias, ruta_archivo)
+        incremento = filtrar_nuevas(cfg, "bbva", f"bbva_{alias}", ruta_archivo) if incremental else None
+        if entrega is not None and entrega.ya_entregada:
+            if incremento is not None:
+                incremento.confirmar()
+            return True
+        if incremento is not None:
+            if not incremento.nuevas:
+                logger.info(f"Cuenta {alias} sin movimientos nuevos desde la última entrega, no se envía.")
+                return True
+            ruta_archivo = incremento.ruta
+
+        uploader = obtener_uploader(cfg['env_vars']['gcp']['service_account_json'])
+        folder_id = cfg['env_vars']['gcp']['folder_id']
+        timestamp = datetime.now().strftime('%Y-%m-%dT%H%M%S.%f')[:-3]
+        file_name = f"bbva_{alias}_{timestamp}.txt"
+        with span("subida_drive", f"bbva_{alias}", archivo=file_name):
+            uploader.upload_file(ruta_archivo, file_name=file_name, folder_id=folder_id)
+        logger.info(f"Archivo {file_name} subido a Google Drive.")
+
+        with open(ruta_archivo, "rb") as archivo:
+            contenido_binario = archivo.read()
+
+        contenido_b64 = base64.b64encode(contenido_binario).decode()
+
+        payload = {
+            "format": FORMATO_GESCOM,
+            "fileName": f"ultimos_{alias}_movimientos_{timestamp}.txt",
+            "base64File": contenido_b64
+        }
+
+        api_url = cfg['api']['api_gescom_transacciones']
+
+        headers = {"Content-Type": "application/json"}
+        logger.info("Enviando archivo a GESCOM")
+        with span("post_gescom", f"bbva_{alias}", bytes=len(contenido_b64)) as atributos:
+            response = requests.post(api_url, json=payload, headers=headers)
+            atributos["status"] = response.status_code
+
+        if response.status_code == 200:
+            logger.info("Archivo enviado exitosamente a GESCOM.")
+            if entrega is not None:
+                entrega.confirmar()
+            if incremento is not None:
+                incremento.confirmar()
+            return True
+        else:
+            logger.error(f"Error al enviar archivo a GESCOM: {response.status_code} - {response.text}")
+            return False, f"Error al enviar archivo a GESCOM: {response.status_code} - {response.text}"
+    except Exception as e:
+        logger.error(f"Excepción al cargar archivo a GESCOM: {e}")
+        return False, f"Excepción al cargar archivo a GESCOM: {e}"
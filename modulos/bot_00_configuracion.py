@@ -35,6 +35,9 @@ def bot_run():
             'anticaptcha': {
                 'api_key': os.getenv('ANTICAPTCHA_API_KEY')
             },
+            'twocaptcha': {
+                'api_key': os.getenv('TWOCAPTCHA_API_KEY')
+            },
             'bcp_cuenta': os.getenv('BCP_CUENTA'),
             'webhook_rpa_url': os.getenv('WEBHOOK_RPA_URL')
         }
@@ -50,6 +53,10 @@ def bot_run():
             # Eliminar todas las subcarpetas dentro de ruta_input
             limpiar_archivos_en_carpeta(ruta_input)
 
+        # Se crea una carpeta de descarga por bot para que no compartan ni limpien la misma ruta
+        for clave in ["ruta_input_bcp", "ruta_input_bbva_soles", "ruta_input_bbva_dolares"]:
+            Path(cfg["rutas"][clave]).mkdir(parents=True, exist_ok=True)
+
         # Se crea la carpeta de output si no existe
         if not Path(cfg["rutas"]["ruta_output"]).exists():
             Path(cfg["rutas"]["ruta_output"]).mkdir(parents=True)
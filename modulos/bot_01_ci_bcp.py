@@ -1,105 +1,51 @@
 # Importación de librerías necesarias
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 import logging
 import base64
 from pathlib import Path
 import requests
-import os
-import platform
 import time
 from datetime import datetime
-from anticaptchaofficial.imagecaptcha import imagecaptcha
 import re
-from selenium_stealth import stealth
 from selenium.webdriver.common.keys import Keys
-from utilidades.google_drive import GoogleDriveUploader
+from utilidades.google_drive import obtener_uploader
+from utilidades.navegador import obtener_pool
+from utilidades.sesiones import iniciar_sesion
+from utilidades.esperas import MotorEsperas
+from utilidades.paginas import esperar_pagina, navegar
+from utilidades.reintentos import PoliticaReintentos, PresupuestoAgotado, crear_politica
+from utilidades.trazas import span, trazar
+from utilidades.hibrido import ExportacionPendiente, descarga_directa, reanudar_descarga
+from utilidades.incremental import filtrar_nuevas
+from utilidades.entregas import verificar_entrega
+from utilidades.captcha import CaptchaEnCurso, imagen_captcha, obtener_resolutor
+from utilidades.limpieza import limpiar_archivos_en_carpeta, cerrar_chrome_tras_error
 
 logger = logging.getLogger("Bot 01 - BCP Cash In")
 
-def create_stealth_webdriver(cfg):
-    logger.info("Entrando a create_stealth_webdriver")
-    """
-    Crea un driver de Chrome configurado para descargar archivos en la ruta indicada en cfg['rutas']['ruta_input']
-    """
-    download_path = str(Path(cfg['rutas']['ruta_input']).absolute())
-    profile_dir = str(Path(cfg['rutas']['ruta_perfil_bcp']).absolute())
-
-    options = webdriver.ChromeOptions()
-
-    options.add_argument(f"user-data-dir={profile_dir}")
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option('useAutomationExtension', False)
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36')
-    options.add_argument("--headless")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--start-maximized")
-
-    prefs = {
-        "download.default_directory": download_path,  # <<< Aquí se fuerza la carpeta de descarga
-        "credentials_enable_service": False,
-        "profile.password_manager_enabled": False,
-        "profile.default_content_setting_values.notifications": 2,
-        "profile.default_content_settings.popups": 0,
-        "profile.managed_default_content_settings.images": 1,
-        "profile.default_content_setting_values.cookies": 1,
-        "profile.block_third_party_cookies": False
-    }
-    options.add_experimental_option("prefs", prefs)
-    # Set longer timeout for ChromeDriver installation
-    os.environ['PYDEVD_WARN_EVALUATION_TIMEOUT'] = '30'  # 30 seconds timeout
-    os.environ['PYDEVD_UNBLOCK_THREADS_TIMEOUT'] = '30'  # Unblock threads after 30 seconds
-    logger.info("Instalando ChromeDriver y creando instancia de webdriver.Chrome")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    logger.info("ChromeDriver creado correctamente")
-    # Ejecutar scripts anti-detección adicionales
-    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-    driver.execute_script("Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]})")
-    driver.execute_script("Object.defineProperty(navigator, 'languages', {get: () => ['es-ES', 'es']})")
-    driver.execute_script("window.chrome = {runtime: {}}")
-
-    logger.info("Ejecutando stealth en el driver")
-    stealth(driver,
-        languages=["es-ES", "es"],
-        vendor="Google Inc.",
-        platform="Win32",
-        webgl_vendor="Intel Inc.",
-        renderer="Intel Iris OpenGL Engine",
-        fix_hairline=True,
-    )
+# Formato del archivo en GESCOM (también identifica las entregas en el libro de entregas)
+FORMATO_GESCOM = "Bcp_MovimientosDelDía"
 
-    logger.info("Driver configurado y listo para usar")
-    return driver
+# Pasos de la interfaz: hasta 4 intentos con backoff corto; descuentan del presupuesto de la ejecución
+POLITICA_PASOS = PoliticaReintentos(intentos=4, espera_base=1, espera_maxima=8)
 
 def retry_action(action, error_msg):
     logger.info(f"Entrando a retry_action para: {error_msg}")
-    max_retries = 4
-    retry_delay = 5
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"Intento {attempt+1} de {max_retries} para {error_msg}")
-            return action()
-        except Exception as e:
-            if attempt == max_retries - 1:
-                logger.error(f"{error_msg}: {str(e)}")
-                raise
-            logger.warning(f"{error_msg} (reintento {attempt+1}/{max_retries}): {str(e)}")
-            time.sleep(retry_delay)
+    return POLITICA_PASOS.ejecutar(error_msg, action)
 
-def login(driver, cfg):
+@trazar(categoria="bcp")
+def login(driver, cfg, navegacion=None):
     logger.info("Entrando a login")
     """
-    Función que realiza el proceso de login en la página del BCP
+    Función que realiza el proceso de login en la página del BCP. En navegacion (dict de la
+    ejecución) queda la URL de la lista de cuentas, ver select_account.
     """    
     logger.info("Iniciando proceso de login en BCP")
-    driver.get("https://www.tlcbcp.com/")
-    time.sleep(10)
+    esperas = MotorEsperas(driver)
+    navegar(driver, "bcp_login", timeout=30, obligatoria=False)
     def close_modal():
         logger.info("Intentando cerrar modal si existe")
         try:
@@ -107,14 +53,14 @@ def login(driver, cfg):
                 EC.element_to_be_clickable((By.XPATH, "//*[@id='bcp-modal-0']/div/bcp-modal-footer/div/bcp-button/button/bcp-character/span"))
             )
             driver.execute_script("arguments[0].click();", modal_button)
-            time.sleep(1)
+            esperas.spinner_ausente("bcp_modal_cerrado", (By.ID, "bcp-modal-0"), timeout=5, presupuesto=1)
             logger.info("Modal cerrado exitosamente")
         except:
             logger.info("No se encontró modal para cerrar")
             pass
     
     retry_action(close_modal, "Error al cerrar modal")
-    time.sleep(10)
+    esperas.elemento_clicable("bcp_campo_tarjeta", (By.XPATH, "//input[contains(@name, 'ciam-input-card')]"), timeout=30, presupuesto=10)
     def enter_card():
         logger.info("Buscando campo de tarjeta para ingresar número")
         campo_tarjeta = WebDriverWait(driver, 60).until(
@@ -149,53 +95,32 @@ def login(driver, cfg):
             elemento.click()
             time.sleep(0.5)
         logger.info("Clave ingresada mediante teclado virtual")
-    
-    retry_action(enter_digits, "Error al ingresar dígitos")
-    
-    def get_captcha_image():
-        logger.info("Buscando imagen captcha")
-        img_element = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//div[contains(@class,'captcha-container')]//bcp-img/img"))
-        )
-        logger.info("Imagen captcha encontrada")
-        return img_element
-    
-    img_element = retry_action(get_captcha_image, "Error al obtener imagen captcha")
-    
-    img_src = img_element.get_attribute('src')
-    
-    if 'image/svg' in img_src:
-        extension = '.svg'
-    else:
-        extension = '.jpg'
-    
-    if 'base64,' in img_src:
-        base64_data = img_src.split('base64,')[1]
-        img_data = base64.b64decode(base64_data)
-    else:
-        img_data = img_src.encode('utf-8')
-    
-    with open('./cliente/input/captcha.jpg', 'wb') as f:
-        f.write(img_data)
-    logger.info("Imagen de captcha guardada")
 
-    ruta_imagen = "./cliente/input/captcha.jpg"
-    api_key = cfg['env_vars']['anticaptcha']['api_key']
-    
-    def solve_captcha():
-        logger.info("Enviando captcha a anticaptcha")
-        solver = imagecaptcha()
-        solver.set_verbose(1)
-        solver.set_key(api_key)
-        captcha_text = solver.solve_and_return_solution(ruta_imagen)
-        if captcha_text == 0:
-            logger.error(f"Error al resolver captcha: {solver.error_code}")
-            raise Exception(f"Error: {solver.error_code}")
-        logger.info(f"Captcha resuelto: {captcha_text}")
-        return captcha_text
-    
-    captcha_text = retry_action(solve_captcha, "Error al resolver captcha")
-    logger.info(f"Captcha resuelto: {captcha_text}")
+    resolutor = obtener_resolutor(cfg)
+
+    # Toma la imagen del captcha del data URI (los SVG, rasterizados a PNG) y lanza su resolución en un hilo de fondo.
+    # Devuelve None si la imagen todavía no aparece y no es obligatoria
+    def iniciar_captcha(timeout, obligatorio=False):
+        logger.info("Buscando imagen captcha")
+        try:
+            img_element = WebDriverWait(driver, timeout).until(
+                EC.presence_of_element_located((By.XPATH, "//div[contains(@class,'captcha-container')]//bcp-img/img"))
+            )
+        except TimeoutException:
+            if obligatorio:
+                raise
+            logger.info("Imagen captcha aún no disponible, se buscará después de la clave")
+            return None
+        imagen = imagen_captcha(driver, img_element)
+        logger.info(f"Imagen captcha encontrada ({len(imagen)} bytes), resolviendo en segundo plano")
+        return CaptchaEnCurso(lambda: retry_action(lambda: resolutor.resolver(imagen), "Error al resolver captcha"), "bcp")
+
+    # El captcha se resuelve en segundo plano mientras se ingresa la clave en el teclado virtual
+    captcha = iniciar_captcha(timeout=5)
+    with span("enter_digits", "bcp", digitos=len(digitos)):
+        retry_action(enter_digits, "Error al ingresar dígitos")
+    if captcha is None:
+        captcha = retry_action(lambda: iniciar_captcha(timeout=10, obligatorio=True), "Error al obtener imagen captcha")
 
     def click_out():
         logger.info("Haciendo clic en título para salir del campo captcha")
@@ -207,6 +132,8 @@ def login(driver, cfg):
         return out
 
     retry_action(click_out, "Error al hacer clic en título")
+    respuesta_captcha = captcha.resultado()
+    captcha_text = respuesta_captcha.texto
 
     def enter_captcha():
         logger.info("Ingresando texto captcha en campo correspondiente")
@@ -220,7 +147,6 @@ def login(driver, cfg):
 
     retry_action(enter_captcha, "Error al ingresar captcha")
 
-    number_account = cfg['env_vars']['bcp_cuenta']
     def click_continue_btn():
         logger.info("Buscando botón continuar para login")
         btn_continue = WebDriverWait(driver, 10).until(
@@ -232,32 +158,89 @@ def login(driver, cfg):
 
     retry_action(click_continue_btn, "Error al hacer clic en continuar")
 
-    def select_account():
+    try:
+        select_account(driver, cfg, navegacion=navegacion)
+        resolutor.confirmar(respuesta_captcha, correcto=True)
+    except Exception as e:
+        logger.error("No se logró iniciar sesión")
+        # Un captcha incorrecto es la causa habitual de que el login no llegue a la lista de cuentas
+        resolutor.confirmar(respuesta_captcha, correcto=False)
+        raise
+
+def cuentas_bcp(cfg):
+    """
+    Returns:
+        list: Cuentas de cfg['env_vars']['bcp_cuenta'] (BCP_CUENTA, separadas por coma)
+    """
+    return [c.strip() for c in (cfg['env_vars']['bcp_cuenta'] or "").split(",") if c.strip()]
+
+@trazar(categoria="bcp")
+def select_account(driver, cfg, cuenta=None, navegacion=None):
+    """
+    Selecciona en la lista de cuentas la cuenta indicada (por defecto, la primera de cuentas_bcp).
+    Si se pasa navegacion (dict de la ejecución), guarda en 'url_cuentas' la URL de la lista para
+    volver_a_cuentas; es propio de cada ejecución, así dos navegadores del backfill no se mezclan.
+    """
+    number_account = cuenta or cuentas_bcp(cfg)[0]
+    def click_account():
         logger.info(f"Buscando cuenta {number_account} para seleccionar")
         card_account = WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.XPATH, f"//ntlc-account-card//*[text()='{number_account}']"))
         )
+        if navegacion is not None:
+            navegacion["url_cuentas"] = driver.current_url
         driver.execute_script("arguments[0].click();", card_account)
         logger.info("Cuenta seleccionada")
         return card_account
 
+    retry_action(click_account, "Error al seleccionar cuenta")
+    logger.info("Cuenta seleccionada exitosamente")
+
+def volver_a_cuentas(driver, url_cuentas=None):
+    """
+    Vuelve a la lista de cuentas de la sesión, por la URL en que se vio la última vez o, si no se
+    conoce (sesión restaurada directamente en movimientos), por el historial del navegador.
+    """
+    if url_cuentas:
+        navegar(driver, "bcp_cuentas", timeout=30, url=url_cuentas)
+    else:
+        driver.back()
+        esperar_pagina(driver, "bcp_cuentas", timeout=30)
+
+def sesion_activa(driver):
+    """
+    Sonda de sesión restaurada: está autenticada si aparece la página de movimientos o la lista
+    de cuentas. Solo lee la página; la cuenta se selecciona después (ver asegurar_cuenta).
+    """
     try:
-        retry_action(select_account, "Error al seleccionar cuenta")
-        logger.info("Cuenta seleccionada exitosamente")
-    except Exception as e:
-        logger.error("No se logró iniciar sesión")
-        raise
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.XPATH, "//input[@name='inputDateFrom'] | //ntlc-account-card"))
+        )
+    except TimeoutException:
+        return False
+    return True
 
-def generar_reporte(driver):
+def asegurar_cuenta(driver, cfg, navegacion=None):
+    """
+    Tras iniciar sesión, selecciona la cuenta configurada si la sesión restaurada quedó en la
+    lista de cuentas en lugar de la página de movimientos.
+    """
+    if not driver.find_elements(By.XPATH, "//input[@name='inputDateFrom']"):
+        select_account(driver, cfg, navegacion=navegacion)
+
+@trazar(categoria="bcp")
+def generar_reporte(driver, desde=None, hasta=None):
     logger.info("Entrando a generar_reporte")
-    actual_date = datetime.now()
-    actual_date = actual_date.strftime("%d%m%Y")
-    logger.info(f"Generando reporte para la fecha: {actual_date}")
+    """
+    Aplica el filtro de fechas (por defecto, el día actual) y de ingresos y abre el modal de exportación.
+    """
+    fecha_desde = (desde or datetime.now()).strftime("%d%m%Y")
+    fecha_hasta = (hasta or desde or datetime.now()).strftime("%d%m%Y")
+    logger.info(f"Generando reporte del {fecha_desde} al {fecha_hasta}")
+    esperas = MotorEsperas(driver)
     def wait_for_page():
         logger.info("Esperando carga de página para inputDateFrom")
-        return WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//input[@name='inputDateFrom']"))
-        )
+        return esperar_pagina(driver, "bcp_movimientos", timeout=10)
     retry_action(wait_for_page, "Error esperando carga de página")
     def get_date_since_click():
         logger.info("Haciendo clic en campo fecha desde")
@@ -274,7 +257,7 @@ def generar_reporte(driver):
         date_since = WebDriverWait(driver, 60).until(
             EC.visibility_of_element_located((By.XPATH, "//input[@name='inputDateFrom']"))
         )
-        date_since.send_keys(actual_date)
+        date_since.send_keys(fecha_desde)
         date_since.send_keys(Keys.TAB)
         logger.info("Fecha desde ingresada")
         return date_since
@@ -297,13 +280,13 @@ def generar_reporte(driver):
         date_to = WebDriverWait(driver, 60).until(
             EC.visibility_of_element_located((By.XPATH, "//input[@name='inputDateTo']"))
         )
-        date_to.send_keys(actual_date)
+        date_to.send_keys(fecha_hasta)
         date_to.send_keys(Keys.TAB)
         logger.info("Fecha hasta ingresada")
         return date_to
 
     retry_action(enter_date_to, "Error al ingresar fecha hasta")
-    time.sleep(2)
+    esperas.red_inactiva("bcp_fechas_ingresadas", timeout=10, presupuesto=2)
 
     def click_dropdown():
         logger.info("Haciendo clic en dropdown de tipo")
@@ -315,7 +298,7 @@ def generar_reporte(driver):
         return dropdown
     
     retry_action(click_dropdown, "Error al hacer clic en dropdown")
-    time.sleep(2)
+    esperas.elemento_visible("bcp_opciones_tipo", (By.XPATH, "//div[@class='select-item']"), timeout=10, presupuesto=2)
     
     def select_ingresos():
         logger.info("Seleccionando opción Ingresos")
@@ -327,7 +310,7 @@ def generar_reporte(driver):
         return opcion_ingresos
 
     retry_action(select_ingresos, "Error al seleccionar opción Ingresos")
-    time.sleep(2)
+    esperas.elemento_clicable("bcp_boton_aplicar", (By.XPATH, "//bcp-button-bpbaaa//*[text()= ' Aplicar ']"), timeout=10, presupuesto=2)
 
     def click_aplicar():
         logger.info("Haciendo clic en botón Aplicar")
@@ -341,7 +324,7 @@ def generar_reporte(driver):
     retry_action(click_aplicar, "Error al hacer clic en Aplicar")
     logger.info("Filtro de fechas y tipo aplicado")
 
-    time.sleep(2)
+    esperas.red_inactiva("bcp_filtro_aplicado", timeout=20, presupuesto=2)
 
     def click_checkbox():
         logger.info("Haciendo clic en checkbox de selección")
@@ -354,7 +337,7 @@ def generar_reporte(driver):
 
     retry_action(click_checkbox, "Error al hacer clic en checkbox")
 
-    time.sleep(2)
+    esperas.red_inactiva("bcp_movimientos_seleccionados", timeout=10, presupuesto=2)
 
     def click_seleccionar_todas():
         logger.info("Buscando y haciendo clic en 'Seleccionar todas' si existe")
@@ -369,7 +352,7 @@ def generar_reporte(driver):
         except Exception as e:
             logger.warning(f"Error al intentar buscar o hacer clic en 'Seleccionar todas': {e}")
 
-    time.sleep(2)
+    esperas.elemento_presente("bcp_boton_exportar", (By.XPATH, "//button[contains(@class, 'bcp-ffw-btn')]//*[text()= ' Exportar ']"), timeout=10, presupuesto=2)
 
     def click_exportar():
         logger.info("Haciendo clic en botón Exportar")
@@ -417,15 +400,19 @@ def generar_reporte(driver):
     retry_action(click_comma, "Error al seleccionar coma")
     logger.info("Formato de exportación seleccionado: TXT/CSV con separador coma")
 
-def descarga_fichero(driver):
-    logger.info("Entrando a descarga_fichero")
+@trazar(categoria="bcp")
+def solicitar_exportacion(driver):
     """
-    Función que gestiona la descarga del archivo
+    Confirma la exportación en el modal y devuelve el número de solicitud. BCP genera el archivo
+    de forma asíncrona, así que se pueden encolar varias solicitudes antes de descargar.
+
+    Returns:
+        str: Número de solicitud con 8 dígitos, como aparece en la tabla de archivos solicitados
     """
-    logger.info("Iniciando descarga del archivo exportado")
-    time.sleep(2)
-    button_export = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, "//button//*[text()='Exportar']"))
+    logger.info("Solicitando exportación del archivo")
+    esperas = MotorEsperas(driver)
+    button_export = esperas.elemento_clicable(
+        "bcp_modal_exportar", (By.XPATH, "//button//*[text()='Exportar']"), timeout=12, presupuesto=2, obligatoria=True
     )
     driver.execute_script("arguments[0].click();", button_export)
     logger.info("Botón Exportar presionado en modal de descarga")
@@ -441,102 +428,244 @@ def descarga_fichero(driver):
         raise Exception("No se pudo encontrar el código de solicitud")
     n_code = n_code.group(1)
     logger.info(f"Código de solicitud obtenido: {n_code}")
-    n_code = n_code.zfill(8)
+    return n_code.zfill(8)
+
+def ir_a_archivos_solicitados(driver):
+    """
+    Pasa del modal de la solicitud a la tabla de archivos solicitados.
 
+    Returns:
+        str: URL de la tabla, para volver a ella después de atender otras cuentas
+    """
     button_files = WebDriverWait(driver, 10).until(
         EC.element_to_be_clickable((By.XPATH, "//bcp-character//*[text()=' Ir a archivos solicitados ']"))
     )
     driver.execute_script("arguments[0].click();", button_files)
     logger.info("Botón 'Ir a archivos solicitados' presionado")
+    return driver.current_url
 
-    time.sleep(4)
-
-    row_element = WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.XPATH, f"//bcp-table-row-9nbaaa[.//p[normalize-space(.)='{n_code}']]"))
-    )
-    logger.info(f"Fila de archivo encontrada para código: {n_code}")
+@trazar(categoria="bcp")
+def descargar_solicitud(driver, descargas, n_code, plazo_exportacion=300, inicio_solicitud=None, refrescar_antes=False):
+    """
+    Desde la tabla de archivos solicitados, espera a que la solicitud esté generada y descarga el TXT
+    en la carpeta de la sesión (descargas: SeguidorDescargas).
 
-    index = row_element.get_attribute("index")
-    logger.info(f"Índice de la fila: {index}")
+    Returns:
+        Path: Archivo descargado
+    """
+    esperas = MotorEsperas(driver)
+    inicio_solicitud = inicio_solicitud or time.perf_counter()
 
-    time.sleep(2)
+    # El archivo se genera de forma asíncrona: se sondea la tabla de archivos solicitados hasta que
+    # la fila de la solicitud tenga su botón de descarga, y solo se falla al superar el plazo
+    xpath_fila = f"//bcp-table-row-9nbaaa[.//p[normalize-space(.)='{n_code}']]"
 
-    button_dwld = WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.XPATH, f"//bcp-table-row-9nbaaa[@index='{index}']//span[contains(@class, 'bcp-ffw-sr-only') and text()='Descargar .txt']"))
-    )
+    def fila_lista(d):
+        filas = d.find_elements(By.XPATH, xpath_fila)
+        if not filas:
+            return False
+        botones = filas[0].find_elements(By.XPATH, ".//span[contains(@class, 'bcp-ffw-sr-only') and text()='Descargar .txt']")
+        return botones[0] if botones else False
+
+    def refrescar_tabla():
+        driver.refresh()
+        esperas.red_inactiva("bcp_tabla_archivos_refrescada", timeout=15, presupuesto=0)
+
+    if refrescar_antes:
+        # La descarga anterior deja abierto su modal; la tabla se recarga antes de buscar la siguiente fila
+        refrescar_tabla()
+    with span("generacion_exportacion", "bcp", solicitud=n_code) as atributos:
+        button_dwld, refrescos = esperas.sondear(
+            "bcp_fila_solicitud_lista", fila_lista, refrescar_tabla, plazo=plazo_exportacion, presupuesto=6
+        )
+        atributos["refrescos"] = refrescos
+    logger.info(f"Archivo de la solicitud {n_code} generado en {time.perf_counter() - inicio_solicitud:.1f} s "
+                f"({refrescos} refrescos de la tabla)")
     driver.execute_script("arguments[0].click();", button_dwld)
     logger.info("Botón de descarga .txt presionado")
 
-    time.sleep(2)
-
-    button_txt = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, "//button//span[text()=' Descargar .txt ']"))
+    button_txt = esperas.elemento_clicable(
+        "bcp_boton_descarga_txt", (By.XPATH, "//button//span[text()=' Descargar .txt ']"),
+        timeout=12, presupuesto=2, obligatoria=True
     )
+    vigilante = descargas.vigilar()
     driver.execute_script("arguments[0].click();", button_txt)
     logger.info("Botón final de descarga .txt presionado")
 
-    time.sleep(2)
-    logger.info("Archivo descargado exitosamente")
+    ruta_archivo = esperas.esperar(
+        "bcp_archivo_descargado", lambda d: vigilante.completado(), timeout=60, presupuesto=2, obligatoria=True
+    )
+    logger.info(f"Archivo descargado exitosamente: {ruta_archivo}")
+    return ruta_archivo
 
+def descarga_fichero(driver, descargas, plazo_exportacion=300):
+    """
+    Exportación y descarga de una sola cuenta: solicita, va a archivos solicitados y descarga.
+    Devuelve la ruta del archivo descargado.
+    """
+    inicio_solicitud = time.perf_counter()
+    n_code = solicitar_exportacion(driver)
+    ir_a_archivos_solicitados(driver)
+    return descargar_solicitud(driver, descargas, n_code, plazo_exportacion, inicio_solicitud)
 
-def bcp_cash_in_descarga_txt(cfg):
+def bcp_cash_in_descarga_txt(cfg, desde=None, hasta=None, clave_sesion="bcp"):
     logger.info("Entrando a bcp_cash_in_descarga_txt")
     """
-    Función principal que ejecuta todo el proceso
+    Función principal que ejecuta todo el proceso con un solo login para todas las cuentas:
+    encola una exportación por cuenta (BCP las genera en paralelo) y luego las descarga todas
+    desde la tabla de archivos solicitados. desde/hasta (date) fijan el rango; por defecto, hoy.
+    clave_sesion identifica la sesión guardada (el backfill usa una por navegador simultáneo).
+    Devuelve un dict cuenta → ruta del archivo (False si esa cuenta falló), o False si falló el login.
     """
+    pool = obtener_pool(cfg, "bcp")
     driver = None
+    exito = False
+    # Estado de navegación de esta ejecución (URL de la lista de cuentas)
+    navegacion = {}
     try:
         logger.info("Iniciando proceso completo de descarga de movimientos BCP")
-        driver = create_stealth_webdriver(cfg)
+        driver = pool.arrendar(cfg['rutas']['ruta_input_bcp'])
         def retry_login(max_attempts=2):
             logger.info("Entrando a retry_login")
-            for attempt in range(max_attempts):
-                try:
-                    logger.info(f"Intento de login {attempt + 1}/{max_attempts}")
-                    login(driver, cfg)
-                    logger.info("Login exitoso")
-                    return True
-                except Exception as e:
-                    logger.warning(f"Error en intento {attempt + 1}: {e}")
-                    if attempt < max_attempts - 1:
-                        logger.info("Actualizando página y reintentando login...")
-                        driver.refresh()
-                        time.sleep(5)
-                    else:
-                        logger.error("Se agotaron todos los intentos de login")
-                        raise e
-            return False
-        
+            # Antes de cada reintento se actualiza la página
+            crear_politica(cfg, intentos=max_attempts).ejecutar(
+                "BCP login",
+                lambda: iniciar_sesion(driver, cfg, clave_sesion,
+                                       sonda=lambda: sesion_activa(driver),
+                                       login=lambda: login(driver, cfg, navegacion)),
+                antes_de_reintentar=driver.refresh,
+            )
+            logger.info("Login exitoso")
+            return True
+
         retry_login()
-        logger.info("Login realizado, generando reporte")
-        generar_reporte(driver)
-        logger.info("Reporte generado, descargando fichero")
-        descarga_fichero(driver)
-        logger.info("Proceso de descarga de movimientos BCP finalizado correctamente")
+        asegurar_cuenta(driver, cfg, navegacion)
+        cuentas = cuentas_bcp(cfg)
+        plazo_exportacion = float(cfg['bcp']['plazo_exportacion_seg'])
+        # Exportaciones pedidas por HTTP cuyo archivo aún no se pudo bajar: la fase 2 solo reintenta la descarga
+        resultados, solicitudes, pendientes_http, tiempos = {}, {}, {}, {}
+        # El login (o la sesión restaurada) deja seleccionada la primera cuenta
+        seleccionada = cuentas[0]
+        url_archivos = None
+
+        # Fase 1: una solicitud de exportación por cuenta, una tras otra
+        for cuenta in cuentas:
+            inicio = time.perf_counter()
+            try:
+                # Modo híbrido: exportación y descarga por HTTP con las cookies del navegador
+                ruta_archivo = descarga_directa(
+                    cfg, driver, "bcp", pool.descargas(driver).carpeta,
+                    fecha=(desde or datetime.now()).strftime("%d%m%Y"),
+                    fecha_hasta=(hasta or desde or datetime.now()).strftime("%d%m%Y"), cuenta=cuenta,
+                )
+                if ruta_archivo:
+                    resultados[cuenta] = ruta_archivo
+                    tiempos[cuenta] = {"total_seg": time.perf_counter() - inicio}
+                    continue
+            except ExportacionPendiente as e:
+                pendientes_http[cuenta] = (e, inicio)
+                tiempos[cuenta] = {"solicitud_seg": time.perf_counter() - inicio}
+                continue
+            try:
+                if cuenta != seleccionada:
+                    volver_a_cuentas(driver, navegacion.get("url_cuentas"))
+                    select_account(driver, cfg, cuenta, navegacion)
+                    seleccionada = cuenta
+                logger.info(f"Cuenta {cuenta} seleccionada, generando reporte")
+                generar_reporte(driver, desde, hasta)
+                solicitudes[cuenta] = (solicitar_exportacion(driver), inicio)
+                url_archivos = ir_a_archivos_solicitados(driver)
+                tiempos[cuenta] = {"solicitud_seg": time.perf_counter() - inicio}
+            except PresupuestoAgotado:
+                raise
+            except Exception as e:
+                logger.error(f"Error al solicitar la exportación de la cuenta {cuenta}: {e}")
+                resultados[cuenta] = False
+                # Sin saber en qué pantalla quedó, la siguiente cuenta vuelve a la lista
+                seleccionada = None
+
+        # Fase 2: descarga de cada exportación pedida por HTTP y de cada solicitud desde la tabla de archivos solicitados
+        for cuenta, (pendiente, inicio) in pendientes_http.items():
+            inicio_descarga = time.perf_counter()
+            try:
+                resultados[cuenta] = reanudar_descarga(
+                    driver, "bcp", pendiente, pool.descargas(driver).carpeta,
+                    timeout=max(10.0, plazo_exportacion - (inicio_descarga - inicio)),
+                )
+            except PresupuestoAgotado:
+                raise
+            except Exception as e:
+                logger.error(f"Error al descargar por HTTP la exportación de la cuenta {cuenta}: {e}")
+                resultados[cuenta] = False
+            tiempos[cuenta]["descarga_seg"] = time.perf_counter() - inicio_descarga
+            tiempos[cuenta]["total_seg"] = time.perf_counter() - inicio
+        if solicitudes and driver.current_url != url_archivos:
+            driver.get(url_archivos)
+        for i, (cuenta, (n_code, inicio)) in enumerate(solicitudes.items()):
+            inicio_descarga = time.perf_counter()
+            try:
+                # El plazo de generación corre desde la solicitud de cada cuenta
+                resultados[cuenta] = descargar_solicitud(
+                    driver, pool.descargas(driver), n_code,
+                    plazo_exportacion=max(10.0, plazo_exportacion - (inicio_descarga - inicio)),
+                    inicio_solicitud=inicio, refrescar_antes=i > 0,
+                )
+            except PresupuestoAgotado:
+                raise
+            except Exception as e:
+                logger.error(f"Error al descargar la solicitud {n_code} de la cuenta {cuenta}: {e}")
+                resultados[cuenta] = False
+            tiempos[cuenta]["descarga_seg"] = time.perf_counter() - inicio_descarga
+            tiempos[cuenta]["total_seg"] = time.perf_counter() - inicio
+
+        for cuenta in cuentas:
+            detalle = ", ".join(f"{k} {v:.1f} s" for k, v in tiempos.get(cuenta, {}).items())
+            logger.info(f"Cuenta BCP {cuenta}: {'descargada' if resultados.get(cuenta) else 'con error'} ({detalle})")
+        logger.info("Proceso de descarga de movimientos BCP finalizado")
+        exito = all(resultados.get(c) for c in cuentas)
+        return {c: resultados.get(c, False) for c in cuentas}
+    except PresupuestoAgotado:
+        raise
     except Exception as e:
         logger.error(f"Ocurrió un error en bcp_cash_in_descarga_txt: {e}")
+        return False
     finally:
         if driver:
-            try:
-                driver.quit()
-                logger.info("Driver cerrado correctamente")
-            except Exception:
-                logger.warning("Error al cerrar el driver")
+            # Tras un error el navegador se descarta; si todo fue bien vuelve al pool para reutilizarse
+            pool.liberar(driver, descartar=not exito)
+            logger.info("Driver devuelto al pool")
 
-def bcp_cargar_gescom(cfg):
+def bcp_cargar_gescom(cfg, ruta_archivo, cuenta=None, incremental=True):
     logger.info("Entrando a bcp_cargar_gescom")
     """
-    Función principal que ejecuta todo el proceso
+    Sube a Google Drive y envía a GESCOM el archivo descargado en ruta_archivo. Con [incremental]
+    habilitado solo se envían las filas posteriores a la marca de agua de la cuenta, y nada si no
+    hay filas nuevas (el backfill llama con incremental=False). Un archivo que el libro de entregas
+    registra como ya entregado no se vuelve a enviar.
     """
     try:
+        ruta_archivo = Path(ruta_archivo)
+        # Un reintento o un ciclo superpuesto no vuelve a enviar un archivo que GESCOM ya aceptó. El
+        # libro usa el hash del archivo descargado, nunca el de las filas nuevas: dos incrementos de
+        # una sola fila idéntica tienen el mismo hash y son movimientos distintos
+        entrega = verificar_entrega(cfg, FORMATO_GESCOM, cuenta or "bcp", ruta_archivo)
+        incremento = filtrar_nuevas(cfg, "bcp", f"bcp_{cuenta}" if cuenta else "bcp", ruta_archivo) if incremental else None
+        if entrega is not None and entrega.ya_entregada:
+            if incremento is not None:
+                incremento.confirmar()
+            return True
+        if incremento is not None:
+            if not incremento.nuevas:
+                logger.info(f"Cuenta {cuenta} sin movimientos nuevos desde la última entrega, no se envía")
+                return True
+            ruta_archivo = incremento.ruta
         json_data = cfg['env_vars']['gcp']['service_account_json']
-        uploader = GoogleDriveUploader(authenticator=False, service_account_json=json_data)        
+        uploader = obtener_uploader(json_data)        
         folder_id = cfg['env_vars']['gcp']['folder_id']
-        ruta_archivo = Path(cfg['rutas']['ruta_input']) / "040_ultimos_movimientos.txt"
-        ruta_archivo = Path(ruta_archivo)
         file_name = f"040_ultimos_movimientos_{datetime.now().strftime('%Y-%m-%dT%H%M%S.%f')[:-3]}.txt"
         logger.info(f"Subiendo archivo a Google Drive: {file_name}")
-        uploader.upload_file(ruta_archivo, file_name=file_name, folder_id=folder_id)
+        with span("subida_drive", "bcp", archivo=file_name):
+            uploader.upload_file(ruta_archivo, file_name=file_name, folder_id=folder_id)
 
         if not ruta_archivo.exists():
             logger.error(f"No se encontró el archivo: {ruta_archivo}")
@@ -547,7 +676,7 @@ def bcp_cargar_gescom(cfg):
             contenido_b64 = base64.b64encode(archivo.read()).decode()
 
         payload = {
-            "format": "Bcp_MovimientosDelDía",
+            "format": FORMATO_GESCOM,
             "fileName": f"ultimos_movimientos_{datetime.now().strftime('%Y-%m-%dT%H%M%S.%f')[:-3]}.txt",
             "base64File": contenido_b64
         }
@@ -556,11 +685,17 @@ def bcp_cargar_gescom(cfg):
 
         headers = {"Content-Type": "application/json"}
         logger.info("Enviando archivo a GESCOM")
-        response = requests.post(api_url, json=payload, headers=headers)
+        with span("post_gescom", "bcp", bytes=len(contenido_b64)) as atributos:
+            response = requests.post(api_url, json=payload, headers=headers)
+            atributos["status"] = response.status_code
 
         if response.status_code == 200:
             
             logger.info("Archivo enviado exitosamente a GESCOM.")
+            if entrega is not None:
+                entrega.confirmar()
+            if incremento is not None:
+                incremento.confirmar()
             return True
         else:
             logger.error(f"Error al enviar archivo a GESCOM: {response.status_code} - {response.text}")
@@ -569,29 +704,61 @@ def bcp_cargar_gescom(cfg):
         logger.error(f"Excepción al cargar archivo a GESCOM: {e}")
         return False, f"Excepción al cargar archivo a GESCOM: {e}"
     
+def etapa_descarga(cfg):
+    """
+    Etapa de descarga: solo usa el navegador para obtener el TXT de movimientos de cada cuenta.
+    La usan bot_run y el modo pipeline del orquestador.
+
+    Returns:
+        dict: Cuenta → ruta del archivo descargado (False si esa cuenta falló), o False si falló el login
+    """
+    # Evita que Chrome renombre la descarga como "040_ultimos_movimientos (1).txt" en ciclos sucesivos
+    limpiar_archivos_en_carpeta(Path(cfg['rutas']['ruta_input_bcp']))
+    return bcp_cash_in_descarga_txt(cfg)
+
+def etapa_entrega(cfg, resultados, incremental=True):
+    """
+    Etapa de entrega: sube el archivo de cada cuenta a Google Drive y lo envía a GESCOM.
+    La usan bot_run y el modo pipeline del orquestador.
+
+    Args:
+        resultados (dict): Devuelto por etapa_descarga
+        incremental (bool): Enviar solo las filas posteriores a la marca de agua de cada cuenta
+
+    Returns:
+        tuple: (success, message)
+    """
+    exito = True
+    mensajes = []
+    for cuenta, ruta_archivo in resultados.items():
+        if not ruta_archivo:
+            exito = False
+            mensajes.append(f"{cuenta}: descarga de archivo no exitosa")
+            continue
+        resultado = bcp_cargar_gescom(cfg, ruta_archivo, cuenta, incremental)
+        if resultado is True:
+            mensajes.append(f"{cuenta}: carga de archivo exitosa")
+        else:
+            exito = False
+            mensajes.append(f"{cuenta}: {resultado[1]}")
+    return exito, "; ".join(mensajes)
+
 def bot_run(cfg, mensaje = "Bot 01 - BCP Cash In"):
     logger.info(f"Ejecutando  {mensaje}")
     try:
         resultado = False
         logger.info("Iniciando ejecución principal del bot BCP")
-        bcp_cash_in_descarga_txt(cfg)
-        resultado = True
-        mensaje = "Descarga de archivo exitosa"
+        resultados = etapa_descarga(cfg)
+        resultado = bool(resultados)
+        mensaje = "Descarga de archivo exitosa" if resultado else "Descarga de archivo no exitosa"
         if resultado:
-            logger.info("Descarga exitosa, iniciando carga a GESCOM")
-            bcp_cargar_gescom(cfg)
-            mensaje = "Carga de archivo exitosa"
-            resultado = True
+            logger.info("Descarga terminada, iniciando carga a GESCOM")
+            resultado, mensaje = etapa_entrega(cfg, resultados)
     except Exception as e:
         logger.error(f"Error en bot BCP: {e}")
-        if platform.system() == 'Windows':
-            logger.info("Cerrando procesos chrome en Windows")
-            os.system("taskkill /im chrome.exe /f")
-        else:
-            logger.info("Cerrando procesos chrome en Linux/Unix")
-            os.system("pkill -f chrome")
+        cerrar_chrome_tras_error(cfg)
         raise Exception(f"Error en bot BCP: {e}") from e
 
     finally:
         logger.info("Navegador cerrado")
-        return resultado, mensaje
\ No newline at end of file
+        return resultado, mensaje
@@ -0,0 +1,74 @@
+import logging
+from pathlib import Path
+from utilidades.notificaiones_whook import WebhookNotifier
+from utilidades.limpieza import limpiar_archivos_en_carpeta, cerrar_chrome_tras_error
+from modulos.bbva_netcash import cargar_gescom, cuentas_configuradas, descargar_cuentas
+
+logger = logging.getLogger("Bot 04 - BBVA CI Cuentas")
+
+def etapa_descarga(cfg):
+    """
+    Etapa de descarga: un solo login en BBVA Netcash y el TXT de cada cuenta de [bbva] cuentas.
+    La usan bot_run y el modo pipeline del orquestador.
+
+    Returns:
+        dict: Alias → Path, None (sin movimientos) o False (falló); False si falló el login
+    """
+    limpiar_archivos_en_carpeta(Path(cfg['rutas']['ruta_input_bbva']))
+    resultados = descargar_cuentas(cfg, cuentas_configuradas(cfg), cfg['rutas']['ruta_input_bbva'])
+    if resultados:
+        logger.info(f"Descarga terminada: {resultados}")
+    return resultados
+
+def etapa_entrega(cfg, resultados, incremental=True):
+    """
+    Etapa de entrega: sube a Google Drive y envía a GESCOM el archivo de cada cuenta descargada.
+
+    Args:
+        resultados (dict): Devuelto por etapa_descarga
+        incremental (bool): Enviar solo las filas posteriores a la marca de agua de cada cuenta
+
+    Returns:
+        tuple: (success, message); success solo si todas las cuentas se descargaron (o no tenían
+            movimientos) y se cargaron
+    """
+    exito = True
+    mensajes = []
+    for alias, ruta_archivo in resultados.items():
+        if ruta_archivo is None:
+            mensajes.append(f"{alias}: sin movimientos para descargar")
+            continue
+        if ruta_archivo is False:
+            exito = False
+            mensajes.append(f"{alias}: descarga no exitosa")
+            continue
+        resultado = cargar_gescom(cfg, alias, ruta_archivo, incremental)
+        if resultado is True:
+            mensajes.append(f"{alias}: carga de archivo exitosa")
+        else:
+            exito = False
+            mensajes.append(f"{alias}: {resultado[1]}")
+    return exito, "; ".join(mensajes)
+
+def bot_run(cfg, mensaje):
+    logger.info("Iniciando ejecución de bot_run para BBVA (sesión única).")
+    try:
+        resultado = False
+        webhook = WebhookNotifier(cfg['env_vars']['webhook_rpa_url'])
+        resultados = etapa_descarga(cfg)
+        if resultados:
+            webhook.send_notification(f"Bot BBVA - Cuentas procesadas: {', '.join(resultados)}")
+            resultado, mensaje = etapa_entrega(cfg, resultados)
+            webhook.send_notification(f"Bot BBVA: {mensaje}")
+        else:
+            mensaje = "Login o descarga BBVA no exitosa"
+            webhook.send_notification(f"Bot BBVA: {mensaje}")
+
+    except Exception as e:
+        logger.error(f"Error en bot BBVA: {e}")
+        cerrar_chrome_tras_error(cfg)
+        raise Exception(f"Error en bot BBVA: {e}") from e
+
+    finally:
+        logger.info("Navegador cerrado")
+        return resultado, mensaje
@@ -0,0 +1,156 @@
+import argparse
+import json
+import logging
+import statistics
+import time
+from utilidades.esperas import MotorEsperas
+
+logger = logging.getLogger("Utils - Bloqueo")
+
+# Recursos que el login, el captcha y la descarga no necesitan: analítica, widgets de chat, fuentes,
+# videos y todas las imágenes JPEG y WebP, sea cual sea su tamaño (el bloqueo es por patrón de URL).
+# Los iconos (png, svg, gif) no se bloquean, y el captcha del BCP viene en un data URI, que no pasa
+# por la red y nunca se bloquea. Si un portal necesitara un JPEG o WebP en el login o la descarga,
+# hay que quitar el patrón de su perfil.
+# Uso de la comparación: python -m utilidades.bloqueo --perfil bbva --url https://www.bbvanetcash.pe
+PATRONES_COMUNES = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*connect.facebook.*",
+    "*hotjar.com*",
+    "*clarity.ms*",
+    "*bat.bing.com*",
+    "*newrelic.com*",
+    "*nr-data.net*",
+    "*/ruxitagentjs*",
+    "*dynatrace*",
+    "*zdassets.com*",
+    "*zopim.com*",
+    "*livechatinc.com*",
+    "*tawk.to*",
+    "*fonts.googleapis.com*",
+    "*fonts.gstatic.com*",
+    "*.woff*",
+    "*.ttf*",
+    "*.otf*",
+    "*.jpg*",
+    "*.jpeg*",
+    "*.webp*",
+    "*.mp4*",
+    "*.webm*",
+]
+
+PERFILES_BLOQUEO = {
+    "bcp": PATRONES_COMUNES + [
+        "*yoizen*",
+        "*salesforceliveagent.com*",
+    ],
+    "bbva": PATRONES_COMUNES + [
+        "*tealiumiq.com*",
+        "*tiqcdn.com*",
+        "*adobedtm.com*",
+        "*omtrdc.net*",
+        "*.swf*",
+    ],
+}
+
+def bloqueo_habilitado(cfg):
+    return str(cfg['bloqueo']['habilitado']).lower() == "true"
+
+def patrones_bloqueo(cfg, perfil):
+    """
+    Patrones de URL bloqueados para el banco: los de PERFILES_BLOQUEO más los de
+    '<perfil>_adicionales' en la sección [bloqueo].
+
+    Returns:
+        list: Patrones con comodín '*' (formato de Network.setBlockedURLs)
+    """
+    adicionales = cfg['bloqueo'].get(f"{perfil}_adicionales") or []
+    if isinstance(adicionales, str):
+        adicionales = [p.strip() for p in adicionales.split(",")]
+    return PERFILES_BLOQUEO.get(perfil, PATRONES_COMUNES) + [p for p in adicionales if p]
+
+def aplicar_bloqueo(driver, patrones):
+    """
+    Bloquea por DevTools las peticiones cuya URL coincide con los patrones. Queda activo durante
+    toda la vida del driver (también entre arriendos del pool).
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patrones)})
+    logger.info(f"Bloqueo de recursos activo: {len(patrones)} patrones")
+
+def medir_carga(driver, url, timeout=60):
+    """
+    Carga la URL con la caché vacía y mide el tiempo hasta que la red queda inactiva y los bytes
+    transferidos. Requiere un driver creado con red_en_log=True.
+
+    Returns:
+        dict: Segundos hasta red inactiva, evento load (ms), peticiones, peticiones bloqueadas y KB transferidos
+    """
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    driver.get("about:blank")
+    driver.get_log("performance")
+    inicio = time.perf_counter()
+    driver.get(url)
+    MotorEsperas(driver).red_inactiva("bloqueo_medicion", timeout=timeout, presupuesto=0)
+    segundos = time.perf_counter() - inicio
+    carga_ms = driver.execute_script(
+        "var n = performance.getEntriesByType('navigation')[0]; return n ? n.loadEventEnd - n.startTime : null;"
+    )
+
+    transferidos, peticiones, bloqueadas = 0, 0, 0
+    for entrada in driver.get_log("performance"):
+        mensaje = json.loads(entrada["message"])["message"]
+        if mensaje["method"] == "Network.requestWillBeSent":
+            peticiones += 1
+        elif mensaje["method"] == "Network.loadingFinished":
+            transferidos += mensaje["params"].get("encodedDataLength", 0)
+        elif mensaje["method"] == "Network.loadingFailed" and mensaje["params"].get("blockedReason"):
+            bloqueadas += 1
+    return {
+        "segundos": round(segundos, 2),
+        "carga_ms": round(carga_ms or 0),
+        "peticiones": peticiones,
+        "bloqueadas": bloqueadas,
+        "kb": round(transferidos / 1024, 1),
+    }
+
+def comparar(cfg, perfil, url, repeticiones=3):
+    """
+    Carga la URL 'repeticiones' veces sin y con el perfil de bloqueo del banco, cada modo en su
+    propio navegador, y devuelve las medianas y la reducción.
+    """
+    from utilidades.navegador import crear_driver_stealth
+
+    resultados = {}
+    for modo, bloqueo in (("sin_bloqueo", False), ("con_bloqueo", True)):
+        # Índice propio para no compartir la carpeta de perfil con un bot en ejecución
+        driver = crear_driver_stealth(cfg, perfil, indice=90, bloqueo=bloqueo, red_en_log=True)
+        try:
+            medidas = [medir_carga(driver, url) for _ in range(repeticiones)]
+        finally:
+            driver.quit()
+        resultados[modo] = {clave: statistics.median(m[clave] for m in medidas) for clave in medidas[0]}
+        logger.info(f"{perfil} {modo}: {resultados[modo]}")
+
+    sin, con = resultados["sin_bloqueo"], resultados["con_bloqueo"]
+    resultados["reduccion"] = {
+        "segundos_pct": round(100 * (1 - con["segundos"] / sin["segundos"]), 1) if sin["segundos"] else None,
+        "kb_pct": round(100 * (1 - con["kb"] / sin["kb"]), 1) if sin["kb"] else None,
+    }
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la carga de una página sin y con el perfil de bloqueo de recursos")
+    parser.add_argument("--perfil", choices=sorted(PERFILES_BLOQUEO), required=True)
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    from config.config import cargar_configuracion
+    print(json.dumps(comparar(cargar_configuracion(), args.perfil, args.url, args.repeticiones), indent=2))
+
+if __name__ == "__main__":
+    main()
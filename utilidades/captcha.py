@@ -0,0 +1,484 @@
+import base64
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import unquote
+import requests
+from anticaptchaofficial.imagecaptcha import imagecaptcha
+from utilidades.captcha_local import EXTENSIONES_MUESTRA, ReconocedorLocal
+from utilidades.metricas import RegistroMetricas, registrar_resumen
+from utilidades.trazas import span
+
+logger = logging.getLogger("Utils - Captcha")
+
+# Hilos de fondo para resolver captchas mientras el bot sigue interactuando con la página
+_ejecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="captcha")
+# Hilos para las peticiones a los proveedores (incluidas las de cobertura)
+_ejecutor_proveedores = ThreadPoolExecutor(max_workers=6, thread_name_prefix="captcha-proveedor")
+
+_metricas = RegistroMetricas()
+
+# Dibuja el <img> del captcha en un canvas y lo devuelve como PNG (data URI); el propio navegador
+# rasteriza así un captcha SVG, sin dependencias adicionales en Python
+SCRIPT_RASTERIZAR = """
+var img = arguments[0];
+var rect = img.getBoundingClientRect();
+var lienzo = document.createElement('canvas');
+lienzo.width = img.naturalWidth || Math.round(rect.width);
+lienzo.height = img.naturalHeight || Math.round(rect.height);
+var contexto = lienzo.getContext('2d');
+contexto.fillStyle = '#ffffff';
+contexto.fillRect(0, 0, lienzo.width, lienzo.height);
+contexto.drawImage(img, 0, 0, lienzo.width, lienzo.height);
+return lienzo.toDataURL('image/png');
+"""
+
+def es_svg(imagen):
+    return imagen.lstrip().startswith(b"<")
+
+def imagen_desde_src(src):
+    """
+    Obtiene los bytes de la imagen directamente del atributo src (data URI), sin archivo temporal.
+
+    Args:
+        src (str): Valor del atributo src del <img> del captcha
+
+    Returns:
+        bytes: Contenido de la imagen
+    """
+    if not src or not src.startswith("data:"):
+        raise ValueError(f"El captcha no es un data URI: {str(src)[:60]}")
+    cabecera, datos = src.split(",", 1)
+    if cabecera.endswith(";base64"):
+        return base64.b64decode(datos)
+    return unquote(datos).encode("utf-8")
+
+def imagen_captcha(driver, elemento):
+    """
+    Obtiene los bytes del <img> del captcha como mapa de bits. Un captcha SVG (el BCP lo ha servido
+    como image/svg+xml) se rasteriza a PNG en el navegador, para que el reconocedor local, el
+    harness de muestras y los proveedores remotos reciban siempre la misma imagen.
+
+    Returns:
+        bytes: Imagen PNG, GIF o JPEG
+    """
+    imagen = imagen_desde_src(elemento.get_attribute("src"))
+    if es_svg(imagen):
+        imagen = imagen_desde_src(driver.execute_script(SCRIPT_RASTERIZAR, elemento))
+        logger.info(f"Captcha SVG rasterizado a PNG en el navegador ({len(imagen)} bytes)")
+    return imagen
+
+class ProveedorCaptcha:
+    """
+    Interfaz de un proveedor de resolución de captchas de imagen.
+    """
+    nombre = "proveedor"
+
+    def resolver(self, imagen):
+        """
+        Args:
+            imagen (bytes): Contenido de la imagen
+
+        Returns:
+            tuple: (texto, ticket); el ticket identifica la tarea para reportar una respuesta incorrecta
+        """
+        raise NotImplementedError
+
+    def reportar_incorrecto(self, ticket):
+        """
+        Informa al proveedor que la respuesta fue incorrecta (algunos devuelven el importe).
+        """
+
+class ProveedorAntiCaptcha(ProveedorCaptcha):
+    nombre = "anticaptcha"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def resolver(self, imagen):
+        solver = imagecaptcha()
+        solver.set_verbose(1)
+        solver.set_key(self.api_key)
+        texto = solver.solve_and_return_solution(None, body=imagen)
+        if texto == 0:
+            raise Exception(f"Error al resolver captcha con AntiCaptcha: {solver.error_code}")
+        return texto, solver
+
+    def reportar_incorrecto(self, ticket):
+        ticket.report_incorrect_image_captcha()
+
+class Proveedor2Captcha(ProveedorCaptcha):
+    nombre = "2captcha"
+    URL = "https://2captcha.com"
+
+    def __init__(self, api_key, intervalo=2.0, timeout=120):
+        self.api_key = api_key
+        self.intervalo = intervalo
+        self.timeout = timeout
+
+    def resolver(self, imagen):
+        respuesta = requests.post(f"{self.URL}/in.php", data={
+            "key": self.api_key, "method": "base64", "json": 1, "body": base64.b64encode(imagen).decode("ascii"),
+        }, timeout=30).json()
+        if respuesta.get("status") != 1:
+            raise Exception(f"Error al enviar captcha a 2Captcha: {respuesta.get('request')}")
+        tarea = respuesta["request"]
+
+        limite = time.perf_counter() + self.timeout
+        while time.perf_counter() < limite:
+            time.sleep(self.intervalo)
+            respuesta = requests.get(f"{self.URL}/res.php", params={
+                "key": self.api_key, "action": "get", "id": tarea, "json": 1,
+            }, timeout=30).json()
+            if respuesta.get("status") == 1:
+                return respuesta["request"], tarea
+            if respuesta.get("request") != "CAPCHA_NOT_READY":
+                raise Exception(f"Error al resolver captcha con 2Captcha: {respuesta.get('request')}")
+        raise TimeoutError(f"2Captcha no resolvió el captcha en {self.timeout} s")
+
+    def reportar_incorrecto(self, ticket):
+        requests.get(f"{self.URL}/res.php", params={"key": self.api_key, "action": "reportbad", "id": ticket}, timeout=30)
+
+class ProveedorPrueba(ProveedorCaptcha):
+    """
+    Proveedor local para pruebas: devuelve un texto fijo tras una demora, sin llamar a ningún servicio.
+    """
+    nombre = "prueba"
+
+    def __init__(self, texto="0000", demora=0.0):
+        self.texto = texto
+        self.demora = demora
+
+    def resolver(self, imagen):
+        time.sleep(self.demora)
+        return self.texto, None
+
+class ConfianzaInsuficiente(Exception):
+    """
+    El reconocedor local leyó el captcha con una confianza menor al umbral.
+    """
+
+class ProveedorLocal(ProveedorCaptcha):
+    """
+    Reconocedor local en CPU; solo responde si su confianza alcanza el umbral.
+    """
+    nombre = "local"
+
+    def __init__(self, reconocedor, umbral=0.8):
+        self.reconocedor = reconocedor
+        self.umbral = float(umbral)
+
+    def resolver(self, imagen):
+        texto, confianza = self.reconocedor.reconocer(imagen)
+        if confianza < self.umbral:
+            raise ConfianzaInsuficiente(f"Captcha local '{texto}' con confianza {confianza:.2f} < {self.umbral:.2f}")
+        logger.info(f"Captcha reconocido localmente con confianza {confianza:.2f}")
+        return texto, confianza
+
+class EstadisticasProveedor:
+    """
+    Tiempos de resolución y aciertos de las últimas 'ventana' resoluciones de un proveedor.
+    """
+
+    def __init__(self, ventana=20):
+        self.latencias = deque(maxlen=ventana)
+        self.aciertos = deque(maxlen=ventana)
+        self.errores = 0
+
+    def latencia_media(self):
+        return sum(self.latencias) / len(self.latencias) if self.latencias else None
+
+    def tasa_acierto(self):
+        return sum(self.aciertos) / len(self.aciertos) if self.aciertos else None
+
+    def puntaje(self):
+        """
+        Segundos esperados por respuesta correcta (menor es mejor). Los errores cuentan como
+        respuestas incorrectas. Los proveedores sin historial puntúan 0 para que reciban captchas
+        y se puedan medir; los que solo acumulan errores van al final.
+        """
+        latencia = self.latencia_media()
+        if latencia is None:
+            return float("inf") if self.aciertos else 0.0
+        return latencia / max(self.tasa_acierto() if self.aciertos else 1.0, 0.05)
+
+class Respuesta:
+    """
+    Texto de un captcha junto con el proveedor y el ticket que lo resolvieron.
+    """
+
+    def __init__(self, texto, proveedor, ticket, latencia, imagen=None):
+        self.texto = texto
+        self.proveedor = proveedor
+        self.ticket = ticket
+        self.latencia = latencia
+        self.imagen = imagen
+
+class ResolutorCaptcha:
+    """
+    Resuelve captchas con varios proveedores. Si hay reconocedor local lo intenta primero y solo
+    recurre a los remotos cuando su confianza no alcanza el umbral. Envía el captcha al proveedor
+    remoto con mejor puntaje; si no responde antes de 'umbral_cobertura' segundos (o falla) lanza
+    el mismo captcha al siguiente, y se queda con la primera respuesta. Lleva estadísticas móviles
+    por proveedor.
+    """
+
+    def __init__(self, proveedores, umbral_cobertura=8.0, ventana=20, timeout=120, local=None, ruta_muestras=None, max_muestras=2000):
+        """
+        Args:
+            proveedores (list): Instancias de ProveedorCaptcha, en orden de preferencia inicial
+            umbral_cobertura (float): Segundos sin respuesta tras los que se lanza una petición de cobertura
+            ventana (int): Resoluciones recientes que cuentan en las estadísticas
+            timeout (float): Máximo de segundos en total
+            local (ProveedorLocal): Reconocedor local opcional
+            ruta_muestras (str): Carpeta donde guardar las imágenes de respuestas correctas (muestras de entrenamiento)
+            max_muestras (int): Muestras que se conservan; al superarlo se borran las más antiguas
+        """
+        if not proveedores:
+            raise ValueError("Se necesita al menos un proveedor de captcha")
+        self.proveedores = list(proveedores)
+        self.umbral_cobertura = float(umbral_cobertura)
+        self.timeout = float(timeout)
+        self.local = local
+        self.ruta_muestras = ruta_muestras
+        self.max_muestras = int(max_muestras)
+        self.estadisticas = {p.nombre: EstadisticasProveedor(int(ventana)) for p in self.proveedores + ([local] if local else [])}
+        self.bloqueo = threading.Lock()
+
+    def ordenados(self):
+        with self.bloqueo:
+            return sorted(self.proveedores, key=lambda p: self.estadisticas[p.nombre].puntaje())
+
+    def _resolver_con(self, proveedor, imagen):
+        inicio = time.perf_counter()
+        try:
+            texto, ticket = proveedor.resolver(imagen)
+        except Exception:
+            with self.bloqueo:
+                self.estadisticas[proveedor.nombre].errores += 1
+                self.estadisticas[proveedor.nombre].aciertos.append(0)
+            raise
+        latencia = time.perf_counter() - inicio
+        with self.bloqueo:
+            self.estadisticas[proveedor.nombre].latencias.append(latencia)
+        return Respuesta(texto, proveedor, ticket, latencia, imagen)
+
+    def resolver(self, imagen):
+        """
+        Args:
+            imagen (bytes): Contenido de la imagen
+
+        Returns:
+            Respuesta: Primera respuesta obtenida
+        """
+        if self.local is not None:
+            try:
+                return self._resolver_con(self.local, imagen)
+            except ConfianzaInsuficiente as e:
+                logger.info(f"{e}; se usa un proveedor remoto")
+            except Exception as e:
+                logger.warning(f"El reconocedor local falló: {e}; se usa un proveedor remoto")
+
+        pendientes_proveedores = self.ordenados()
+        limite = time.perf_counter() + self.timeout
+        en_curso = {}
+        ultimo_error = None
+
+        def lanzar():
+            proveedor = pendientes_proveedores.pop(0)
+            en_curso[_ejecutor_proveedores.submit(self._resolver_con, proveedor, imagen)] = proveedor
+            return proveedor
+
+        lanzar()
+        while en_curso:
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                break
+            # Si quedan proveedores sin usar solo se espera hasta el umbral de cobertura
+            espera = min(self.umbral_cobertura, restante) if pendientes_proveedores else restante
+            listos, _ = wait(en_curso, timeout=espera, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                proveedor = en_curso.pop(futuro)
+                if futuro.exception() is None:
+                    respuesta = futuro.result()
+                    logger.info(f"Captcha resuelto por {proveedor.nombre} en {respuesta.latencia:.1f} s "
+                                f"({len(en_curso)} peticiones de cobertura descartadas)")
+                    return respuesta
+                ultimo_error = futuro.exception()
+                logger.warning(f"El proveedor {proveedor.nombre} falló: {ultimo_error}")
+            if pendientes_proveedores and (not listos or not en_curso):
+                proveedor = lanzar()
+                logger.info(f"Petición de cobertura del captcha enviada a {proveedor.nombre}")
+        raise Exception(f"Ningún proveedor resolvió el captcha: {ultimo_error or 'timeout'}")
+
+    def confirmar(self, respuesta, correcto):
+        """
+        Registra si la respuesta fue aceptada por el portal; si no, la reporta al proveedor.
+        """
+        with self.bloqueo:
+            self.estadisticas[respuesta.proveedor.nombre].aciertos.append(1 if correcto else 0)
+        if correcto and self.ruta_muestras and respuesta.imagen:
+            guardar_muestra(self.ruta_muestras, respuesta.imagen, respuesta.texto, self.max_muestras)
+        if not correcto:
+            try:
+                respuesta.proveedor.reportar_incorrecto(respuesta.ticket)
+            except Exception as e:
+                logger.warning(f"No se pudo reportar el captcha incorrecto a {respuesta.proveedor.nombre}: {e}")
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Por proveedor: resoluciones en la ventana, latencia media, tasa de acierto, errores y puntaje
+        """
+        with self.bloqueo:
+            return {
+                nombre: {
+                    "resoluciones": len(e.latencias),
+                    "latencia_media_seg": round(e.latencia_media(), 2) if e.latencias else None,
+                    "tasa_acierto": round(e.tasa_acierto(), 2) if e.aciertos else None,
+                    "errores": e.errores,
+                    "puntaje": round(e.puntaje(), 2) if e.latencias or not e.aciertos else None,
+                }
+                for nombre, e in self.estadisticas.items()
+            }
+
+def guardar_muestra(carpeta, imagen, texto, maximo=None):
+    """
+    Guarda la imagen de un captcha aceptado como muestra etiquetada ('<texto>_<sello>.<ext>')
+    para entrenar el reconocedor local. Con maximo, conserva solo las 'maximo' muestras más recientes.
+    """
+    if es_svg(imagen):
+        # imagen_captcha ya rasteriza los SVG; el reconocedor local solo lee imágenes de mapa de bits
+        logger.warning("Muestra de captcha en SVG sin rasterizar, no se guarda")
+        return
+    try:
+        extension = ".png" if imagen.startswith(b"\x89PNG") else ".gif" if imagen.startswith(b"GIF8") else ".jpg"
+        carpeta = Path(carpeta)
+        carpeta.mkdir(parents=True, exist_ok=True)
+        (carpeta / f"{texto}_{time.strftime('%Y%m%d%H%M%S')}{extension}").write_bytes(imagen)
+        if maximo:
+            muestras = sorted((m for m in carpeta.iterdir() if m.suffix.lower() in EXTENSIONES_MUESTRA),
+                              key=lambda m: m.stat().st_mtime)
+            for antigua in muestras[:max(0, len(muestras) - maximo)]:
+                antigua.unlink(missing_ok=True)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la muestra de captcha: {e}")
+
+_resolutor = None
+_bloqueo_resolutor = threading.Lock()
+
+def obtener_resolutor(cfg):
+    """
+    Devuelve el resolutor del proceso, creado con los proveedores de la sección [captcha].
+    Se conserva entre ciclos para que las estadísticas móviles guíen la elección del proveedor.
+
+    Returns:
+        ResolutorCaptcha
+    """
+    global _resolutor
+    with _bloqueo_resolutor:
+        if _resolutor is None:
+            seccion = cfg['captcha']
+            nombres = seccion['proveedores']
+            if isinstance(nombres, str):
+                nombres = [nombres]
+            disponibles = {
+                "anticaptcha": lambda: ProveedorAntiCaptcha(cfg['env_vars']['anticaptcha']['api_key']),
+                "2captcha": lambda: Proveedor2Captcha(cfg['env_vars']['twocaptcha']['api_key']),
+                "prueba": lambda: ProveedorPrueba(seccion['texto_prueba']),
+            }
+            local = None
+            if str(seccion['local_habilitado']).lower() == "true":
+                try:
+                    local = ProveedorLocal(ReconocedorLocal.cargar(seccion['local_modelo']), seccion['local_umbral'])
+                except Exception as e:
+                    logger.warning(f"No se pudo cargar el modelo local de captcha ({seccion['local_modelo']}): {e}")
+            guardar = str(seccion['guardar_muestras']).lower() == "true"
+            _resolutor = ResolutorCaptcha(
+                [disponibles[nombre.strip()]() for nombre in nombres if nombre.strip()],
+                umbral_cobertura=seccion['umbral_cobertura_seg'],
+                ventana=seccion['ventana_estadisticas'],
+                local=local,
+                ruta_muestras=cfg['rutas']['ruta_muestras_captcha'] if guardar else None,
+                max_muestras=seccion['max_muestras'],
+            )
+        return _resolutor
+
+class CaptchaEnCurso:
+    """
+    Resolución de un captcha en un hilo de fondo. Se lanza en cuanto aparece la imagen y la
+    respuesta se recoge con resultado() recién cuando el bot llega al campo del captcha.
+    """
+
+    def __init__(self, resolver, categoria="bot"):
+        """
+        Args:
+            resolver (callable): Función sin argumentos que devuelve el texto del captcha
+            categoria (str): Categoría del span en la traza
+        """
+        self.categoria = categoria
+        self.inicio = time.perf_counter()
+        self.latencia = None
+        self.futuro = _ejecutor.submit(self._resolver, resolver)
+
+    def _resolver(self, resolver):
+        with span("solve_captcha", self.categoria):
+            try:
+                return resolver()
+            finally:
+                self.latencia = time.perf_counter() - self.inicio
+
+    def resultado(self, timeout=180):
+        """
+        Bloquea hasta tener la respuesta (o el error) de la resolución.
+
+        Returns:
+            Respuesta: Respuesta del proveedor; el texto está en .texto y se pasa completa a
+                resolutor.confirmar() para reportar si el captcha fue correcto
+        """
+        inicio_espera = time.perf_counter()
+        try:
+            with span("esperar_captcha", self.categoria):
+                respuesta = self.futuro.result(timeout=timeout)
+        finally:
+            espera = time.perf_counter() - inicio_espera
+            _registrar(self.latencia, espera, self.futuro.done() and self.futuro.exception() is None)
+        logger.info(f"Captcha resuelto en {self.latencia:.1f} s; el login esperó {espera:.1f} s por la respuesta")
+        return respuesta
+
+def _registrar(latencia, espera, exito):
+    _metricas.agregar(latencia, espera, exito)
+
+def resumen_captchas(reiniciar=False):
+    """
+    Returns:
+        dict: Captchas, errores, latencia de resolución (media y máxima) y tiempo que el login
+            quedó bloqueado esperando la respuesta
+    """
+    metricas = _metricas.tomar(reiniciar)
+    latencias = [m[0] for m in metricas if m[0] is not None]
+    return {
+        "captchas": len(metricas),
+        "errores": sum(1 for m in metricas if not m[2]),
+        "latencia_media_seg": round(sum(latencias) / len(latencias), 2) if latencias else 0.0,
+        "latencia_max_seg": round(max(latencias), 2) if latencias else 0.0,
+        "espera_bloqueante_seg": round(sum(m[1] for m in metricas), 2),
+    }
+
+def registrar_resumen_captchas(titulo="Captchas"):
+    """
+    Escribe en el log el resumen de captchas del proceso y las estadísticas por proveedor,
+    y vacía las métricas.
+    """
+    resumen = resumen_captchas(reiniciar=True)
+    if resumen["captchas"]:
+        logger.info(f"{titulo}: {resumen}")
+        if _resolutor is not None:
+            for nombre, item in _resolutor.resumen().items():
+                logger.info(f"  {nombre}: {item}")
+    return resumen
+
+registrar_resumen("Captchas", registrar_resumen_captchas)
@@ -0,0 +1,234 @@
+import argparse
+import io
+import json
+import logging
+import random
+import time
+from pathlib import Path
+from PIL import Image
+
+logger = logging.getLogger("Utils - Captcha local")
+
+# Reconocedor local (solo CPU, con Pillow): binariza la imagen, separa los caracteres por columnas
+# y clasifica cada uno con k vecinos más cercanos. Uso: python -m utilidades.captcha_local entrenar|evaluar
+
+ANCHO_CARACTER = 12
+ALTO_CARACTER = 16
+EXTENSIONES_MUESTRA = (".png", ".jpg", ".jpeg", ".gif", ".bmp")
+
+def _umbral_otsu(histograma):
+    total = sum(histograma)
+    suma_total = sum(i * h for i, h in enumerate(histograma))
+    suma_fondo, peso_fondo, mejor, umbral = 0.0, 0, 0.0, 127
+    for i, h in enumerate(histograma):
+        peso_fondo += h
+        if not peso_fondo or peso_fondo == total:
+            continue
+        suma_fondo += i * h
+        media_fondo = suma_fondo / peso_fondo
+        media_frente = (suma_total - suma_fondo) / (total - peso_fondo)
+        varianza = peso_fondo * (total - peso_fondo) * (media_fondo - media_frente) ** 2
+        if varianza > mejor:
+            mejor, umbral = varianza, i
+    return umbral
+
+def binarizar(imagen):
+    """
+    Convierte la imagen a tinta (1) y fondo (0) con umbral de Otsu; la tinta es la clase minoritaria.
+
+    Args:
+        imagen (bytes): Contenido de la imagen
+
+    Returns:
+        PIL.Image.Image: Imagen en modo '1'
+    """
+    gris = Image.open(io.BytesIO(imagen)).convert("L")
+    umbral = _umbral_otsu(gris.histogram())
+    oscuros = sum(gris.histogram()[:umbral + 1])
+    tinta_oscura = oscuros <= gris.width * gris.height / 2
+    return gris.point(lambda p: 255 if (p <= umbral) == tinta_oscura else 0, mode="1")
+
+def segmentar(binaria, longitud=0, ancho_minimo=2):
+    """
+    Separa los caracteres por columnas sin tinta. Si se conoce la longitud del captcha, divide
+    los segmentos más anchos (caracteres pegados) hasta alcanzarla.
+
+    Returns:
+        list: Recortes (PIL.Image.Image) de cada carácter, de izquierda a derecha
+    """
+    ancho, alto = binaria.size
+    pixeles = binaria.load()
+    columnas = [any(pixeles[x, y] for y in range(alto)) for x in range(ancho)]
+
+    segmentos, inicio = [], None
+    for x, con_tinta in enumerate(columnas + [False]):
+        if con_tinta and inicio is None:
+            inicio = x
+        elif not con_tinta and inicio is not None:
+            if x - inicio >= ancho_minimo:
+                segmentos.append((inicio, x))
+            inicio = None
+
+    while longitud and 0 < len(segmentos) < longitud:
+        i = max(range(len(segmentos)), key=lambda j: segmentos[j][1] - segmentos[j][0])
+        a, b = segmentos[i]
+        if b - a < 2 * ancho_minimo:
+            break
+        segmentos[i:i + 1] = [(a, (a + b) // 2), ((a + b) // 2, b)]
+
+    recortes = []
+    for a, b in segmentos:
+        recorte = binaria.crop((a, 0, b, alto))
+        caja = recorte.getbbox()
+        recortes.append(recorte.crop(caja) if caja else recorte)
+    return recortes
+
+def vectorizar(recorte):
+    normalizado = recorte.convert("L").resize((ANCHO_CARACTER, ALTO_CARACTER))
+    return [1 if p > 127 else 0 for p in normalizado.getdata()]
+
+class ReconocedorLocal:
+    """
+    Clasificador k-NN de caracteres sobre vectores binarios de ANCHO_CARACTER x ALTO_CARACTER.
+    """
+
+    def __init__(self, muestras=None, k=3, longitud=0):
+        """
+        Args:
+            muestras (list): Pares (vector, carácter)
+            k (int): Vecinos que votan cada carácter
+            longitud (int): Caracteres del captcha (0 = desconocida)
+        """
+        self.muestras = muestras or []
+        self.k = int(k)
+        self.longitud = int(longitud)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with open(ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        return cls([(m[0], m[1]) for m in datos["muestras"]], k=datos["k"], longitud=datos["longitud"])
+
+    def guardar(self, ruta):
+        Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({"k": self.k, "longitud": self.longitud, "muestras": self.muestras}, f)
+
+    def agregar(self, imagen, texto):
+        """
+        Agrega al modelo los caracteres de una imagen etiquetada.
+
+        Returns:
+            bool: False si la segmentación no coincide con la longitud del texto (la muestra se descarta)
+        """
+        recortes = segmentar(binarizar(imagen), len(texto))
+        if len(recortes) != len(texto):
+            return False
+        self.muestras.extend((vectorizar(r), c) for r, c in zip(recortes, texto))
+        return True
+
+    def _clasificar(self, vector):
+        distancias = sorted(
+            (sum(a != b for a, b in zip(vector, muestra)), caracter) for muestra, caracter in self.muestras
+        )[:self.k]
+        votos = {}
+        for _, caracter in distancias:
+            votos[caracter] = votos.get(caracter, 0) + 1
+        caracter = max(votos, key=lambda c: (votos[c], -min(d for d, x in distancias if x == c)))
+        return caracter, votos[caracter] / len(distancias)
+
+    def reconocer(self, imagen):
+        """
+        Args:
+            imagen (bytes): Contenido de la imagen
+
+        Returns:
+            tuple: (texto, confianza entre 0 y 1). La confianza es la del carácter menos votado;
+                es 0 si la imagen no se puede leer o la segmentación no da la longitud esperada
+        """
+        if not self.muestras:
+            return "", 0.0
+        try:
+            recortes = segmentar(binarizar(imagen), self.longitud)
+        except Exception as e:
+            logger.info(f"Imagen de captcha no legible localmente: {e}")
+            return "", 0.0
+        if not recortes or (self.longitud and len(recortes) != self.longitud):
+            return "", 0.0
+        resultados = [self._clasificar(vectorizar(r)) for r in recortes]
+        return "".join(c for c, _ in resultados), min(conf for _, conf in resultados)
+
+def cargar_muestras(carpeta):
+    """
+    Returns:
+        list: Pares (bytes de la imagen, texto) de las imágenes de la carpeta
+    """
+    muestras = []
+    for ruta in sorted(Path(carpeta).iterdir()):
+        if ruta.suffix.lower() in EXTENSIONES_MUESTRA:
+            muestras.append((ruta.read_bytes(), ruta.stem.split("_")[0]))
+    return muestras
+
+def evaluar(reconocedor, muestras, umbral=0.0):
+    """
+    Returns:
+        dict: Exactitud por captcha y por carácter, cobertura y exactitud sobre el umbral,
+            y latencia por imagen (media, p95 y máxima, en ms)
+    """
+    latencias, aciertos, caracteres, aciertos_caracter, cubiertas, aciertos_cubiertas = [], 0, 0, 0, 0, 0
+    for imagen, texto in muestras:
+        inicio = time.perf_counter()
+        prediccion, confianza = reconocedor.reconocer(imagen)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        aciertos += prediccion == texto
+        caracteres += len(texto)
+        aciertos_caracter += sum(a == b for a, b in zip(prediccion, texto))
+        if confianza >= umbral:
+            cubiertas += 1
+            aciertos_cubiertas += prediccion == texto
+    latencias.sort()
+    total = len(muestras) or 1
+    return {
+        "muestras": len(muestras),
+        "exactitud": round(aciertos / total, 3),
+        "exactitud_caracter": round(aciertos_caracter / (caracteres or 1), 3),
+        "umbral": umbral,
+        "cobertura": round(cubiertas / total, 3),
+        "exactitud_sobre_umbral": round(aciertos_cubiertas / cubiertas, 3) if cubiertas else None,
+        "latencia_media_ms": round(sum(latencias) / total, 2),
+        "latencia_p95_ms": round(latencias[int(0.95 * (len(latencias) - 1))], 2) if latencias else 0.0,
+        "latencia_max_ms": round(latencias[-1], 2) if latencias else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrenamiento y evaluación del reconocedor local de captchas")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    entrenar = subcomandos.add_parser("entrenar", help="Crea el modelo con las muestras etiquetadas de una carpeta")
+    entrenar.add_argument("carpeta")
+    entrenar.add_argument("--modelo", required=True)
+    entrenar.add_argument("--k", type=int, default=3)
+    entrenar.add_argument("--longitud", type=int, default=0)
+    entrenar.add_argument("--prueba", type=float, default=0.2, help="Fracción de muestras reservada para evaluar")
+    entrenar.add_argument("--umbral", type=float, default=0.8)
+    evaluar_cmd = subcomandos.add_parser("evaluar", help="Evalúa un modelo sobre las muestras de una carpeta")
+    evaluar_cmd.add_argument("carpeta")
+    evaluar_cmd.add_argument("--modelo", required=True)
+    evaluar_cmd.add_argument("--umbral", type=float, default=0.8)
+    args = parser.parse_args()
+
+    muestras = cargar_muestras(args.carpeta)
+    if args.comando == "entrenar":
+        random.Random(0).shuffle(muestras)
+        corte = int(len(muestras) * (1 - args.prueba))
+        reconocedor = ReconocedorLocal(k=args.k, longitud=args.longitud)
+        descartadas = sum(not reconocedor.agregar(imagen, texto) for imagen, texto in muestras[:corte])
+        reconocedor.guardar(args.modelo)
+        print(f"Modelo guardado en {args.modelo}: {len(reconocedor.muestras)} caracteres de "
+              f"{corte - descartadas} imágenes ({descartadas} descartadas por segmentación)")
+        if muestras[corte:]:
+            print(json.dumps(evaluar(reconocedor, muestras[corte:], args.umbral), indent=2))
+    else:
+        print(json.dumps(evaluar(ReconocedorLocal.cargar(args.modelo), muestras, args.umbral), indent=2))
+
+if __name__ == "__main__":
+    main()
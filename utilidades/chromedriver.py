@@ -0,0 +1,131 @@
+import logging
+import os
+import platform
+import re
+import shutil
+import stat
+import subprocess
+from pathlib import Path
+
+logger = logging.getLogger("Utils - ChromeDriver")
+
+# Binarios de Chrome que se prueban, por sistema operativo, si no se define CHROME_BIN/CHROME_PATH
+BINARIOS_CHROME = {
+    "Linux": ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser"],
+    "Darwin": ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"],
+    "Windows": [
+        r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+        r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+    ],
+}
+
+def _version_mayor(texto):
+    coincidencia = re.search(r"(\d+)\.\d+\.\d+(\.\d+)?", texto or "")
+    return int(coincidencia.group(1)) if coincidencia else None
+
+def _ejecutar_version(binario):
+    try:
+        resultado = subprocess.run([binario, "--version"], capture_output=True, text=True, timeout=15)
+        return resultado.stdout.strip()
+    except Exception:
+        return ""
+
+def version_chrome():
+    """
+    Detecta la versión mayor del Chrome instalado sin usar la red.
+
+    Returns:
+        int: Versión mayor de Chrome, o None si no se pudo detectar
+    """
+    sistema = platform.system()
+    if sistema == "Windows":
+        try:
+            import winreg
+            for raiz in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+                try:
+                    with winreg.OpenKey(raiz, r"Software\Google\Chrome\BLBeacon") as clave:
+                        return _version_mayor(winreg.QueryValueEx(clave, "version")[0])
+                except OSError:
+                    continue
+        except ImportError:
+            pass
+
+    candidatos = [os.getenv("CHROME_BIN"), os.getenv("CHROME_PATH")] + BINARIOS_CHROME.get(sistema, [])
+    for candidato in candidatos:
+        if not candidato:
+            continue
+        binario = shutil.which(candidato) or (candidato if Path(candidato).exists() else None)
+        if binario:
+            version = _version_mayor(_ejecutar_version(binario))
+            if version:
+                return version
+    return None
+
+def _nombre_binario():
+    return "chromedriver.exe" if platform.system() == "Windows" else "chromedriver"
+
+class ResolutorChromeDriver:
+    """
+    Resuelve el ChromeDriver que corresponde a la versión mayor del Chrome instalado usando una
+    caché en disco (<ruta_drivers>/<versión mayor>/chromedriver). Solo recurre a la red
+    (ChromeDriverManager) si no hay un binario compatible en la caché ni en CHROMEDRIVER_PATH.
+    """
+
+    def __init__(self, ruta_drivers):
+        """
+        Args:
+            ruta_drivers (str): Carpeta raíz de la caché de ChromeDriver
+        """
+        self.ruta_drivers = Path(ruta_drivers)
+        self.validados = {}
+
+    def ruta_cache(self, version):
+        return self.ruta_drivers / str(version) / _nombre_binario()
+
+    def _es_valido(self, ruta, version):
+        """
+        Comprueba una sola vez por proceso que el binario existe, es ejecutable y su versión
+        mayor coincide con la de Chrome.
+        """
+        clave = (str(ruta), version)
+        if clave not in self.validados:
+            valido = False
+            if ruta and Path(ruta).is_file() and os.access(ruta, os.X_OK):
+                version_driver = _version_mayor(_ejecutar_version(str(ruta)))
+                valido = version is None or version_driver == version
+                if not valido:
+                    logger.info(f"ChromeDriver {ruta} es versión {version_driver}, Chrome es {version}")
+            self.validados[clave] = valido
+        return self.validados[clave]
+
+    def resolver(self):
+        """
+        Returns:
+            str: Ruta de un ChromeDriver compatible con el Chrome instalado
+        """
+        version = version_chrome()
+        logger.info(f"Versión mayor de Chrome instalada: {version}")
+
+        candidatos = []
+        if version is not None:
+            candidatos.append(self.ruta_cache(version))
+        if os.getenv("CHROMEDRIVER_PATH"):
+            candidatos.append(Path(os.getenv("CHROMEDRIVER_PATH")))
+        for candidato in candidatos:
+            if self._es_valido(candidato, version):
+                logger.info(f"ChromeDriver local compatible: {candidato}")
+                return str(candidato)
+
+        # Sin binario compatible en disco: se descarga una vez y se guarda en la caché
+        logger.info("No hay ChromeDriver compatible en caché, descargando con ChromeDriverManager")
+        from webdriver_manager.chrome import ChromeDriverManager
+        descargado = Path(ChromeDriverManager().install())
+        version_descargada = version or _version_mayor(_ejecutar_version(str(descargado)))
+        if version_descargada is None:
+            return str(descargado)
+        destino = self.ruta_cache(version_descargada)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(descargado, destino)
+        destino.chmod(destino.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        logger.info(f"ChromeDriver {version_descargada} guardado en caché: {destino}")
+        return str(destino)
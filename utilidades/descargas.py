@@ -0,0 +1,236 @@
+import json
+import logging
+import time
+from pathlib import Path
+from utilidades.metricas import RegistroMetricas, registrar_resumen
+
+logger = logging.getLogger("Utils - Descargas")
+
+# Extensiones de archivos que Chrome usa mientras la descarga está en curso
+EXTENSIONES_PARCIALES = (".crdownload", ".tmp", ".part")
+
+# Eventos de descarga de DevTools. ChromeDriver solo vuelca al log de rendimiento los dominios
+# Network y Page, por eso se aceptan también los equivalentes Page.* de los eventos Browser.*
+EVENTOS_INICIO = ("Browser.downloadWillBegin", "Page.downloadWillBegin")
+EVENTOS_PROGRESO = ("Browser.downloadProgress", "Page.downloadProgress")
+
+_metricas = RegistroMetricas()
+
+class DescargaNoCompletada(Exception):
+    """
+    Se lanza cuando no aparece un archivo nuevo y completo antes del timeout.
+    """
+
+class VigilanteDescargas:
+    """
+    Vigila la carpeta de descargas de un bot. Toma una foto de la carpeta al crearse (antes del
+    clic de descarga) y devuelve la ruta exacta del archivo nuevo en cuanto Chrome termina de
+    escribirlo: sin .crdownload pendiente y con el tamaño estable durante 'estabilidad' segundos.
+    """
+
+    def __init__(self, carpeta, estabilidad=0.5):
+        """
+        Args:
+            carpeta (str): Carpeta de descargas del navegador
+            estabilidad (float): Segundos que el tamaño debe mantenerse sin cambios
+        """
+        self.carpeta = Path(carpeta)
+        self.estabilidad = estabilidad
+        self.previos = self._foto()
+        self.inicio = time.perf_counter()
+        self.candidato = None
+
+    def _foto(self):
+        if not self.carpeta.exists():
+            return {}
+        return {p.name: (p.stat().st_size, p.stat().st_mtime) for p in self.carpeta.iterdir() if p.is_file()}
+
+    def completado(self):
+        """
+        Comprobación no bloqueante; se puede usar como condición de MotorEsperas.esperar.
+
+        Returns:
+            Path: Archivo descargado completo, o None si todavía no está listo
+        """
+        actual = self._foto()
+        # Archivos nuevos o sobrescritos desde la foto inicial
+        nuevos = [nombre for nombre, datos in actual.items() if self.previos.get(nombre) != datos]
+        if not nuevos or any(nombre.endswith(EXTENSIONES_PARCIALES) for nombre in nuevos):
+            self.candidato = None
+            return None
+        nombre = max(nuevos, key=lambda n: actual[n][1])
+        tamano = actual[nombre][0]
+        ahora = time.perf_counter()
+        if self.candidato is None or self.candidato[0] != nombre or self.candidato[1] != tamano:
+            self.candidato = (nombre, tamano, ahora)
+            return None
+        if ahora - self.candidato[2] < self.estabilidad:
+            return None
+
+        ruta = self.carpeta / nombre
+        registrar_descarga(ruta.name, tamano, ahora - self.inicio, "carpeta")
+        return ruta
+
+    def esperar(self, timeout=60, intervalo=0.2):
+        """
+        Bloquea hasta que la descarga termine.
+
+        Returns:
+            Path: Archivo descargado
+
+        Raises:
+            DescargaNoCompletada: Si vence el timeout
+        """
+        limite = time.perf_counter() + timeout
+        while time.perf_counter() < limite:
+            ruta = self.completado()
+            if ruta is not None:
+                return ruta
+            time.sleep(intervalo)
+        raise DescargaNoCompletada(f"No se completó ninguna descarga en {self.carpeta} en {timeout} s")
+
+class SeguidorDescargas:
+    """
+    Descargas de una sesión de navegador mediante DevTools. Asigna a la sesión su propia carpeta
+    (así dos navegadores que descargan a la vez no se pisan), activa los eventos de descarga y
+    lee del log de rendimiento el GUID, los bytes recibidos y el fin de cada descarga.
+    Si el navegador no emite los eventos, recurre a un VigilanteDescargas sobre la misma carpeta.
+    """
+
+    def __init__(self, driver, carpeta):
+        """
+        Args:
+            driver (webdriver.Chrome): Driver de la sesión (con el log 'performance' habilitado)
+            carpeta (str): Carpeta de descarga exclusiva de la sesión
+        """
+        self.driver = driver
+        self.carpeta = Path(carpeta)
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.descargas = {}
+        self.entregadas = set()
+        self.respaldo = None
+        self.eventos_disponibles = True
+
+        parametros = {"behavior": "allow", "downloadPath": str(self.carpeta.absolute()), "eventsEnabled": True}
+        try:
+            driver.execute_cdp_cmd("Browser.setDownloadBehavior", parametros)
+        except Exception:
+            parametros.pop("eventsEnabled")
+            driver.execute_cdp_cmd("Page.setDownloadBehavior", parametros)
+
+    def _leer_eventos(self):
+        if not self.eventos_disponibles:
+            return
+        try:
+            entradas = self.driver.get_log("performance")
+        except Exception as e:
+            logger.warning(f"Log de rendimiento no disponible, se vigila la carpeta de descarga: {e}")
+            self.eventos_disponibles = False
+            return
+
+        for entrada in entradas:
+            mensaje = json.loads(entrada["message"])["message"]
+            metodo = mensaje.get("method")
+            if metodo not in EVENTOS_INICIO and metodo not in EVENTOS_PROGRESO:
+                continue
+            parametros = mensaje["params"]
+            # Marca de tiempo del evento en el navegador (ms), no la de lectura del log
+            instante = entrada["timestamp"] / 1000
+            descarga = self.descargas.setdefault(parametros["guid"], {
+                "nombre": None, "inicio": instante, "fin": None, "recibidos": 0, "total": 0, "estado": "inProgress",
+            })
+            if metodo in EVENTOS_INICIO:
+                descarga["nombre"] = parametros.get("suggestedFilename")
+                descarga["inicio"] = instante
+                logger.info(f"Descarga iniciada: {descarga['nombre']} (guid {parametros['guid']})")
+                continue
+            descarga["recibidos"] = parametros.get("receivedBytes", descarga["recibidos"])
+            descarga["total"] = parametros.get("totalBytes", descarga["total"])
+            descarga["estado"] = parametros.get("state", descarga["estado"])
+            if descarga["estado"] != "inProgress" and descarga["fin"] is None:
+                descarga["fin"] = instante
+
+    def vigilar(self):
+        """
+        Se llama antes del clic de descarga: descarta eventos anteriores y toma la foto de la carpeta
+        para el respaldo.
+
+        Returns:
+            SeguidorDescargas: La misma instancia, para usar completado() como condición de espera
+        """
+        self._leer_eventos()
+        self.entregadas.update(self.descargas)
+        self.respaldo = VigilanteDescargas(self.carpeta)
+        return self
+
+    def completado(self):
+        """
+        Comprobación no bloqueante; se puede usar como condición de MotorEsperas.esperar.
+
+        Returns:
+            Path: Archivo descargado completo, o None si todavía no está listo
+
+        Raises:
+            DescargaNoCompletada: Si el navegador canceló la descarga
+        """
+        self._leer_eventos()
+        for guid, descarga in self.descargas.items():
+            if guid in self.entregadas:
+                continue
+            if descarga["estado"] == "canceled":
+                self.entregadas.add(guid)
+                raise DescargaNoCompletada(f"El navegador canceló la descarga {descarga['nombre']} (guid {guid})")
+            if descarga["estado"] != "completed" or not descarga["nombre"]:
+                continue
+            ruta = self.carpeta / descarga["nombre"]
+            if not ruta.exists():
+                # Chrome pudo renombrar el archivo (por ejemplo 'nombre (1).txt'); lo encuentra el respaldo
+                continue
+            self.entregadas.add(guid)
+            registrar_descarga(ruta.name, descarga["recibidos"], descarga["fin"] - descarga["inicio"], "cdp")
+            return ruta
+        return self.respaldo.completado() if self.respaldo else None
+
+def registrar_descarga(nombre, tamano, segundos, origen):
+    """
+    Registra una descarga terminada (origen: cdp, carpeta o http) para el resumen del ciclo.
+    """
+    velocidad = tamano / 1024 / segundos if segundos > 0 else 0.0
+    logger.info(f"Descarga completa ({origen}): {nombre} ({tamano / 1024:.1f} KB en {segundos:.2f} s, {velocidad:.1f} KB/s)")
+    _metricas.agregar(nombre, tamano, segundos, origen)
+
+def resumen_descargas(reiniciar=False):
+    """
+    Returns:
+        dict: Descargas, bytes, segundos y velocidad media, con el detalle de cada descarga
+    """
+    metricas = _metricas.tomar(reiniciar)
+    total_bytes = sum(m[1] for m in metricas)
+    total_segundos = sum(m[2] for m in metricas)
+    return {
+        "descargas": len(metricas),
+        "bytes": total_bytes,
+        "segundos": round(total_segundos, 2),
+        "kb_por_segundo": round(total_bytes / 1024 / total_segundos, 1) if total_segundos > 0 else 0.0,
+        "detalle": [
+            {"archivo": nombre, "bytes": tamano, "segundos": round(segundos, 2), "origen": origen}
+            for nombre, tamano, segundos, origen in metricas
+        ],
+    }
+
+def registrar_resumen_descargas(titulo="Descargas"):
+    """
+    Escribe en el log el resumen de descargas del proceso y vacía las métricas.
+    """
+    resumen = resumen_descargas(reiniciar=True)
+    if not resumen["descargas"]:
+        return resumen
+    logger.info(
+        f"{titulo}: {resumen['descargas']} descargas, {resumen['bytes'] / 1024:.1f} KB en "
+        f"{resumen['segundos']} s ({resumen['kb_por_segundo']} KB/s)"
+    )
+    for item in resumen["detalle"]:
+        logger.debug(f"  {item}")
+    return resumen
+
+registrar_resumen("Descargas", registrar_resumen_descargas)
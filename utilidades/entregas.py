@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from utilidades.metricas import ContadoresMetricas, registrar_resumen
+
+logger = logging.getLogger("Utils - Entregas")
+
+# Libro local de entregas a GESCOM: SHA-256 de cada archivo descargado cuyo contenido GESCOM aceptó,
+# por formato y cuenta. Antes de subir a Drive y enviar a GESCOM se consulta por clave primaria, así
+# un reintento o dos ciclos superpuestos no envían dos veces el mismo archivo. Con la entrega
+# incremental se registra igualmente el archivo descargado, no el de filas nuevas.
+
+BLOQUE_HASH = 1024 * 1024
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS entregas (
+    formato TEXT NOT NULL,
+    cuenta TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    archivo TEXT,
+    bytes INTEGER,
+    entregado REAL NOT NULL,
+    PRIMARY KEY (formato, cuenta, sha256)
+) WITHOUT ROWID
+"""
+
+_estadisticas = ContadoresMetricas("consultas", "duplicadas", "registradas", "bytes_evitados")
+
+def libro_habilitado(cfg):
+    return str(cfg['entregas']['habilitado']).lower() == "true"
+
+def hash_archivo(ruta_archivo, bloque=BLOQUE_HASH):
+    """
+    Returns:
+        str: SHA-256 del archivo, leído por bloques sin cargarlo completo en memoria
+    """
+    sha = hashlib.sha256()
+    with open(ruta_archivo, "rb") as f:
+        for parte in iter(lambda: f.read(bloque), b""):
+            sha.update(parte)
+    return sha.hexdigest()
+
+class Entrega:
+    """
+    Archivo a entregar con su hash. confirmar() lo registra en el libro y solo debe llamarse
+    cuando GESCOM aceptó el envío.
+    """
+
+    def __init__(self, libro, formato, cuenta, ruta, sha256, bytes_archivo, ya_entregada):
+        self.libro = libro
+        self.formato = formato
+        self.cuenta = cuenta
+        self.ruta = ruta
+        self.sha256 = sha256
+        self.bytes = bytes_archivo
+        self.ya_entregada = ya_entregada
+
+    def confirmar(self):
+        try:
+            self.libro.registrar(self.formato, self.cuenta, self.sha256, self.ruta, self.bytes)
+        except Exception as e:
+            # GESCOM ya aceptó el archivo: un fallo del libro no convierte la entrega en error
+            logger.warning(f"No se pudo registrar la entrega {self.formato} {self.cuenta}: {e}")
+
+class LibroEntregas:
+    """
+    Libro de entregas en SQLite. Cada operación abre su propia conexión, así lo pueden usar a la vez
+    el hilo de entregas del modo pipeline, los hilos del backfill y los procesos del modo paralelo.
+    """
+
+    def __init__(self, ruta_libro):
+        """
+        Args:
+            ruta_libro (str): Archivo SQLite del libro; se crea si no existe
+        """
+        self.ruta_libro = Path(ruta_libro)
+        self.ruta_libro.parent.mkdir(parents=True, exist_ok=True)
+        conexion = self._conectar()
+        try:
+            conexion.execute(ESQUEMA)
+        finally:
+            conexion.close()
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_libro, timeout=30)
+
+    def entregado(self, formato, cuenta, sha256):
+        """
+        Returns:
+            float: Instante (epoch) de la entrega anterior del mismo archivo, o None si no se entregó
+        """
+        conexion = self._conectar()
+        try:
+            fila = conexion.execute(
+                "SELECT entregado FROM entregas WHERE formato = ? AND cuenta = ? AND sha256 = ?", (formato, cuenta, sha256)
+            ).fetchone()
+        finally:
+            conexion.close()
+        return fila[0] if fila else None
+
+    def registrar(self, formato, cuenta, sha256, ruta_archivo=None, bytes_archivo=None):
+        conexion = self._conectar()
+        try:
+            with conexion:
+                conexion.execute(
+                    "INSERT OR IGNORE INTO entregas (formato, cuenta, sha256, archivo, bytes, entregado) VALUES (?, ?, ?, ?, ?, ?)",
+                    (formato, cuenta, sha256, str(ruta_archivo) if ruta_archivo else None, bytes_archivo, time.time()),
+                )
+        finally:
+            conexion.close()
+        _estadisticas.sumar(registradas=1)
+        logger.info(f"Entrega registrada: {formato} {cuenta} {sha256[:12]}")
+
+    def verificar(self, formato, cuenta, ruta_archivo):
+        """
+        Calcula el hash del archivo y consulta si ya se entregó con el mismo formato y cuenta.
+
+        Returns:
+            Entrega: Con ya_entregada=True si el archivo ya estaba en el libro
+        """
+        ruta_archivo = Path(ruta_archivo)
+        sha256 = hash_archivo(ruta_archivo)
+        bytes_archivo = ruta_archivo.stat().st_size
+        anterior = self.entregado(formato, cuenta, sha256)
+        if anterior is None:
+            _estadisticas.sumar(consultas=1)
+        else:
+            _estadisticas.sumar(consultas=1, duplicadas=1, bytes_evitados=bytes_archivo)
+        if anterior is not None:
+            logger.info(f"Archivo {ruta_archivo.name} ya entregado ({formato} {cuenta}) el "
+                        f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(anterior))}, no se envía")
+        return Entrega(self, formato, cuenta, ruta_archivo, sha256, bytes_archivo, anterior is not None)
+
+def verificar_entrega(cfg, formato, cuenta, ruta_archivo):
+    """
+    Consulta el libro de entregas según la sección [entregas].
+
+    Args:
+        cfg: Configuración cargada
+        formato (str): Formato de GESCOM (ej. 'Bcp_MovimientosDelDía')
+        cuenta (str): Cuenta o alias del archivo
+        ruta_archivo (Path): Archivo que se va a entregar
+
+    Returns:
+        Entrega: Resultado de la consulta, o None si el libro está deshabilitado o falló (se envía igual)
+    """
+    if not libro_habilitado(cfg):
+        return None
+    try:
+        return LibroEntregas(cfg['rutas']['ruta_libro_entregas']).verificar(formato, cuenta, ruta_archivo)
+    except Exception as e:
+        logger.warning(f"No se pudo consultar el libro de entregas, se envía el archivo: {e}")
+        return None
+
+def resumen_entregas(reiniciar=False):
+    """
+    Returns:
+        dict: Consultas al libro, envíos duplicados evitados, entregas registradas y bytes evitados
+    """
+    return _estadisticas.tomar(reiniciar)
+
+def registrar_resumen_entregas(titulo="Entregas"):
+    """
+    Escribe en el log el resumen del libro de entregas y reinicia las estadísticas.
+    """
+    resumen = resumen_entregas(reiniciar=True)
+    if not resumen["consultas"]:
+        return
+    logger.info(f"{titulo}: {resumen['consultas']} archivos verificados, {resumen['duplicadas']} envíos duplicados "
+                f"evitados ({resumen['bytes_evitados'] / 1024:.1f} KB), {resumen['registradas']} entregas registradas")
+
+registrar_resumen("Entregas", registrar_resumen_entregas)
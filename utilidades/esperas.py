@@ -0,0 +1,311 @@
+import logging
+import time
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from utilidades.metricas import RegistroMetricas, registrar_resumen
+
+logger = logging.getLogger("Utils - Esperas")
+
+# Monitor de red de la página: cuenta las peticiones fetch/XHR en curso (una entrada de resource
+# timing solo aparece cuando la petición termina, y el portal del BCP es Angular, sin jQuery) y
+# vacía el buffer de resource timing al llenarse, acumulando lo descartado, para que el conteo de
+# recursos no se congele en 250. Se inyecta en cada documento nuevo (ver instalar_monitor_red) y,
+# si falta, se instala en la primera consulta de red_inactiva.
+SCRIPT_MONITOR_RED = """
+(function () {
+    if (window.__monitorRed) return;
+    var monitor = window.__monitorRed = {activas: 0, descartados: 0};
+    if (window.performance && performance.setResourceTimingBufferSize) {
+        performance.setResourceTimingBufferSize(1000);
+        performance.addEventListener('resourcetimingbufferfull', function () {
+            monitor.descartados += performance.getEntriesByType('resource').length;
+            performance.clearResourceTimings();
+        });
+    }
+    if (window.fetch) {
+        var fetchOriginal = window.fetch;
+        window.fetch = function () {
+            monitor.activas++;
+            var terminar = function () { monitor.activas--; };
+            var promesa;
+            try {
+                promesa = fetchOriginal.apply(window, arguments);
+            } catch (e) {
+                terminar();
+                throw e;
+            }
+            promesa.then(terminar, terminar);
+            return promesa;
+        };
+    }
+    if (window.XMLHttpRequest) {
+        var enviarOriginal = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function () {
+            monitor.activas++;
+            this.addEventListener('loadend', function () { monitor.activas--; });
+            try {
+                return enviarOriginal.apply(this, arguments);
+            } catch (e) {
+                monitor.activas--;
+                throw e;
+            }
+        };
+    }
+})();
+"""
+
+SCRIPT_ESTADO_RED = SCRIPT_MONITOR_RED + """
+var monitor = window.__monitorRed;
+return [document.readyState,
+        monitor.descartados + performance.getEntriesByType('resource').length,
+        monitor.activas + ((window.jQuery && window.jQuery.active) || 0)];
+"""
+
+_registros = RegistroMetricas()
+
+def instalar_monitor_red(driver):
+    """
+    Inyecta el monitor de red en cada documento que cargue el driver (también en iframes), antes
+    que los scripts de la página, para que red_inactiva vea las peticiones en curso desde el inicio.
+    """
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": SCRIPT_MONITOR_RED})
+
+class MotorEsperas:
+    """
+    Sustituye las pausas fijas (time.sleep) por condiciones de disponibilidad con nombre.
+    Cada espera registra cuánto tardó realmente frente al presupuesto fijo que reemplaza,
+    para poder medir el ahorro por ejecución (ver resumen_esperas()).
+    """
+
+    def __init__(self, driver, intervalo=0.2):
+        """
+        Args:
+            driver (webdriver.Chrome): Driver sobre el que se evalúan las condiciones
+            intervalo (float): Segundos entre evaluaciones de la condición
+        """
+        self.driver = driver
+        self.intervalo = intervalo
+
+    def esperar(self, nombre, condicion, timeout, presupuesto, obligatoria=False):
+        """
+        Espera hasta que la condición devuelva un valor verdadero.
+
+        Args:
+            nombre (str): Nombre de la espera (aparece en logs y en el resumen)
+            condicion (callable): Función que recibe el driver y devuelve un valor verdadero cuando está lista
+            timeout (float): Máximo de segundos a esperar
+            presupuesto (float): Segundos de la pausa fija que reemplaza
+            obligatoria (bool): Si es True, lanza TimeoutException al vencer el timeout;
+                si es False, registra un aviso y continúa como lo hacía la pausa fija
+
+        Returns:
+            El valor devuelto por la condición, o None si venció el timeout de una espera no obligatoria
+        """
+        inicio = time.perf_counter()
+        try:
+            resultado = WebDriverWait(self.driver, timeout, poll_frequency=self.intervalo).until(condicion)
+            cumplida = True
+        except TimeoutException:
+            resultado = None
+            cumplida = False
+        esperado = time.perf_counter() - inicio
+        _registrar(nombre, esperado, presupuesto, cumplida)
+
+        if cumplida:
+            logger.info(f"Espera '{nombre}': {esperado:.2f} s (pausa fija anterior {presupuesto:.1f} s)")
+        elif obligatoria:
+            logger.error(f"Espera '{nombre}' agotó su timeout de {timeout} s")
+            raise TimeoutException(f"Condición '{nombre}' no se cumplió en {timeout} s")
+        else:
+            logger.warning(f"Espera '{nombre}' agotó su timeout de {timeout} s, se continúa")
+        return resultado
+
+    def elemento_presente(self, nombre, localizador, timeout, presupuesto, obligatoria=False):
+        """
+        Espera a que el elemento exista en el DOM y lo devuelve.
+        """
+        return self.esperar(nombre, EC.presence_of_element_located(localizador), timeout, presupuesto, obligatoria)
+
+    def elemento_visible(self, nombre, localizador, timeout, presupuesto, obligatoria=False):
+        """
+        Espera a que el elemento sea visible y lo devuelve.
+        """
+        return self.esperar(nombre, EC.visibility_of_element_located(localizador), timeout, presupuesto, obligatoria)
+
+    def elemento_clicable(self, nombre, localizador, timeout, presupuesto, obligatoria=False):
+        """
+        Espera a que el elemento sea visible y esté habilitado, y lo devuelve.
+        """
+        return self.esperar(nombre, EC.element_to_be_clickable(localizador), timeout, presupuesto, obligatoria)
+
+    def spinner_ausente(self, nombre, localizador, timeout, presupuesto, obligatoria=False):
+        """
+        Espera a que desaparezca un indicador de carga o un modal (no existe o no es visible).
+        """
+        return self.esperar(nombre, EC.invisibility_of_element_located(localizador), timeout, presupuesto, obligatoria)
+
+    def frame_cargado(self, nombre, localizador, timeout, presupuesto, obligatoria=False):
+        """
+        Espera a que el iframe exista y su documento termine de cargar, y cambia el contexto a él.
+        """
+        def condicion(driver):
+            elementos = driver.find_elements(*localizador)
+            if not elementos:
+                return False
+            estado = driver.execute_script(
+                "try { return arguments[0].contentDocument.readyState; } catch (e) { return 'complete'; }",
+                elementos[0],
+            )
+            return elementos[0] if estado == "complete" else False
+
+        frame = self.esperar(nombre, condicion, timeout, presupuesto, obligatoria)
+        if frame is not None:
+            self.driver.switch_to.frame(frame)
+        return frame
+
+    def elemento_en_vista(self, nombre, elemento, timeout, presupuesto):
+        """
+        Espera a que termine el scroll suave y el elemento quede dentro del viewport.
+        """
+        posicion = {"top": None}
+
+        def condicion(driver):
+            top, dentro = driver.execute_script(
+                "var r = arguments[0].getBoundingClientRect();"
+                "return [r.top, r.top >= 0 && r.bottom <= (window.innerHeight || document.documentElement.clientHeight)];",
+                elemento,
+            )
+            quieto = top == posicion["top"]
+            posicion["top"] = top
+            return dentro and quieto
+
+        return self.esperar(nombre, condicion, timeout, presupuesto)
+
+    def foco(self, nombre, elemento, timeout, presupuesto, tiene_foco=True):
+        """
+        Espera a que el elemento gane (o pierda, con tiene_foco=False) el foco del documento.
+        """
+        def condicion(driver):
+            activo = driver.execute_script("return document.activeElement === arguments[0];", elemento)
+            return activo == tiene_foco
+
+        return self.esperar(nombre, condicion, timeout, presupuesto)
+
+    def red_inactiva(self, nombre, timeout, presupuesto, quietud=0.5):
+        """
+        Espera a que el documento esté completo, no haya peticiones fetch/XHR (ni jQuery) en curso
+        y no se registren nuevos recursos de red durante 'quietud' segundos. Nunca lanza excepción.
+        """
+        estado = {"recursos": None, "desde": None}
+
+        def condicion(driver):
+            try:
+                listo, recursos, activas = driver.execute_script(SCRIPT_ESTADO_RED)
+            except WebDriverException:
+                return False
+            ahora = time.perf_counter()
+            if listo != "complete" or activas or recursos != estado["recursos"]:
+                estado["recursos"], estado["desde"] = recursos, ahora
+                return False
+            return ahora - estado["desde"] >= quietud
+
+        return self.esperar(nombre, condicion, timeout, presupuesto)
+
+    def sondear(self, nombre, condicion, refrescar, plazo, presupuesto, intervalo=2.0, factor=1.5, intervalo_maximo=20.0):
+        """
+        Sondeo con backoff adaptativo para resultados que el portal genera de forma asíncrona:
+        espera la condición durante 'intervalo' segundos; si no se cumple, refresca la vista y
+        vuelve a esperar con un intervalo 'factor' veces mayor (hasta 'intervalo_maximo').
+        Solo falla cuando se supera el plazo total.
+
+        Args:
+            nombre (str): Nombre de la espera (aparece en logs y en el resumen)
+            condicion (callable): Función que recibe el driver y devuelve un valor verdadero cuando está lista
+            refrescar (callable): Función sin argumentos que vuelve a cargar la vista sondeada
+            plazo (float): Máximo de segundos en total
+            presupuesto (float): Segundos de la pausa fija que reemplaza
+
+        Returns:
+            tuple: (valor devuelto por la condición, número de refrescos)
+
+        Raises:
+            TimeoutException: Si la condición no se cumple dentro del plazo
+        """
+        inicio = time.perf_counter()
+        refrescos = 0
+        while True:
+            restante = plazo - (time.perf_counter() - inicio)
+            try:
+                resultado = WebDriverWait(self.driver, max(0.1, min(intervalo, restante)),
+                                          poll_frequency=self.intervalo).until(condicion)
+                break
+            except TimeoutException:
+                if time.perf_counter() - inicio >= plazo:
+                    _registrar(nombre, time.perf_counter() - inicio, presupuesto, False)
+                    logger.error(f"Sondeo '{nombre}' superó su plazo de {plazo} s tras {refrescos} refrescos")
+                    raise TimeoutException(f"Condición '{nombre}' no se cumplió en {plazo} s")
+            refrescos += 1
+            logger.info(f"Sondeo '{nombre}': no está listo, refresco {refrescos} (siguiente espera {min(intervalo * factor, intervalo_maximo):.1f} s)")
+            refrescar()
+            intervalo = min(intervalo * factor, intervalo_maximo)
+
+        esperado = time.perf_counter() - inicio
+        _registrar(nombre, esperado, presupuesto, True)
+        logger.info(f"Sondeo '{nombre}': {esperado:.2f} s y {refrescos} refrescos (pausa fija anterior {presupuesto:.1f} s)")
+        return resultado, refrescos
+
+def _registrar(nombre, esperado, presupuesto, cumplida):
+    _registros.agregar(nombre, esperado, presupuesto, cumplida)
+
+def resumen_esperas(reiniciar=False):
+    """
+    Acumula las esperas registradas en este proceso.
+
+    Args:
+        reiniciar (bool): Vaciar el registro después de calcular el resumen
+
+    Returns:
+        dict: Totales (esperas, segundos esperados, presupuesto fijo, ahorro, timeouts) y detalle por nombre
+    """
+    registros = _registros.tomar(reiniciar)
+
+    detalle = {}
+    for nombre, esperado, presupuesto, cumplida in registros:
+        item = detalle.setdefault(nombre, {"veces": 0, "esperado_seg": 0.0, "presupuesto_seg": 0.0, "timeouts": 0})
+        item["veces"] += 1
+        item["esperado_seg"] += esperado
+        item["presupuesto_seg"] += presupuesto
+        item["timeouts"] += 0 if cumplida else 1
+    for item in detalle.values():
+        item["esperado_seg"] = round(item["esperado_seg"], 2)
+        item["presupuesto_seg"] = round(item["presupuesto_seg"], 2)
+
+    esperado_total = sum(r[1] for r in registros)
+    presupuesto_total = sum(r[2] for r in registros)
+    return {
+        "esperas": len(registros),
+        "esperado_seg": round(esperado_total, 2),
+        "presupuesto_seg": round(presupuesto_total, 2),
+        "ahorro_seg": round(presupuesto_total - esperado_total, 2),
+        "timeouts": sum(1 for r in registros if not r[3]),
+        "detalle": detalle,
+    }
+
+def registrar_resumen_esperas(titulo="Esperas"):
+    """
+    Escribe en el log el resumen de esperas del proceso y vacía el registro.
+    """
+    resumen = resumen_esperas(reiniciar=True)
+    if not resumen["esperas"]:
+        return resumen
+    logger.info(
+        f"{titulo}: {resumen['esperas']} esperas, {resumen['esperado_seg']} s esperados "
+        f"frente a {resumen['presupuesto_seg']} s de pausas fijas (ahorro {resumen['ahorro_seg']} s, "
+        f"{resumen['timeouts']} timeouts)"
+    )
+    for nombre, item in resumen["detalle"].items():
+        logger.debug(f"  {nombre}: {item}")
+    return resumen
+
+registrar_resumen("Esperas", registrar_resumen_esperas)
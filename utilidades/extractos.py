@@ -0,0 +1,341 @@
+import argparse
+import codecs
+import csv
+import functools
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+logger = logging.getLogger("Utils - Extractos")
+
+# Lectura en streaming de los archivos de movimientos del BCP (040_ultimos_movimientos.txt) y de BBVA
+# (relacion_pago_*): detecta codificación, separador y fila de cabecera, y devuelve un generador de
+# Movimiento, línea a línea y con memoria constante.
+# Medición: python -m utilidades.extractos medir --formato bcp --filas 2000000
+
+BYTES_MUESTRA = 64 * 1024
+LINEAS_BUSQUEDA_CABECERA = 30
+SEPARADORES = (",", ";", "|", "\t")
+FORMATOS_FECHA = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d%m%Y", "%d/%m/%y", "%Y%m%d")
+
+# Nombres de columna que se reconocen para cada campo (sin tildes, en minúsculas y sin signos)
+ALIAS_COLUMNAS = {
+    "fecha": ("fecha operacion", "fecha de operacion", "fec operacion", "f operacion", "fecha de pago", "fecha pago", "f pago", "fecha"),
+    "referencia": ("operacion numero", "numero de operacion", "nro operacion", "n operacion", "operacion", "referencia",
+                   "nro documento", "numero documento", "documento", "codigo de pago"),
+    "monto": ("monto", "importe", "abono", "ingreso", "importe pagado", "monto pagado"),
+    "moneda": ("moneda", "divisa", "mon"),
+    "pagador": ("nombre del pagador", "pagador", "nombre", "ordenante", "cliente", "descripcion operacion", "descripcion", "concepto"),
+}
+CAMPOS_OBLIGATORIOS = ("fecha", "monto")
+
+# Símbolos de moneda que pueden venir pegados al monto
+MONEDAS_SIMBOLO = (("US$", "USD"), ("S/.", "PEN"), ("S/", "PEN"), ("$", "USD"))
+
+class Movimiento:
+    """
+    Movimiento del extracto. Con __slots__ cada registro ocupa unos pocos punteros, sin diccionario.
+    """
+
+    __slots__ = ("fecha", "referencia", "monto", "moneda", "pagador")
+
+    def __init__(self, fecha, referencia, monto, moneda, pagador):
+        """
+        Args:
+            fecha (date): Fecha de la operación
+            referencia (str): Número de operación o documento
+            monto (Decimal): Importe (negativo para cargos)
+            moneda (str): 'PEN', 'USD' o None si el archivo no lo indica
+            pagador (str): Nombre o descripción del pagador
+        """
+        self.fecha = fecha
+        self.referencia = referencia
+        self.monto = monto
+        self.moneda = moneda
+        self.pagador = pagador
+
+    def __repr__(self):
+        return f"Movimiento({self.fecha}, {self.referencia!r}, {self.monto}, {self.moneda}, {self.pagador!r})"
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", texto).split())
+
+def detectar_codificacion(muestra):
+    """
+    Args:
+        muestra (bytes): Primeros bytes del archivo
+
+    Returns:
+        str: 'utf-8-sig' o 'utf-16' si hay BOM; 'utf-8' si la muestra es UTF-8 válido; si no 'cp1252'
+    """
+    if muestra.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if muestra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # final=False: la muestra puede cortar un carácter multibyte al final
+        codecs.getincrementaldecoder("utf-8")().decode(muestra, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+def detectar_separador(lineas):
+    """
+    Returns:
+        str: Separador de SEPARADORES que aparece más veces, y el mismo número de veces, en las líneas
+    """
+    mejor, mejor_puntaje = ",", 0
+    for separador in SEPARADORES:
+        conteos = [len(next(csv.reader([l], delimiter=separador))) - 1 for l in lineas if l.strip()]
+        conteos = [c for c in conteos if c]
+        if not conteos:
+            continue
+        # Gana el separador de la columna más repetida (la tabla), no el de las líneas de preámbulo
+        frecuente = max(set(conteos), key=conteos.count)
+        puntaje = conteos.count(frecuente) * frecuente
+        if puntaje > mejor_puntaje:
+            mejor, mejor_puntaje = separador, puntaje
+    return mejor
+
+def mapear_columnas(cabecera):
+    """
+    Returns:
+        dict: Campo → índice de columna de la cabecera, o None si faltan campos obligatorios
+    """
+    nombres = [_normalizar(c) for c in cabecera]
+    columnas = {}
+    for campo, alias in ALIAS_COLUMNAS.items():
+        # Primero el alias más específico: "fecha operacion" antes que "fecha"
+        for nombre in alias:
+            if nombre in nombres and nombres.index(nombre) not in columnas.values():
+                columnas[campo] = nombres.index(nombre)
+                break
+    if not all(c in columnas for c in CAMPOS_OBLIGATORIOS):
+        return None
+    return columnas
+
+@functools.lru_cache(maxsize=4096)
+def convertir_fecha(texto):
+    # Un extracto repite pocas fechas: la caché evita un strptime por fila
+    texto = texto.strip().split(" ")[0]
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
+
+def convertir_monto(texto):
+    """
+    Convierte '1,234.56', '1.234,56', '-50', '(50.00)', 'S/ 1,200.00' o 'US$ 10' en Decimal.
+
+    Returns:
+        tuple: (monto, moneda del símbolo o None); monto None si no es un número
+    """
+    texto = texto.strip()
+    moneda = None
+    for simbolo, codigo in MONEDAS_SIMBOLO:
+        if simbolo in texto:
+            texto = texto.replace(simbolo, "")
+            moneda = codigo
+            break
+    texto = texto.replace(" ", "")
+    negativo = texto.startswith("(") and texto.endswith(")")
+    texto = texto.strip("()")
+    coma, punto = texto.rfind(","), texto.rfind(".")
+    if coma > punto:
+        # La coma es decimal si tiene dos dígitos detrás o si también hay puntos de miles
+        if punto >= 0 or len(texto) - coma - 1 == 2:
+            texto = texto.replace(".", "").replace(",", ".")
+        else:
+            texto = texto.replace(",", "")
+    else:
+        texto = texto.replace(",", "")
+    try:
+        monto = Decimal(texto)
+    except InvalidOperation:
+        return None, moneda
+    return (-monto if negativo else monto), moneda
+
+def leer_movimientos(ruta_archivo, moneda=None, estadisticas=None):
+    """
+    Lee el extracto línea a línea y genera un Movimiento por cada fila de la tabla. Las líneas
+    anteriores a la cabecera (datos de la cuenta) y las filas sin fecha o sin monto válidos
+    (totales, pie) se omiten.
+
+    Args:
+        ruta_archivo (Path): 040_ultimos_movimientos.txt del BCP o relacion_pago_* de BBVA
+        moneda (str): Moneda de las filas que no la indican (ej. la de la cuenta BBVA)
+        estadisticas (dict): Si se indica, se completa con codificación, separador, filas y omitidas
+
+    Yields:
+        Movimiento
+
+    Raises:
+        ValueError: Si no se encuentra una cabecera con fecha y monto
+    """
+    ruta_archivo = Path(ruta_archivo)
+    with open(ruta_archivo, "rb") as f:
+        muestra = f.read(BYTES_MUESTRA)
+    codificacion = detectar_codificacion(muestra)
+
+    with open(ruta_archivo, encoding=codificacion, errors="replace", newline="") as f:
+        preambulo = []
+        for _ in range(LINEAS_BUSQUEDA_CABECERA):
+            linea = f.readline()
+            if not linea:
+                break
+            preambulo.append(linea)
+        separador = detectar_separador(preambulo)
+
+        columnas = None
+        for i, fila in enumerate(csv.reader(preambulo, delimiter=separador)):
+            columnas = mapear_columnas(fila)
+            if columnas:
+                break
+        if not columnas:
+            raise ValueError(f"No se encontró la cabecera de movimientos en {ruta_archivo.name}")
+
+        if estadisticas is not None:
+            estadisticas.update({"codificacion": codificacion, "separador": separador, "columnas": columnas,
+                                 "filas": 0, "omitidas": 0})
+
+        def lineas():
+            # Las líneas ya leídas después de la cabecera y luego el resto del archivo, sin cargarlo
+            yield from preambulo[i + 1:]
+            yield from f
+
+        c_fecha, c_monto = columnas["fecha"], columnas["monto"]
+        c_referencia, c_moneda, c_pagador = columnas.get("referencia"), columnas.get("moneda"), columnas.get("pagador")
+        for fila in csv.reader(lineas(), delimiter=separador):
+            if len(fila) <= max(c_fecha, c_monto):
+                if estadisticas is not None and any(fila):
+                    estadisticas["omitidas"] += 1
+                continue
+            fecha = convertir_fecha(fila[c_fecha])
+            monto, moneda_simbolo = convertir_monto(fila[c_monto])
+            if fecha is None or monto is None:
+                if estadisticas is not None:
+                    estadisticas["omitidas"] += 1
+                continue
+            if estadisticas is not None:
+                estadisticas["filas"] += 1
+            yield Movimiento(
+                fecha,
+                fila[c_referencia].strip() if c_referencia is not None and c_referencia < len(fila) else None,
+                monto,
+                (fila[c_moneda].strip() if c_moneda is not None and c_moneda < len(fila) else None) or moneda_simbolo or moneda,
+                fila[c_pagador].strip() if c_pagador is not None and c_pagador < len(fila) else None,
+            )
+
+def generar_sintetico(ruta_archivo, formato, filas, semilla=0):
+    """
+    Escribe un extracto sintético con el preámbulo, la cabecera y el formato de montos de cada banco:
+    BCP en UTF-8 separado por comas, BBVA en cp1252 separado por '|'.
+    """
+    aleatorio = random.Random(semilla)
+    nombres = ["JUAN PÉREZ", "MARÍA ÑAHUI", "COMERCIAL ANDINA SAC", "LIGO PAGOS", "ROSA QUISPE", "TRANSFERENCIA INTERBANCARIA"]
+    inicio = date.today() - timedelta(days=30)
+    if formato == "bcp":
+        codificacion, separador = "utf-8", ","
+        preambulo = ["Cuenta,193-1234567-0-12\n", "Moneda,Soles\n", "\n"]
+        cabecera = ["Fecha", "Fecha valuta", "Descripción operación", "Monto", "Saldo", "Sucursal - agencia", "Operación - Número", "Operación - Hora"]
+    else:
+        codificacion, separador = "cp1252", "|"
+        preambulo = ["RELACIÓN DE PAGOS|LIGO- LA MAGICA SOLES\n"]
+        cabecera = ["F. Pago", "Código de pago", "Nombre del pagador", "Importe", "Divisa", "Oficina"]
+    with open(ruta_archivo, "w", encoding=codificacion, newline="") as f:
+        f.writelines(preambulo)
+        escritor = csv.writer(f, delimiter=separador, lineterminator="\r\n")
+        escritor.writerow(cabecera)
+        for n in range(filas):
+            fecha = (inicio + timedelta(days=n * 30 // max(filas, 1))).strftime("%d/%m/%Y")
+            monto = aleatorio.randint(100, 50_000_00) / 100
+            nombre = aleatorio.choice(nombres)
+            if formato == "bcp":
+                escritor.writerow([fecha, fecha, nombre, f"{monto:,.2f}", f"{monto * 3:,.2f}", "0193 - LIMA",
+                                   f"{n:08d}", f"{n % 24:02d}:{n % 60:02d}:{n % 59:02d}"])
+            else:
+                escritor.writerow([fecha, f"{n:010d}", nombre, f"{monto:,.2f}".replace(",", "_").replace(".", ",").replace("_", "."),
+                                   "PEN" if n % 3 else "USD", "0011"])
+        escritor.writerow(["", "", "Total", "", "", ""])
+
+def _memoria_pico_mb():
+    import psutil
+
+    memoria = psutil.Process().memory_info()
+    if hasattr(memoria, "peak_wset"):
+        return memoria.peak_wset / 1024 ** 2
+    import resource
+    # ru_maxrss viene en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def medir(formato, filas, carpeta=None):
+    """
+    Genera un extracto sintético de 'filas' filas, lo recorre completo con leer_movimientos y mide
+    filas por segundo y memoria pico del proceso (que no debe crecer con el tamaño del archivo).
+
+    Returns:
+        dict: Filas, MB del archivo, segundos, filas por segundo y memoria pico antes y después
+    """
+    with tempfile.TemporaryDirectory(dir=carpeta) as temporal:
+        ruta = Path(temporal) / ("040_ultimos_movimientos.txt" if formato == "bcp" else "relacion_pago_sintetico.txt")
+        inicio = time.perf_counter()
+        generar_sintetico(ruta, formato, filas)
+        generacion = time.perf_counter() - inicio
+        memoria_antes = _memoria_pico_mb()
+
+        estadisticas = {}
+        total = Decimal(0)
+        inicio = time.perf_counter()
+        for movimiento in leer_movimientos(ruta, estadisticas=estadisticas):
+            total += movimiento.monto
+        segundos = time.perf_counter() - inicio
+        return {
+            "formato": formato,
+            "filas": estadisticas["filas"],
+            "omitidas": estadisticas["omitidas"],
+            "codificacion": estadisticas["codificacion"],
+            "separador": estadisticas["separador"],
+            "mb_archivo": round(os.path.getsize(ruta) / 1024 ** 2, 1),
+            "segundos_generacion": round(generacion, 2),
+            "segundos": round(segundos, 2),
+            "filas_por_segundo": round(estadisticas["filas"] / segundos) if segundos else None,
+            "memoria_pico_antes_mb": round(memoria_antes, 1),
+            "memoria_pico_mb": round(_memoria_pico_mb(), 1),
+            "total": str(total),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Lectura y medición del parser de extractos BCP y BBVA")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    leer = subcomandos.add_parser("leer", help="Muestra los movimientos de un archivo descargado")
+    leer.add_argument("archivo")
+    leer.add_argument("--moneda")
+    leer.add_argument("--limite", type=int, default=20)
+    medir_cmd = subcomandos.add_parser("medir", help="Mide filas por segundo y memoria pico con un archivo sintético")
+    medir_cmd.add_argument("--formato", choices=("bcp", "bbva"), default="bcp")
+    medir_cmd.add_argument("--filas", type=int, default=1_000_000)
+    medir_cmd.add_argument("--carpeta", help="Carpeta para el archivo temporal (por defecto la del sistema)")
+    args = parser.parse_args()
+
+    if args.comando == "leer":
+        estadisticas = {}
+        for n, movimiento in enumerate(leer_movimientos(args.archivo, args.moneda, estadisticas)):
+            if n < args.limite:
+                print(movimiento)
+        print(json.dumps(estadisticas, indent=2))
+    else:
+        print(json.dumps(medir(args.formato, args.filas, args.carpeta), indent=2))
+
+if __name__ == "__main__":
+    main()
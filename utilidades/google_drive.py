@@ -1,12 +1,39 @@
 import os
 import mimetypes
 import logging
+import threading
 from googleapiclient.http import MediaFileUpload
 from googleapiclient.errors import HttpError
 from .google_auth import GoogleAuthenticator
 
 logger = logging.getLogger("Utils - Google Drive")
 
+# Uploaders ya autenticados, por Service Account, reutilizados durante la vida del proceso
+_uploaders = {}
+_bloqueo_uploaders = threading.Lock()
+
+def obtener_uploader(service_account_json):
+    """
+    Devuelve un GoogleDriveUploader reutilizable para la Service Account indicada.
+    La autenticación y el build() del servicio de Drive se hacen una sola vez por proceso,
+    de modo que los bots y los ciclos del modo residente comparten el mismo cliente.
+
+    Args:
+        service_account_json (str): String con el contenido del JSON de Service Account
+
+    Returns:
+        GoogleDriveUploader: Uploader inicializado
+    """
+    with _bloqueo_uploaders:
+        uploader = _uploaders.get(service_account_json)
+        if uploader is None:
+            logger.info("Creando GoogleDriveUploader compartido")
+            uploader = GoogleDriveUploader(authenticator=False, service_account_json=service_account_json)
+            _uploaders[service_account_json] = uploader
+        else:
+            logger.info("Reutilizando GoogleDriveUploader ya inicializado")
+        return uploader
+
 class GoogleDriveUploader:
     """
     Clase para subir archivos a Google Drive
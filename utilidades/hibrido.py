@@ -0,0 +1,249 @@
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from utilidades.descargas import DescargaNoCompletada, registrar_descarga
+from utilidades.trazas import trazar
+
+logger = logging.getLogger("Utils - Hibrido")
+
+# Respuestas con las que el portal indica que el archivo solicitado todavía se está generando
+ESTADOS_NO_LISTO = (202, 204)
+# Algunos portales responden 404 mientras publican el archivo recién solicitado; pasado ese margen
+# inicial (en segundos), un 404 es un error definitivo y no se sigue esperando
+MARGEN_404 = 10
+
+_adaptadores = {}
+_bloqueo_adaptadores = threading.Lock()
+
+class ArchivoNoListo(Exception):
+    """
+    El endpoint de descarga respondió, pero el archivo todavía no está disponible.
+    """
+
+class ExportacionPendiente(Exception):
+    """
+    La exportación se pidió por HTTP pero su archivo no se pudo descargar. El banco ya tiene la
+    solicitud en cola: se reintenta la descarga con reanudar_descarga en lugar de pedir otra
+    exportación por el navegador. url es la URL de descarga (None si no se pudo armar).
+    """
+
+    def __init__(self, mensaje, url=None):
+        super().__init__(mensaje)
+        self.url = url
+
+def hibrido_habilitado(cfg):
+    return str(cfg['hibrido']['habilitado']).lower() == "true"
+
+def sesion_http(driver, banco):
+    """
+    Devuelve una sesión HTTP nueva con las cookies (de todos los dominios) y el user-agent del
+    navegador autenticado. Cada llamada tiene sus propias cookies, así dos navegadores del mismo
+    banco (backfill) no se pisan la sesión; solo se comparte por banco y proceso el adaptador,
+    para que las conexiones se reutilicen entre ejecuciones.
+
+    Args:
+        driver (webdriver.Chrome): Driver con la sesión ya iniciada
+        banco (str): Clave de la sesión ('bcp' o 'bbva')
+
+    Returns:
+        requests.Session: Sesión lista para llamar al portal
+    """
+    with _bloqueo_adaptadores:
+        adaptador = _adaptadores.get(banco)
+        if adaptador is None:
+            adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+            _adaptadores[banco] = adaptador
+
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    for cookie in driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]:
+        sesion.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie.get("path", "/"),
+                           secure=cookie.get("secure", False))
+    sesion.headers.update({
+        "User-Agent": driver.execute_script("return navigator.userAgent"),
+        "Referer": driver.current_url,
+    })
+    return sesion
+
+def _rellenar(plantilla, campos):
+    # Sustituye solo los {campo} conocidos, para no chocar con las llaves de un cuerpo JSON
+    return re.sub(r"\{(\w+)\}", lambda m: str(campos.get(m.group(1), m.group(0))), plantilla)
+
+def _nombre_archivo(respuesta):
+    disposicion = respuesta.headers.get("Content-Disposition", "")
+    coincidencia = re.search(r"filename\*=UTF-8''([^;]+)", disposicion) or re.search(r'filename="?([^";]+)"?', disposicion)
+    if coincidencia:
+        return Path(unquote(coincidencia.group(1))).name
+    return Path(urlparse(respuesta.url).path).name or f"descarga_{time.strftime('%Y%m%d_%H%M%S')}.txt"
+
+def descargar(sesion, url, carpeta, timeout=60, metodo="GET", estados_no_listo=ESTADOS_NO_LISTO, **kwargs):
+    """
+    Descarga un archivo por HTTP escribiéndolo por bloques (primero como .part y luego renombrado).
+
+    Args:
+        sesion (requests.Session): Sesión autenticada (ver sesion_http)
+        url (str): URL del archivo
+        carpeta (str): Carpeta de destino
+        timeout (float): Timeout de conexión y lectura, en segundos
+        metodo (str): Método HTTP
+        estados_no_listo (tuple): Códigos HTTP que indican que el archivo todavía se está generando
+        **kwargs: Parámetros adicionales de requests (json, data, params...)
+
+    Returns:
+        Path: Archivo descargado
+
+    Raises:
+        ArchivoNoListo: Si el portal todavía está generando el archivo
+        DescargaNoCompletada: Si la respuesta es una página HTML (sesión vencida) o llega vacía
+    """
+    inicio = time.perf_counter()
+    with sesion.request(metodo, url, stream=True, timeout=timeout, **kwargs) as respuesta:
+        if respuesta.status_code in estados_no_listo:
+            raise ArchivoNoListo(f"{url} respondió {respuesta.status_code}")
+        respuesta.raise_for_status()
+        if "text/html" in respuesta.headers.get("Content-Type", ""):
+            raise DescargaNoCompletada(f"{url} devolvió una página HTML en lugar del archivo (¿sesión vencida?)")
+
+        ruta = Path(carpeta) / _nombre_archivo(respuesta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        parcial = ruta.with_name(ruta.name + ".part")
+        tamano = 0
+        with open(parcial, "wb") as f:
+            for bloque in respuesta.iter_content(chunk_size=64 * 1024):
+                f.write(bloque)
+                tamano += len(bloque)
+
+    if not tamano:
+        parcial.unlink()
+        raise DescargaNoCompletada(f"{url} devolvió un archivo vacío")
+    parcial.replace(ruta)
+    registrar_descarga(ruta.name, tamano, time.perf_counter() - inicio, "http")
+    return ruta
+
+def esperar_archivo(sesion, url, carpeta, timeout=60, intervalo=2.0, factor=1.5, intervalo_maximo=20.0, margen_404=MARGEN_404):
+    """
+    Descarga el archivo reintentando mientras el portal responda que todavía no está listo,
+    con un intervalo que crece 'factor' veces en cada intento (hasta 'intervalo_maximo').
+    Un 404 solo se reintenta durante los primeros 'margen_404' segundos.
+
+    Returns:
+        Path: Archivo descargado
+
+    Raises:
+        ArchivoNoListo: Si el archivo no estuvo listo antes del timeout
+        requests.HTTPError: Si el portal sigue respondiendo 404 pasado el margen inicial
+    """
+    inicio = time.perf_counter()
+    limite = inicio + timeout
+    while True:
+        estados = ESTADOS_NO_LISTO + (404,) if time.perf_counter() - inicio < margen_404 else ESTADOS_NO_LISTO
+        try:
+            return descargar(sesion, url, carpeta, timeout=timeout, estados_no_listo=estados)
+        except ArchivoNoListo:
+            if time.perf_counter() + intervalo > limite:
+                raise
+            time.sleep(intervalo)
+            intervalo = min(intervalo * factor, intervalo_maximo)
+
+@trazar(categoria="hibrido")
+def descarga_directa(cfg, driver, clave, carpeta, **campos):
+    """
+    Modo híbrido: tras el login en el navegador, pide la exportación y descarga el archivo
+    directamente a los endpoints del portal configurados en [hibrido] con el prefijo 'clave'
+    (<clave>_url_exportar, <clave>_cuerpo_exportar, <clave>_url_descarga).
+    Las URL y el cuerpo admiten {campo} con los campos recibidos y, en la URL de descarga,
+    los de la respuesta JSON de la exportación.
+
+    Args:
+        cfg: Configuración cargada
+        driver (webdriver.Chrome): Driver con la sesión ya iniciada
+        clave (str): Prefijo de los endpoints ('bcp', 'bbva_soles' o 'bbva_dolares')
+        carpeta (str): Carpeta de descarga de la sesión
+        **campos: Valores para las plantillas (fecha, fecha_hasta, cuenta...)
+
+    Returns:
+        Path: Archivo descargado, o None si el modo está deshabilitado, sin configurar o falló
+            antes de pedir la exportación (el bot sigue entonces con el flujo de clics)
+
+    Raises:
+        ExportacionPendiente: Si la exportación se pidió pero el archivo no se pudo descargar
+    """
+    seccion = cfg['hibrido']
+    if not hibrido_habilitado(cfg) or not seccion.get(f"{clave}_url_descarga"):
+        return None
+    plantillas = "".join(str(seccion.get(f"{clave}_{p}") or "") for p in ("url_exportar", "cuerpo_exportar", "url_descarga"))
+    if campos.get("fecha_hasta", campos.get("fecha")) != campos.get("fecha") and "{fecha_hasta}" not in plantillas:
+        # Un rango de varios días (backfill) con endpoints de un solo día: se usa el navegador
+        logger.info(f"Los endpoints de {clave} no admiten {{fecha_hasta}}, el rango se consulta con el navegador")
+        return None
+    timeout = float(seccion['timeout'])
+    exportada, url = False, None
+    try:
+        sesion = sesion_http(driver, clave.split("_")[0])
+        if seccion.get(f"{clave}_url_exportar"):
+            cuerpo = seccion.get(f"{clave}_cuerpo_exportar")
+            respuesta = sesion.post(
+                _rellenar(seccion[f"{clave}_url_exportar"], campos),
+                json=json.loads(_rellenar(cuerpo, campos)) if cuerpo else None,
+                timeout=timeout,
+            )
+            respuesta.raise_for_status()
+            exportada = True
+            datos = respuesta.json()
+            if isinstance(datos, dict):
+                campos.update(datos)
+            logger.info(f"Exportación solicitada por HTTP ({clave}): {datos}")
+        url = _rellenar(seccion[f"{clave}_url_descarga"], campos)
+        ruta = esperar_archivo(sesion, url, carpeta, timeout=timeout)
+        logger.info(f"Descarga directa ({clave}) completada: {ruta}")
+        return ruta
+    except Exception as e:
+        if exportada:
+            # Volver a los clics pediría una segunda exportación de la misma cuenta y fecha
+            logger.warning(f"Descarga directa ({clave}) fallida con la exportación ya pedida: {e}")
+            raise ExportacionPendiente(f"Exportación de {clave} pedida por HTTP sin archivo descargado: {e}", url) from e
+        logger.warning(f"Descarga directa ({clave}) fallida, se sigue con el flujo del navegador: {e}")
+        return None
+
+def reanudar_descarga(driver, banco, pendiente, carpeta, timeout=60):
+    """
+    Vuelve a esperar y descargar el archivo de una exportación ya pedida (ver ExportacionPendiente),
+    sin pedir otra.
+
+    Returns:
+        Path: Archivo descargado
+
+    Raises:
+        ExportacionPendiente: Si no se conoce la URL de descarga
+        ArchivoNoListo: Si el archivo no estuvo listo antes del timeout
+    """
+    if not pendiente.url:
+        raise pendiente
+    ruta = esperar_archivo(sesion_http(driver, banco), pendiente.url, carpeta, timeout=timeout)
+    logger.info(f"Descarga directa ({banco}) de la exportación pendiente completada: {ruta}")
+    return ruta
+
+@trazar(categoria="hibrido")
+def descarga_por_enlace(driver, banco, enlace, carpeta, timeout=60):
+    """
+    Descarga por HTTP el destino de un enlace de descarga de la página, en lugar de hacer clic.
+
+    Returns:
+        Path: Archivo descargado, o None si el enlace no es una URL o la descarga falló
+    """
+    if not enlace or not enlace.startswith(("http://", "https://")):
+        return None
+    try:
+        ruta = descargar(sesion_http(driver, banco), enlace, carpeta, timeout=timeout)
+        logger.info(f"Enlace de descarga ({banco}) obtenido por HTTP: {ruta}")
+        return ruta
+    except Exception as e:
+        logger.warning(f"No se pudo descargar el enlace por HTTP ({banco}), se hace clic: {e}")
+        return None
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from utilidades.metricas import ContadoresMetricas, registrar_resumen
+
+logger = logging.getLogger("Utils - Incremental")
+
+# Codificaciones que se prueban al leer el archivo del banco; latin-1 nunca falla y conserva los bytes
+CODIFICACIONES = ("utf-8", "latin-1")
+
+_estadisticas = ContadoresMetricas("entregas", "omitidas", "filas", "filas_nuevas", "bytes", "bytes_enviados")
+
+def incremental_habilitado(cfg):
+    return str(cfg['incremental']['habilitado']).lower() == "true"
+
+def hash_fila(linea):
+    """
+    Returns:
+        str: SHA-1 de la fila sin el salto de línea
+    """
+    return hashlib.sha1(linea.rstrip("\r\n").encode("utf-8")).hexdigest()
+
+def _comparable(valor):
+    # Números de operación como enteros; horas u otros textos, tal cual (deben ordenar como texto)
+    valor = valor.strip()
+    return (0, int(valor), "") if valor.isdigit() else (1, 0, valor)
+
+class MarcaAgua:
+    """
+    Marca de agua de una cuenta: día de la extracción, última clave entregada (número de operación
+    u hora, si se configuró su columna) y los hash de las filas ya entregadas ese día.
+    """
+
+    def __init__(self, fecha=None, ultima=None, hashes=None):
+        self.fecha = fecha
+        self.ultima = ultima
+        self.hashes = Counter(hashes or {})
+
+    def a_dict(self):
+        return {"fecha": self.fecha, "ultima": self.ultima, "hashes": dict(self.hashes)}
+
+class Incremento:
+    """
+    Filas de un archivo posteriores a la marca de agua. confirmar() avanza la marca y solo debe
+    llamarse cuando GESCOM aceptó el envío, para no perder filas si la entrega falla.
+    """
+
+    def __init__(self, almacen, clave, ruta, total, nuevas, marca):
+        """
+        Args:
+            almacen (AlmacenMarcas): Almacén donde se guarda la marca al confirmar
+            clave (str): Identificador de la cuenta
+            ruta (Path): Archivo a entregar (cabecera + filas nuevas)
+            total (int): Filas del archivo descargado
+            nuevas (int): Filas nuevas
+            marca (MarcaAgua): Marca que se guarda al confirmar
+        """
+        self.almacen = almacen
+        self.clave = clave
+        self.ruta = ruta
+        self.total = total
+        self.nuevas = nuevas
+        self.marca = marca
+
+    def confirmar(self):
+        self.almacen.guardar(self.clave, self.marca)
+
+class AlmacenMarcas:
+    """
+    Guarda en disco la marca de agua de cada cuenta (un archivo JSON por cuenta).
+    """
+
+    def __init__(self, ruta_marcas):
+        """
+        Args:
+            ruta_marcas (str): Carpeta donde se guardan las marcas
+        """
+        self.ruta_marcas = Path(ruta_marcas)
+
+    def _archivo(self, clave):
+        nombre = re.sub(r"[^\w.-]+", "_", clave)
+        return self.ruta_marcas / f"{nombre}.json"
+
+    def leer(self, clave):
+        """
+        Returns:
+            MarcaAgua: Marca guardada de la cuenta, o una vacía si no hay o no se puede leer
+        """
+        archivo = self._archivo(clave)
+        if not archivo.exists():
+            return MarcaAgua()
+        try:
+            with open(archivo, encoding="utf-8") as f:
+                datos = json.load(f)
+            return MarcaAgua(datos.get("fecha"), datos.get("ultima"), datos.get("hashes"))
+        except Exception as e:
+            logger.warning(f"No se pudo leer la marca de agua '{clave}', se entrega el archivo completo: {e}")
+            return MarcaAgua()
+
+    def guardar(self, clave, marca):
+        self.ruta_marcas.mkdir(parents=True, exist_ok=True)
+        archivo = self._archivo(clave)
+        temporal = archivo.with_suffix(".tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(marca.a_dict(), f)
+        # Reemplazo atómico: una ejecución interrumpida no deja una marca a medias
+        os.replace(temporal, archivo)
+        logger.info(f"Marca de agua '{clave}' actualizada ({sum(marca.hashes.values())} filas, última {marca.ultima})")
+
+    def filtrar(self, clave, ruta_archivo, lineas_encabezado=1, columna_clave=None, separador=",", fecha=None):
+        """
+        Separa las filas del archivo del día que aún no se entregaron. Una fila es nueva si su clave
+        (si se configuró la columna) no es anterior a la última entregada y si su hash aparece más
+        veces que en la marca (así dos movimientos idénticos siguen contando como dos).
+
+        Args:
+            clave (str): Identificador de la cuenta
+            ruta_archivo (Path): Archivo descargado con los movimientos del día
+            lineas_encabezado (int): Líneas iniciales que se copian siempre y no son movimientos
+            columna_clave (int): Columna con el número de operación u hora; None para usar solo los hash
+            separador (str): Separador de columnas, para leer la columna clave
+            fecha (str): Día de la extracción (AAAA-MM-DD); por defecto, el de la última modificación
+                del archivo descargado. La marca se reinicia cada día
+
+        Returns:
+            Incremento: Filas nuevas; si todas son nuevas, ruta es el archivo original
+        """
+        ruta_archivo = Path(ruta_archivo)
+        # El día es el de la descarga, no el de la entrega: un archivo bajado antes de medianoche y
+        # entregado después sigue comparándose con la marca de su día
+        fecha = fecha or fecha_extraccion(ruta_archivo)
+        marca = self.leer(clave)
+        if marca.fecha != fecha:
+            marca = MarcaAgua(fecha)
+
+        contenido = ruta_archivo.read_bytes()
+        for codificacion in CODIFICACIONES:
+            try:
+                texto = contenido.decode(codificacion)
+                break
+            except UnicodeDecodeError:
+                continue
+        lineas = texto.splitlines(keepends=True)
+        encabezado = lineas[:lineas_encabezado]
+
+        pendientes = Counter(marca.hashes)
+        limite = _comparable(marca.ultima) if marca.ultima is not None else None
+        todas, nuevas, ultima = Counter(), [], marca.ultima
+        for linea in lineas[lineas_encabezado:]:
+            if not linea.strip():
+                continue
+            h = hash_fila(linea)
+            todas[h] += 1
+            valor = None
+            if columna_clave is not None:
+                columnas = linea.rstrip("\r\n").split(separador)
+                valor = columnas[columna_clave].strip() if columna_clave < len(columnas) else None
+                if valor and (ultima is None or _comparable(valor) > _comparable(ultima)):
+                    ultima = valor
+            if limite is not None and valor and _comparable(valor) < limite:
+                continue
+            if pendientes[h]:
+                pendientes[h] -= 1
+                continue
+            nuevas.append(linea)
+
+        total = sum(todas.values())
+        nueva_marca = MarcaAgua(fecha, ultima, todas)
+        if len(nuevas) == total:
+            ruta = ruta_archivo
+        else:
+            ruta = ruta_archivo.with_name(f"{ruta_archivo.stem}_incremental{ruta_archivo.suffix}")
+            ruta.write_bytes("".join(encabezado + nuevas).encode(codificacion))
+        _registrar(total, len(nuevas), len(contenido), ruta.stat().st_size if nuevas else 0)
+        logger.info(f"Incremental '{clave}': {len(nuevas)} filas nuevas de {total} (última {ultima})")
+        return Incremento(self, clave, ruta, total, len(nuevas), nueva_marca)
+
+def fecha_extraccion(ruta_archivo):
+    """
+    Returns:
+        str: Día (AAAA-MM-DD) en que se terminó de escribir el archivo descargado
+    """
+    return datetime.fromtimestamp(Path(ruta_archivo).stat().st_mtime).date().isoformat()
+
+def filtrar_nuevas(cfg, banco, clave, ruta_archivo):
+    """
+    Aplica la marca de agua de la cuenta al archivo descargado según la sección [incremental]
+    (<banco>_lineas_encabezado, <banco>_columna_clave, <banco>_separador).
+
+    Args:
+        cfg: Configuración cargada
+        banco (str): 'bcp' o 'bbva'
+        clave (str): Identificador de la cuenta (ej. 'bcp_193-1234567-0-12' o 'bbva_soles')
+        ruta_archivo (Path): Archivo descargado
+
+    Returns:
+        Incremento: Filas nuevas, o None si el modo está deshabilitado o falló (se entrega el archivo completo)
+    """
+    if not incremental_habilitado(cfg):
+        return None
+    seccion = cfg['incremental']
+    columna = str(seccion.get(f"{banco}_columna_clave") or "").strip()
+    try:
+        return AlmacenMarcas(cfg['rutas']['ruta_marcas']).filtrar(
+            clave,
+            ruta_archivo,
+            lineas_encabezado=int(seccion[f"{banco}_lineas_encabezado"]),
+            columna_clave=int(columna) if columna else None,
+            separador=seccion.get(f"{banco}_separador") or ",",
+            fecha=fecha_extraccion(ruta_archivo),
+        )
+    except Exception as e:
+        logger.warning(f"No se pudo aplicar la marca de agua '{clave}', se entrega el archivo completo: {e}")
+        return None
+
+def _registrar(filas, filas_nuevas, bytes_archivo, bytes_enviados):
+    _estadisticas.sumar(entregas=1, omitidas=0 if filas_nuevas else 1, filas=filas, filas_nuevas=filas_nuevas,
+                        bytes=bytes_archivo, bytes_enviados=bytes_enviados)
+
+def resumen_incremental(reiniciar=False):
+    """
+    Resumen de las entregas incrementales: archivos, entregas omitidas, filas y bytes enviados.
+
+    Args:
+        reiniciar (bool): Reiniciar las estadísticas después de leerlas
+
+    Returns:
+        dict: Totales acumulados
+    """
+    return _estadisticas.tomar(reiniciar)
+
+def registrar_resumen_incremental(titulo="Incremental"):
+    """
+    Escribe en el log el resumen de entregas incrementales y reinicia las estadísticas.
+    """
+    resumen = resumen_incremental(reiniciar=True)
+    if not resumen["entregas"]:
+        return
+    logger.info(f"{titulo}: {resumen['entregas']} archivos, {resumen['omitidas']} entregas omitidas sin filas nuevas, "
+                f"{resumen['filas_nuevas']}/{resumen['filas']} filas enviadas, "
+                f"{resumen['bytes_enviados'] / 1024:.1f}/{resumen['bytes'] / 1024:.1f} KB")
+
+registrar_resumen("Incremental", registrar_resumen_incremental)
@@ -139,3 +139,21 @@ def limpiar_archivos_en_carpeta(ruta_carpeta, extensiones=None):
     if carpetas_vacias:
         logger.info(f"Carpetas vacías eliminadas: {', '.join(carpetas_vacias)}")
     return archivos_eliminados
+
+def cerrar_chrome_tras_error(cfg):
+    """
+    Fuerza el cierre de los procesos de Chrome después de un error en un bot.
+    En modo paralelo no se ejecuta, porque cerraría también los navegadores de los otros bots
+    que siguen trabajando; cada bot cierra su propio driver en su bloque finally.
+
+    :param cfg: Configuración cargada.
+    """
+    if cfg.get('orquestacion', {}).get('modo', 'secuencial') == 'paralelo':
+        logger.info("Modo paralelo: se omite el cierre global de procesos chrome")
+        return
+    if platform.system() == 'Windows':
+        logger.info("Cerrando procesos chrome en Windows")
+        os.system("taskkill /im chrome.exe /f")
+    else:
+        logger.info("Cerrando procesos chrome en Linux/Unix")
+        os.system("pkill -f chrome")
@@ -0,0 +1,179 @@
+import logging
+import re
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+from utilidades.metricas import RegistroMetricas, registrar_resumen
+
+logger = logging.getLogger("Utils - Localizador")
+
+# Resuelve en el navegador, en una sola llamada, una ruta de selectores separados por '>>>'
+# (entrar al shadowRoot del host o al documento del iframe). Se detiene en cada iframe con segmentos
+# pendientes para que WebDriver cambie de contexto. Las rutas resueltas se guardan en la propia
+# página (window.__localizador), de modo que una página nueva empieza sin caché.
+SCRIPT_RESOLVER = """
+const segmentos = arguments[0], desde = arguments[1], todos = arguments[2];
+const estado = window.__localizador || (window.__localizador = {cache: {}});
+const clave = JSON.stringify([segmentos.slice(desde), todos]);
+const previo = estado.cache[clave];
+if (previo && previo.every(e => e.isConnected)) {
+    return {elementos: previo, cache: true, candidatos: 0, segmentos: segmentos.length - desde};
+}
+let raiz = document, candidatos = 0;
+for (let i = desde; i < segmentos.length; i++) {
+    let encontrados = Array.from(raiz.querySelectorAll(segmentos[i][0]));
+    if (segmentos[i][1] !== null) {
+        candidatos += encontrados.length;
+        encontrados = encontrados.filter(e => (e.innerText || e.textContent || '').trim() === segmentos[i][1]);
+    }
+    if (!encontrados.length) return null;
+    if (i === segmentos.length - 1) {
+        const elementos = todos ? encontrados : [encontrados[0]];
+        estado.cache[clave] = elementos;
+        return {elementos: elementos, cache: false, candidatos: candidatos, segmentos: i - desde + 1};
+    }
+    const elemento = encontrados[0];
+    if (elemento.tagName === 'IFRAME' || elemento.tagName === 'FRAME') {
+        return {frame: elemento, resto: i + 1, candidatos: candidatos, segmentos: i - desde + 1};
+    }
+    if (!elemento.shadowRoot) return null;
+    raiz = elemento.shadowRoot;
+}
+"""
+
+_registros = RegistroMetricas()
+
+def interpretar_ruta(ruta):
+    """
+    Convierte 'host >>> hijo:texto(Recaudos pagados)' en [[css, texto], ...].
+    El sufijo :texto(...) filtra por el texto visible exacto del elemento.
+    """
+    segmentos = []
+    for parte in ruta.split(">>>"):
+        parte = parte.strip()
+        coincidencia = re.match(r"^(.*?):texto\((['\"]?)(.*)\2\)$", parte)
+        if coincidencia:
+            segmentos.append([coincidencia.group(1).strip(), coincidencia.group(3)])
+        else:
+            segmentos.append([parte, None])
+    return segmentos
+
+class Localizador:
+    """
+    Localiza elementos a través de shadow roots e iframes con una llamada al navegador por contexto
+    de frame, en lugar de un find_element y un 'return arguments[0].shadowRoot' por salto.
+    Registra cuántas llamadas a WebDriver ahorra cada paso frente a la cadena equivalente.
+    """
+
+    def __init__(self, driver, intervalo=0.2):
+        """
+        Args:
+            driver (webdriver.Chrome): Driver sobre el que se resuelven las rutas
+            intervalo (float): Segundos entre intentos mientras la ruta no se resuelve
+        """
+        self.driver = driver
+        self.intervalo = intervalo
+
+    def _resolver(self, nombre, segmentos, timeout, todos, entrar):
+        estado = {"desde": 0, "llamadas": 0, "cadena": 0}
+
+        def condicion(driver):
+            while True:
+                try:
+                    resultado = driver.execute_script(SCRIPT_RESOLVER, segmentos, estado["desde"], todos)
+                except WebDriverException:
+                    return False
+                estado["llamadas"] += 1
+                if not resultado:
+                    return False
+                # Cadena equivalente: un find_element por segmento, un salto de shadowRoot entre
+                # segmentos y un .text por cada candidato de un filtro de texto
+                estado["cadena"] += 2 * resultado["segmentos"] - 1 + resultado["candidatos"]
+                if "frame" not in resultado:
+                    return resultado
+                driver.switch_to.frame(resultado["frame"])
+                estado["desde"] = resultado["resto"]
+
+        try:
+            resultado = WebDriverWait(self.driver, timeout, poll_frequency=self.intervalo).until(condicion)
+        except TimeoutException:
+            logger.error(f"Ruta '{nombre}' no resuelta en {timeout} s")
+            raise TimeoutException(f"Ruta '{nombre}' no resuelta en {timeout} s")
+
+        elementos = resultado["elementos"]
+        if entrar:
+            self.driver.switch_to.frame(elementos[0])
+        _registrar(nombre, estado["cadena"], estado["llamadas"], resultado["cache"])
+        ahorro = estado["cadena"] - estado["llamadas"]
+        logger.info(f"Ruta '{nombre}': {estado['llamadas']} llamadas en lugar de {estado['cadena']} "
+                    f"({'caché' if resultado['cache'] else f'{ahorro} ahorradas'})")
+        return elementos
+
+    def buscar(self, nombre, ruta, timeout=10):
+        """
+        Espera a que la ruta se resuelva y devuelve el elemento. Deja el driver en el contexto
+        del último iframe atravesado.
+
+        Args:
+            nombre (str): Nombre del paso (aparece en logs y en el resumen)
+            ruta (str): Selectores CSS separados por '>>>', con ':texto(...)' opcional
+            timeout (float): Máximo de segundos a esperar
+
+        Returns:
+            WebElement: Primer elemento que cumple la ruta
+
+        Raises:
+            TimeoutException: Si la ruta no se resuelve dentro del timeout
+        """
+        return self._resolver(nombre, interpretar_ruta(ruta), timeout, todos=False, entrar=False)[0]
+
+    def buscar_todos(self, nombre, ruta, timeout=10):
+        """
+        Igual que buscar(), pero devuelve todos los elementos del último segmento.
+        """
+        return self._resolver(nombre, interpretar_ruta(ruta), timeout, todos=True, entrar=False)
+
+    def entrar_frame(self, nombre, ruta, timeout=10):
+        """
+        Resuelve una ruta que termina en un iframe y cambia el contexto del driver a él.
+        """
+        return self._resolver(nombre, interpretar_ruta(ruta), timeout, todos=False, entrar=True)[0]
+
+def _registrar(nombre, cadena, llamadas, cache):
+    _registros.agregar(nombre, cadena, llamadas, cache)
+
+def resumen_localizador(reiniciar=False):
+    """
+    Returns:
+        dict: Rutas resueltas, aciertos de caché, llamadas hechas, llamadas de la cadena equivalente
+            y ahorro, con el detalle por nombre
+    """
+    registros = _registros.tomar(reiniciar)
+    detalle = {}
+    for nombre, cadena, llamadas, cache in registros:
+        item = detalle.setdefault(nombre, {"veces": 0, "cache": 0, "llamadas": 0, "ahorradas": 0})
+        item["veces"] += 1
+        item["cache"] += 1 if cache else 0
+        item["llamadas"] += llamadas
+        item["ahorradas"] += cadena - llamadas
+    return {
+        "rutas": len(registros),
+        "cache": sum(1 for r in registros if r[3]),
+        "llamadas": sum(r[2] for r in registros),
+        "ahorradas": sum(r[1] - r[2] for r in registros),
+        "detalle": detalle,
+    }
+
+def registrar_resumen_localizador(titulo="Localizador"):
+    """
+    Escribe en el log el resumen del localizador del proceso y vacía el registro.
+    """
+    resumen = resumen_localizador(reiniciar=True)
+    if not resumen["rutas"]:
+        return resumen
+    logger.info(f"{titulo}: {resumen['rutas']} rutas ({resumen['cache']} desde caché), "
+                f"{resumen['llamadas']} llamadas a WebDriver, {resumen['ahorradas']} ahorradas")
+    for nombre, item in resumen["detalle"].items():
+        logger.debug(f"  {nombre}: {item}")
+    return resumen
+
+registrar_resumen("Localizador", registrar_resumen_localizador)
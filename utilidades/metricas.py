@@ -0,0 +1,94 @@
+import logging
+import threading
+
+logger = logging.getLogger("Utils - Metricas")
+
+# Registro común de métricas del proceso. Cada módulo guarda sus mediciones en un RegistroMetricas
+# (una tupla por medición) o en unos ContadoresMetricas (totales) y da de alta su resumen con
+# registrar_resumen; el orquestador los escribe todos con registrar_resumenes al final del ciclo.
+
+# Orden en que aparecen los resúmenes en el log; los no listados van al final
+ORDEN_RESUMENES = ("Esperas", "Reintentos", "Descargas", "Captchas", "Localizador", "Incremental", "Entregas")
+
+_resumenes = {}
+_bloqueo_resumenes = threading.Lock()
+
+class RegistroMetricas:
+    """
+    Mediciones de un módulo, una tupla por medición. Lo usan a la vez los hilos del pipeline,
+    del backfill y de los captchas, por eso cada operación toma el lock.
+    """
+
+    def __init__(self):
+        self._registros = []
+        self._bloqueo = threading.Lock()
+
+    def agregar(self, *valores):
+        with self._bloqueo:
+            self._registros.append(valores)
+
+    def tomar(self, reiniciar=False):
+        """
+        Returns:
+            list: Copia de las mediciones; con reiniciar=True el registro queda vacío
+        """
+        with self._bloqueo:
+            registros = list(self._registros)
+            if reiniciar:
+                self._registros.clear()
+        return registros
+
+class ContadoresMetricas:
+    """
+    Totales de un módulo con campos fijos, que solo se incrementan.
+    """
+
+    def __init__(self, *campos):
+        self._campos = campos
+        self._valores = dict.fromkeys(campos, 0)
+        self._bloqueo = threading.Lock()
+
+    def sumar(self, **incrementos):
+        with self._bloqueo:
+            for campo, valor in incrementos.items():
+                self._valores[campo] += valor
+
+    def tomar(self, reiniciar=False):
+        """
+        Returns:
+            dict: Copia de los totales; con reiniciar=True vuelven a cero
+        """
+        with self._bloqueo:
+            valores = dict(self._valores)
+            if reiniciar:
+                self._valores = dict.fromkeys(self._campos, 0)
+        return valores
+
+def registrar_resumen(nombre, funcion):
+    """
+    Da de alta el resumen de un módulo.
+
+    Args:
+        nombre (str): Título del resumen en el log (ej. 'Esperas')
+        funcion (callable): Recibe el título, escribe el resumen en el log y reinicia las métricas
+    """
+    with _bloqueo_resumenes:
+        _resumenes[nombre] = funcion
+
+def registrar_resumenes(sufijo=None):
+    """
+    Escribe en el log los resúmenes de todos los módulos dados de alta y reinicia sus métricas.
+
+    Args:
+        sufijo (str): Texto que se agrega entre paréntesis al título (ej. el bot en el modo paralelo)
+    """
+    with _bloqueo_resumenes:
+        resumenes = sorted(
+            _resumenes.items(),
+            key=lambda item: ORDEN_RESUMENES.index(item[0]) if item[0] in ORDEN_RESUMENES else len(ORDEN_RESUMENES),
+        )
+    for nombre, funcion in resumenes:
+        try:
+            funcion(f"{nombre} ({sufijo})" if sufijo else nombre)
+        except Exception as e:
+            logger.warning(f"No se pudo escribir el resumen '{nombre}': {e}")
@@ -0,0 +1,458 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import psutil
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium_stealth import stealth
+from utilidades.bloqueo import aplicar_bloqueo, bloqueo_habilitado, patrones_bloqueo
+from utilidades.chromedriver import ResolutorChromeDriver
+from utilidades.descargas import SeguidorDescargas
+from utilidades.esperas import instalar_monitor_red
+from utilidades.paginas import estrategia_carga
+from utilidades.trazas import trazar
+
+logger = logging.getLogger("Utils - Navegador")
+
+_ruta_chromedriver = None
+_bloqueo_chromedriver = threading.Lock()
+
+# Configuración stealth de cada banco
+PERFILES = {
+    "bcp": {
+        "clave_perfil": "ruta_perfil_bcp",
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+        "argumentos": [],
+        "prefs": {},
+    },
+    "bbva": {
+        "clave_perfil": None,
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+        "argumentos": [
+            "--disable-extensions",
+            "--no-sandbox",
+            "--disable-infobars",
+            "--disable-dev-shm-usage",
+            "--disable-browser-side-navigation",
+            "--disable-gpu",
+            "--no-first-run",
+            "--no-service-autorun",
+            "--password-store=basic",
+        ],
+        "prefs": {},
+    },
+}
+
+def ruta_chromedriver(cfg):
+    """
+    Devuelve la ruta del ejecutable de ChromeDriver compatible con el Chrome instalado.
+    Se resuelve una sola vez por proceso contra la caché local (ver utilidades/chromedriver.py);
+    las siguientes creaciones de driver (reintentos, otros bots o ciclos del modo residente)
+    reutilizan la ruta sin tocar la red.
+
+    Args:
+        cfg: Configuración cargada
+
+    Returns:
+        str: Ruta del ejecutable de ChromeDriver
+    """
+    global _ruta_chromedriver
+    with _bloqueo_chromedriver:
+        if _ruta_chromedriver is None:
+            _ruta_chromedriver = ResolutorChromeDriver(cfg['rutas']['ruta_drivers']).resolver()
+            logger.info(f"ChromeDriver disponible en: {_ruta_chromedriver}")
+        return _ruta_chromedriver
+
+def crear_driver_stealth(cfg, perfil, ruta_descarga=None, indice=0, bloqueo=None, red_en_log=False):
+    """
+    Crea un driver de Chrome con la configuración anti-detección del banco indicado.
+
+    Args:
+        cfg: Configuración cargada
+        perfil (str): Clave de PERFILES ('bcp' o 'bbva')
+        ruta_descarga (str): Carpeta de descarga inicial (opcional)
+        indice (int): Índice de la instancia dentro del pool; las instancias adicionales usan
+            su propia carpeta de perfil, porque Chrome no comparte un user-data-dir entre procesos
+        bloqueo (bool): Aplicar el perfil de bloqueo de recursos del banco (None = según [bloqueo])
+        red_en_log (bool): Incluir los eventos de red en el log de rendimiento (para medir bytes)
+
+    Returns:
+        webdriver.Chrome: Driver configurado
+    """
+    logger.info(f"Creando Chrome WebDriver con stealth (perfil {perfil}, instancia {indice})")
+    definicion = PERFILES[perfil]
+    options = webdriver.ChromeOptions()
+
+    if definicion["clave_perfil"]:
+        profile_dir = str(Path(cfg['rutas'][definicion["clave_perfil"]]).absolute())
+        if indice:
+            profile_dir = f"{profile_dir}_{indice}"
+        options.add_argument(f"user-data-dir={profile_dir}")
+
+    # Argumentos anti-detección
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    for argumento in definicion["argumentos"]:
+        options.add_argument(argumento)
+    options.add_argument(f"user-agent={definicion['user_agent']}")
+    options.add_argument("--headless")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--start-maximized")
+    # Con 'eager' o 'none', driver.get() vuelve antes del evento load; cada página declara en
+    # utilidades/paginas.py cuándo está lista para interactuar
+    options.page_load_strategy = estrategia_carga(cfg)
+
+    prefs = {
+        "credentials_enable_service": False,
+        "profile.password_manager_enabled": False,
+        "profile.default_content_setting_values.notifications": 2,
+        "profile.default_content_settings.popups": 0,
+        "profile.managed_default_content_settings.images": 1,
+        "profile.default_content_setting_values.cookies": 1,
+        "profile.block_third_party_cookies": False
+    }
+    if ruta_descarga:
+        prefs["download.default_directory"] = str(Path(ruta_descarga).absolute())
+    prefs.update(definicion["prefs"])
+    options.add_experimental_option("prefs", prefs)
+    # Log de rendimiento con los eventos de página, de donde SeguidorDescargas lee el progreso de las descargas
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": red_en_log, "enablePage": True})
+
+    # Set longer timeout for ChromeDriver installation
+    os.environ['PYDEVD_WARN_EVALUATION_TIMEOUT'] = '30'  # 30 seconds timeout
+    os.environ['PYDEVD_UNBLOCK_THREADS_TIMEOUT'] = '30'  # Unblock threads after 30 seconds
+    driver = webdriver.Chrome(service=Service(ruta_chromedriver(cfg)), options=options)
+
+    # Ejecutar scripts anti-detección adicionales
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    driver.execute_script("Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]})")
+    driver.execute_script("Object.defineProperty(navigator, 'languages', {get: () => ['es-ES', 'es']})")
+    driver.execute_script("window.chrome = {runtime: {}}")
+
+    stealth(driver,
+        languages=["es-ES", "es"],
+        vendor="Google Inc.",
+        platform="Win32",
+        webgl_vendor="Intel Inc.",
+        renderer="Intel Iris OpenGL Engine",
+        fix_hairline=True,
+    )
+
+    # Peticiones en curso para MotorEsperas.red_inactiva
+    instalar_monitor_red(driver)
+
+    if bloqueo is None:
+        bloqueo = bloqueo_habilitado(cfg)
+    if bloqueo:
+        aplicar_bloqueo(driver, patrones_bloqueo(cfg, perfil))
+
+    logger.info(f"WebDriver creado y configurado con stealth (perfil {perfil}, instancia {indice})")
+    return driver
+
+def memoria_driver_mb(driver):
+    """
+    Memoria residente (MB) de ChromeDriver y de todos los procesos de Chrome que cuelgan de él.
+    """
+    try:
+        proceso = psutil.Process(driver.service.process.pid)
+        procesos = [proceso] + proceso.children(recursive=True)
+        total = 0
+        for p in procesos:
+            try:
+                total += p.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total / (1024 ** 2)
+    except Exception:
+        return 0.0
+
+class _Instancia:
+    """
+    Navegador del pool junto con su contador de usos y las descargas del arriendo actual.
+    """
+    def __init__(self, driver, indice):
+        self.driver = driver
+        self.indice = indice
+        self.usos = 0
+        self.descargas = None
+
+class PoolNavegadores:
+    """
+    Pool de navegadores Chrome con stealth para un perfil de banco.
+    Pre-lanza instancias, las presta a los bots (por bot o por reintento), limpia su estado
+    al devolverlas y las recicla tras un número de usos o si su memoria crece demasiado.
+    """
+
+    def __init__(self, cfg, perfil, tamano=1, max_usos=5, max_memoria_mb=1500, habilitado=True):
+        """
+        Args:
+            cfg: Configuración cargada
+            perfil (str): Clave de PERFILES ('bcp' o 'bbva')
+            tamano (int): Número máximo de navegadores simultáneos
+            max_usos (int): Arriendos tras los que se recicla un navegador
+            max_memoria_mb (float): Memoria a partir de la cual se recicla un navegador
+            habilitado (bool): Si es False cada arriendo lanza un Chrome nuevo y lo cierra al liberarlo
+        """
+        self.cfg = cfg
+        self.perfil = perfil
+        self.tamano = max(1, int(tamano))
+        self.max_usos = int(max_usos)
+        self.max_memoria_mb = float(max_memoria_mb)
+        self.habilitado = habilitado
+        self.condicion = threading.Condition()
+        self.libres = []
+        self.prestadas = {}
+        self.indices_libres = list(range(self.tamano))
+        self.metricas = {
+            "arriendos": 0,
+            "aciertos": 0,
+            "fallos": 0,
+            "reciclados": 0,
+            "espera_total_seg": 0.0,
+            "espera_max_seg": 0.0,
+        }
+
+    def precalentar(self, cantidad=None):
+        """
+        Lanza navegadores por adelantado hasta completar 'cantidad' instancias libres.
+        """
+        cantidad = self.tamano if cantidad is None else min(int(cantidad), self.tamano)
+        while True:
+            with self.condicion:
+                if len(self.libres) + len(self.prestadas) >= cantidad or not self.indices_libres:
+                    return
+                indice = self.indices_libres.pop(0)
+            try:
+                instancia = _Instancia(crear_driver_stealth(self.cfg, self.perfil, indice=indice), indice)
+            except Exception as e:
+                logger.warning(f"No se pudo precalentar un navegador {self.perfil}: {e}")
+                with self.condicion:
+                    self.indices_libres.append(indice)
+                    self.condicion.notify()
+                return
+            with self.condicion:
+                self.libres.append(instancia)
+                self.condicion.notify()
+            logger.info(f"Navegador {self.perfil} precalentado (instancia {indice})")
+
+    def _sigue_vivo(self, instancia):
+        try:
+            instancia.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _cerrar(self, instancia):
+        try:
+            instancia.driver.quit()
+        except Exception:
+            logger.warning(f"Error al cerrar el navegador {self.perfil} (instancia {instancia.indice})")
+
+    @trazar("arrendar_navegador", "navegador")
+    def arrendar(self, ruta_descarga, timeout=None):
+        """
+        Presta un navegador del pool, esperando si todos están ocupados.
+
+        Args:
+            ruta_descarga (str): Carpeta del bot; cada arriendo descarga en una subcarpeta propia
+            timeout (float): Segundos máximos de espera (None = sin límite)
+
+        Returns:
+            webdriver.Chrome: Driver listo para usar
+        """
+        inicio_espera = time.perf_counter()
+        instancia = None
+        indice = None
+        with self.condicion:
+            while True:
+                # Descartar instancias libres que murieron (por ejemplo, tras un pkill de chrome)
+                while self.libres:
+                    candidata = self.libres.pop()
+                    if self._sigue_vivo(candidata):
+                        instancia = candidata
+                        break
+                    logger.warning(f"Navegador {self.perfil} (instancia {candidata.indice}) no responde, se descarta")
+                    self._cerrar(candidata)
+                    self.indices_libres.append(candidata.indice)
+                if instancia or self.indices_libres:
+                    break
+                restante = None if timeout is None else timeout - (time.perf_counter() - inicio_espera)
+                if restante is not None and restante <= 0:
+                    raise TimeoutError(f"No hay navegadores {self.perfil} libres tras {timeout} s")
+                self.condicion.wait(restante)
+            acierto = instancia is not None
+            if not acierto:
+                indice = self.indices_libres.pop(0)
+
+            espera = time.perf_counter() - inicio_espera
+            self.metricas["arriendos"] += 1
+            self.metricas["espera_total_seg"] += espera
+            self.metricas["espera_max_seg"] = max(self.metricas["espera_max_seg"], espera)
+            self.metricas["aciertos" if acierto else "fallos"] += 1
+
+        if not acierto:
+            try:
+                instancia = _Instancia(crear_driver_stealth(self.cfg, self.perfil, ruta_descarga, indice), indice)
+            except Exception:
+                with self.condicion:
+                    self.indices_libres.append(indice)
+                    self.condicion.notify()
+                raise
+        instancia.usos += 1
+        carpeta = Path(ruta_descarga) / f"sesion_{datetime.now():%Y%m%d_%H%M%S_%f}_{os.getpid()}_{instancia.indice}"
+        instancia.descargas = SeguidorDescargas(instancia.driver, carpeta)
+        with self.condicion:
+            self.prestadas[id(instancia.driver)] = instancia
+        logger.info(f"Navegador {self.perfil} prestado (instancia {instancia.indice}, uso {instancia.usos}, "
+                    f"{'acierto' if acierto else 'fallo'} de pool, espera {espera:.2f} s)")
+        return instancia.driver
+
+    def descargas(self, driver):
+        """
+        Devuelve el seguidor de descargas del arriendo actual de un driver prestado.
+
+        Returns:
+            SeguidorDescargas: Descargas de la sesión, con su carpeta exclusiva
+        """
+        with self.condicion:
+            return self.prestadas[id(driver)].descargas
+
+    def _restablecer(self, driver):
+        """
+        Deja el navegador sin estado del arriendo anterior: una sola pestaña, sin cookies ni storage.
+        """
+        ventanas = driver.window_handles
+        for handle in ventanas[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(ventanas[0])
+        driver.switch_to.default_content()
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except Exception:
+            pass
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.get("about:blank")
+
+    def liberar(self, driver, descartar=False):
+        """
+        Devuelve un navegador al pool.
+
+        Args:
+            driver (webdriver.Chrome): Driver prestado por arrendar()
+            descartar (bool): Cerrar el navegador en lugar de reutilizarlo (por ejemplo, tras un error)
+        """
+        with self.condicion:
+            instancia = self.prestadas.pop(id(driver), None)
+        if instancia is None:
+            logger.warning("Se intentó liberar un driver que no pertenece al pool; se cierra")
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            return
+
+        motivo = None
+        if not self.habilitado:
+            motivo = "pool deshabilitado"
+        elif descartar:
+            motivo = "descartado tras error"
+        elif instancia.usos >= self.max_usos:
+            motivo = f"alcanzó {instancia.usos} usos"
+        else:
+            memoria = memoria_driver_mb(driver)
+            if memoria > self.max_memoria_mb:
+                motivo = f"memoria {memoria:.0f} MB > {self.max_memoria_mb:.0f} MB"
+
+        if motivo is None:
+            try:
+                self._restablecer(driver)
+            except Exception as e:
+                motivo = f"no se pudo restablecer ({e})"
+
+        with self.condicion:
+            if motivo:
+                if self.habilitado:
+                    self.metricas["reciclados"] += 1
+                logger.info(f"Cerrando navegador {self.perfil} (instancia {instancia.indice}): {motivo}")
+                self._cerrar(instancia)
+                self.indices_libres.append(instancia.indice)
+            else:
+                logger.info(f"Navegador {self.perfil} devuelto al pool (instancia {instancia.indice})")
+                self.libres.append(instancia)
+            self.condicion.notify()
+
+    def cerrar(self):
+        """
+        Cierra todos los navegadores libres del pool.
+        """
+        with self.condicion:
+            for instancia in self.libres:
+                self._cerrar(instancia)
+                self.indices_libres.append(instancia.indice)
+            self.libres = []
+
+_pools = {}
+_bloqueo_pools = threading.Lock()
+
+def obtener_pool(cfg, perfil, tamano=None):
+    """
+    Devuelve el pool de navegadores del perfil indicado, creándolo según la sección [navegador].
+
+    Args:
+        cfg: Configuración cargada
+        perfil (str): Clave de PERFILES ('bcp' o 'bbva')
+        tamano (int): Navegadores simultáneos si el pool aún no existe; por defecto pool_tamano
+
+    Returns:
+        PoolNavegadores: Pool del perfil
+    """
+    with _bloqueo_pools:
+        if perfil not in _pools:
+            seccion = cfg['navegador']
+            _pools[perfil] = PoolNavegadores(
+                cfg,
+                perfil,
+                tamano=tamano or seccion['pool_tamano'],
+                max_usos=seccion['pool_max_usos'],
+                max_memoria_mb=seccion['pool_max_memoria_mb'],
+                habilitado=str(seccion['pool_habilitado']).lower() == "true",
+            )
+        return _pools[perfil]
+
+def precalentar_pools(cfg, perfiles):
+    """
+    Lanza en segundo plano los navegadores de los perfiles indicados, para que estén listos
+    cuando los bots los pidan.
+
+    Args:
+        cfg: Configuración cargada
+        perfiles (list): Perfiles a precalentar
+    """
+    for perfil in perfiles:
+        pool = obtener_pool(cfg, perfil)
+        if pool.habilitado:
+            threading.Thread(target=pool.precalentar, name=f"precalentar-{perfil}", daemon=True).start()
+
+def metricas_pools():
+    """
+    Métricas de todos los pools: arriendos, aciertos, fallos, reciclados y tiempos de espera.
+
+    Returns:
+        dict: Métricas por perfil
+    """
+    with _bloqueo_pools:
+        return {perfil: dict(pool.metricas) for perfil, pool in _pools.items()}
+
+def cerrar_pools():
+    """
+    Cierra los navegadores libres de todos los pools.
+    """
+    with _bloqueo_pools:
+        for pool in _pools.values():
+            pool.cerrar()
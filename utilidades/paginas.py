@@ -0,0 +1,144 @@
+import logging
+import time
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from utilidades.esperas import MotorEsperas
+
+logger = logging.getLogger("Utils - Paginas")
+
+ESTRATEGIAS_CARGA = ("normal", "eager", "none")
+
+# Con las estrategias 'eager' y 'none', driver.get() no espera al evento load. Antes de navegar se
+# marca el documento actual, para que la sonda no acepte la página anterior mientras la nueva carga.
+SCRIPT_MARCAR = "window.__paginaAnterior = true;"
+SCRIPT_ES_ANTERIOR = "return window.__paginaAnterior === true;"
+
+SCRIPT_LEGACY_LISTA = """
+var legacy = document.querySelector('legacy-page');
+return !!(legacy && legacy.shadowRoot && legacy.shadowRoot.querySelector('bbva-core-iframe'));
+"""
+
+class Pagina:
+    """
+    Página conocida del portal: URL (si se llega navegando directamente) y sonda que indica
+    cuándo está lista para interactuar, sin esperar a que termine de cargar todo.
+    """
+
+    def __init__(self, nombre, sonda, url=None, presupuesto=0):
+        """
+        Args:
+            nombre (str): Nombre de la página (aparece en logs y en el resumen de esperas)
+            sonda (callable): Función que recibe el driver y devuelve un valor verdadero cuando está lista
+            url (str): URL de la página, para navegar()
+            presupuesto (float): Segundos de la pausa fija que reemplaza la sonda
+        """
+        self.nombre = nombre
+        self.sonda = sonda
+        self.url = url
+        self.presupuesto = presupuesto
+
+PAGINAS = {}
+
+def registrar_pagina(nombre, sonda, url=None, presupuesto=0):
+    PAGINAS[nombre] = Pagina(nombre, sonda, url, presupuesto)
+    return PAGINAS[nombre]
+
+def _alguna(*condiciones):
+    def condicion(driver):
+        for c in condiciones:
+            resultado = c(driver)
+            if resultado:
+                return resultado
+        return False
+    return condicion
+
+registrar_pagina(
+    "bcp_login",
+    # El campo de tarjeta, o el modal informativo que hay que cerrar antes
+    _alguna(
+        EC.element_to_be_clickable((By.XPATH, "//input[contains(@name, 'ciam-input-card')]")),
+        EC.visibility_of_element_located((By.ID, "bcp-modal-0")),
+    ),
+    url="https://www.tlcbcp.com/",
+    presupuesto=10,
+)
+registrar_pagina("bcp_cuentas", EC.presence_of_element_located((By.XPATH, "//ntlc-account-card")))
+registrar_pagina("bcp_movimientos", EC.presence_of_element_located((By.XPATH, "//input[@name='inputDateFrom']")))
+registrar_pagina(
+    "bbva_login",
+    EC.element_to_be_clickable((By.XPATH, "//input[@name='cod_emp']")),
+    url="https://www.bbvanetcash.pe",
+    presupuesto=5,
+)
+registrar_pagina("bbva_inicio", EC.presence_of_element_located((By.CSS_SELECTOR, "bbva-btge-sidebar-menu")), presupuesto=3)
+registrar_pagina("bbva_legacy", lambda d: d.execute_script(SCRIPT_LEGACY_LISTA), presupuesto=5)
+
+def estrategia_carga(cfg):
+    """
+    Returns:
+        str: Estrategia de carga de [navegador] ('normal', 'eager' o 'none')
+    """
+    estrategia = str(cfg['navegador']['estrategia_carga']).lower()
+    if estrategia not in ESTRATEGIAS_CARGA:
+        logger.warning(f"Estrategia de carga '{estrategia}' no válida, se usa 'normal'")
+        return "normal"
+    return estrategia
+
+def _marcar(driver):
+    try:
+        driver.execute_script(SCRIPT_MARCAR)
+    except Exception:
+        pass
+
+def esperar_pagina(driver, nombre, timeout=30, obligatoria=True, nueva=False):
+    """
+    Espera a que la sonda de la página se cumpla.
+
+    Args:
+        driver (webdriver.Chrome): Driver
+        nombre (str): Nombre de la página registrada
+        timeout (float): Máximo de segundos a esperar
+        obligatoria (bool): Lanzar TimeoutException si vence el timeout
+        nueva (bool): Exigir además que el documento no sea el marcado antes de navegar
+
+    Returns:
+        El valor devuelto por la sonda, o None si venció el timeout de una espera no obligatoria
+    """
+    pagina = PAGINAS[nombre]
+
+    def condicion(driver):
+        try:
+            if nueva and driver.execute_script(SCRIPT_ES_ANTERIOR):
+                return False
+            return pagina.sonda(driver)
+        except WebDriverException:
+            # Documento en plena navegación
+            return False
+
+    return MotorEsperas(driver).esperar(f"pagina_{nombre}", condicion, timeout, pagina.presupuesto, obligatoria)
+
+def navegar(driver, nombre, timeout=30, obligatoria=True, url=None):
+    """
+    Navega a la URL de la página (o a 'url', si la página no tiene una fija) y vuelve en cuanto
+    su sonda indica que se puede interactuar.
+    """
+    pagina = PAGINAS[nombre]
+    inicio = time.perf_counter()
+    _marcar(driver)
+    driver.get(url or pagina.url)
+    carga = time.perf_counter() - inicio
+    resultado = esperar_pagina(driver, nombre, timeout, obligatoria, nueva=True)
+    logger.info(f"Página '{nombre}' lista en {time.perf_counter() - inicio:.2f} s (driver.get {carga:.2f} s)")
+    return resultado
+
+def recargar(driver, nombre, timeout=30, obligatoria=True):
+    """
+    Recarga la página actual y espera la sonda de 'nombre'.
+    """
+    inicio = time.perf_counter()
+    _marcar(driver)
+    driver.refresh()
+    resultado = esperar_pagina(driver, nombre, timeout, obligatoria, nueva=True)
+    logger.info(f"Página '{nombre}' recargada y lista en {time.perf_counter() - inicio:.2f} s")
+    return resultado
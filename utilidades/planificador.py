@@ -0,0 +1,170 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("Utils - Planificador")
+
+class ExpresionCron:
+    """
+    Expresión cron de 5 campos: minuto hora día_mes mes día_semana.
+    Soporta '*', listas (1,15), rangos (8-18) y pasos (*/15, 8-18/2).
+    El día de la semana va de 0 (domingo) a 6; 7 también es domingo.
+    """
+
+    LIMITES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expresion):
+        """
+        Args:
+            expresion (str): Expresión cron, por ejemplo "0 7-20 * * 1-6"
+        """
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ValueError(f"La expresión cron debe tener 5 campos: '{expresion}'")
+        self.expresion = expresion
+        conjuntos = [self._parsear_campo(campo, minimo, maximo) for campo, (minimo, maximo) in zip(campos, self.LIMITES)]
+        self.minutos, self.horas, self.dias_mes, self.meses, self.dias_semana = conjuntos
+        if 7 in self.dias_semana:
+            self.dias_semana.add(0)
+        # Si día del mes y día de la semana están restringidos, basta con que se cumpla uno (como en cron)
+        self.dia_mes_libre = campos[2] == "*"
+        self.dia_semana_libre = campos[4] == "*"
+
+    @staticmethod
+    def _parsear_campo(campo, minimo, maximo):
+        valores = set()
+        for parte in campo.split(","):
+            paso = 1
+            if "/" in parte:
+                parte, paso = parte.split("/")
+                paso = int(paso)
+            if parte == "*":
+                inicio, fin = minimo, maximo
+            elif "-" in parte:
+                inicio, fin = (int(v) for v in parte.split("-"))
+            else:
+                inicio = fin = int(parte)
+            if inicio < minimo or fin > maximo or inicio > fin or paso < 1:
+                raise ValueError(f"Valor fuera de rango en el campo cron '{campo}'")
+            valores.update(range(inicio, fin + 1, paso))
+        return valores
+
+    def _dia_valido(self, fecha):
+        dia_mes = fecha.day in self.dias_mes
+        # isoweekday: lunes=1 ... domingo=7 -> cron: domingo=0
+        dia_semana = (fecha.isoweekday() % 7) in self.dias_semana
+        if self.dia_mes_libre and self.dia_semana_libre:
+            return True
+        if self.dia_mes_libre:
+            return dia_semana
+        if self.dia_semana_libre:
+            return dia_mes
+        return dia_mes or dia_semana
+
+    def siguiente(self, desde):
+        """
+        Calcula la siguiente fecha (estrictamente posterior a 'desde') que cumple la expresión.
+
+        Args:
+            desde (datetime): Fecha de referencia
+
+        Returns:
+            datetime: Siguiente ejecución
+        """
+        fecha = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = fecha + timedelta(days=366 * 4)
+        while fecha < limite:
+            if fecha.month not in self.meses or not self._dia_valido(fecha):
+                fecha = (fecha + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if fecha.hour not in self.horas:
+                fecha = (fecha + timedelta(hours=1)).replace(minute=0)
+                continue
+            if fecha.minute not in self.minutos:
+                fecha += timedelta(minutes=1)
+                continue
+            return fecha
+        raise ValueError(f"La expresión cron '{self.expresion}' no tiene próximas ejecuciones")
+
+class Planificador:
+    """
+    Ejecuta ciclos de forma residente, cada cierto intervalo o según una expresión cron.
+    Nunca arranca un ciclo mientras el anterior sigue en ejecución.
+    """
+
+    def __init__(self, ciclo, intervalo_minutos=None, expresion_cron=None):
+        """
+        Args:
+            ciclo (callable): Función sin argumentos que ejecuta un ciclo completo
+            intervalo_minutos (float): Minutos entre inicios de ciclo (si no hay cron)
+            expresion_cron (str): Expresión cron de 5 campos (tiene prioridad sobre el intervalo)
+        """
+        if not expresion_cron and not intervalo_minutos:
+            raise ValueError("Se requiere un intervalo en minutos o una expresión cron")
+        self.ciclo = ciclo
+        self.intervalo = timedelta(minutes=float(intervalo_minutos)) if intervalo_minutos else None
+        self.cron = ExpresionCron(expresion_cron) if expresion_cron else None
+        self.bloqueo_ciclo = threading.Lock()
+        self.detener_evento = threading.Event()
+        self.hilo_ciclo = None
+        self.numero_ciclo = 0
+
+    def proxima_ejecucion(self, desde):
+        if self.cron:
+            return self.cron.siguiente(desde)
+        return desde + self.intervalo
+
+    def _ejecutar_ciclo(self):
+        try:
+            self.ciclo()
+        except Exception as e:
+            logger.error(f"Error no controlado en el ciclo {self.numero_ciclo}: {e}")
+        finally:
+            self.bloqueo_ciclo.release()
+
+    def disparar(self):
+        """
+        Lanza un ciclo en segundo plano si no hay otro en ejecución.
+
+        Returns:
+            bool: True si se lanzó el ciclo, False si se omitió por solapamiento
+        """
+        if not self.bloqueo_ciclo.acquire(blocking=False):
+            logger.warning("El ciclo anterior sigue en ejecución; se omite este disparo")
+            return False
+        self.numero_ciclo += 1
+        self.hilo_ciclo = threading.Thread(target=self._ejecutar_ciclo, name=f"ciclo-{self.numero_ciclo}")
+        self.hilo_ciclo.start()
+        return True
+
+    def iniciar(self, ejecutar_al_inicio=True):
+        """
+        Bucle principal del modo residente. Bloquea hasta que se llame a detener().
+
+        Args:
+            ejecutar_al_inicio (bool): Lanzar un ciclo inmediatamente al arrancar
+        """
+        descripcion = f"cron '{self.cron.expresion}'" if self.cron else f"cada {self.intervalo}"
+        logger.info(f"Planificador iniciado ({descripcion})")
+        proxima = datetime.now() if ejecutar_al_inicio else self.proxima_ejecucion(datetime.now())
+        while not self.detener_evento.is_set():
+            espera = (proxima - datetime.now()).total_seconds()
+            if espera > 0:
+                logger.info(f"Próximo ciclo: {proxima.strftime('%Y-%m-%d %H:%M:%S')}")
+                if self.detener_evento.wait(espera):
+                    break
+            self.disparar()
+            proxima = self.proxima_ejecucion(max(proxima, datetime.now()))
+
+        # Esperar a que termine el ciclo en curso antes de salir
+        if self.hilo_ciclo and self.hilo_ciclo.is_alive():
+            logger.info("Esperando a que termine el ciclo en curso...")
+            self.hilo_ciclo.join()
+        logger.info("Planificador detenido")
+
+    def detener(self, *args):
+        """
+        Solicita detener el planificador. Se puede usar como manejador de señales.
+        """
+        logger.info("Solicitud de detención del planificador recibida")
+        self.detener_evento.set()
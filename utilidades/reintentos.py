@@ -0,0 +1,235 @@
+import logging
+import random
+import threading
+import time
+from utilidades.metricas import RegistroMetricas, registrar_resumen
+
+logger = logging.getLogger("Utils - Reintentos")
+
+class PresupuestoAgotado(Exception):
+    """
+    Se lanza cuando la ejecución ya consumió todos los reintentos o segundos de reintento permitidos.
+    Nunca se reintenta, así atraviesa todas las capas anidadas de reintentos.
+    """
+
+class PresupuestoReintentos:
+    """
+    Presupuesto de reintentos compartido por todas las capas anidadas (bot, flujo, login, paso)
+    durante una ejecución. Cada reintento consume una unidad y su tiempo de espera.
+    """
+
+    def __init__(self, maximo_reintentos, maximo_segundos):
+        """
+        Args:
+            maximo_reintentos (int): Reintentos permitidos en la ejecución
+            maximo_segundos (float): Segundos de espera entre reintentos permitidos en la ejecución
+        """
+        self.maximo_reintentos = int(maximo_reintentos)
+        self.maximo_segundos = float(maximo_segundos)
+        self.reintentos = 0
+        self.segundos = 0.0
+        self.bloqueo = threading.Lock()
+
+    def consumir(self, espera):
+        """
+        Reserva un reintento con la espera indicada.
+
+        Returns:
+            bool: True si quedaba presupuesto, False si se agotó
+        """
+        with self.bloqueo:
+            if self.reintentos >= self.maximo_reintentos or self.segundos + espera > self.maximo_segundos:
+                return False
+            self.reintentos += 1
+            self.segundos += espera
+            return True
+
+    def disponible(self):
+        with self.bloqueo:
+            return {
+                "reintentos": self.maximo_reintentos - self.reintentos,
+                "segundos": round(self.maximo_segundos - self.segundos, 1),
+            }
+
+# Errores de programación o de configuración: reintentarlos solo pierde tiempo
+NO_REINTENTABLES = (KeyError, TypeError, NameError)
+
+_presupuesto = None
+_registros = RegistroMetricas()
+
+class PoliticaReintentos:
+    """
+    Política de reintentos con backoff exponencial, jitter y clases de excepción reintentables.
+    Todos los reintentos descuentan del presupuesto de la ejecución (si está configurado).
+    """
+
+    def __init__(self, intentos=3, espera_base=2.0, factor=2.0, espera_maxima=30.0, jitter=0.5,
+                 reintentables=(Exception,), no_reintentables=NO_REINTENTABLES, presupuesto=None):
+        """
+        Args:
+            intentos (int): Intentos totales, incluido el primero
+            espera_base (float): Espera antes del primer reintento, en segundos
+            factor (float): Multiplicador de la espera en cada reintento
+            espera_maxima (float): Tope de la espera entre reintentos
+            jitter (float): Variación aleatoria relativa de la espera (0.5 = ±50 %)
+            reintentables (tuple): Excepciones que se reintentan
+            no_reintentables (tuple): Excepciones que se propagan de inmediato aunque hereden de una reintentable
+            presupuesto (PresupuestoReintentos): Presupuesto compartido; por defecto el de la ejecución actual
+        """
+        self.intentos = max(1, int(intentos))
+        self.espera_base = float(espera_base)
+        self.factor = float(factor)
+        self.espera_maxima = float(espera_maxima)
+        self.jitter = float(jitter)
+        self.reintentables = reintentables
+        self.no_reintentables = (PresupuestoAgotado,) + tuple(no_reintentables)
+        self.presupuesto = presupuesto
+
+    def espera(self, reintento):
+        """
+        Calcula la espera antes del reintento número 'reintento' (empezando en 1).
+        """
+        espera = min(self.espera_maxima, self.espera_base * self.factor ** (reintento - 1))
+        return max(0.0, espera * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def es_reintentable(self, excepcion):
+        return isinstance(excepcion, self.reintentables) and not isinstance(excepcion, self.no_reintentables)
+
+    def ejecutar(self, paso, accion, antes_de_reintentar=None, reintentar_si=None):
+        """
+        Ejecuta la acción aplicando la política.
+
+        Args:
+            paso (str): Nombre del paso (aparece en logs y en el resumen)
+            accion (callable): Función sin argumentos a ejecutar
+            antes_de_reintentar (callable): Función sin argumentos que se llama antes de cada reintento
+                (por ejemplo refrescar la página)
+            reintentar_si (callable): Recibe el resultado y devuelve True si hay que reintentar aunque no hubo excepción
+
+        Returns:
+            El resultado de la acción (el último si se agotaron los intentos por resultado)
+
+        Raises:
+            La última excepción si no es reintentable o se agotaron los intentos;
+            PresupuestoAgotado si se agotó el presupuesto de la ejecución
+        """
+        presupuesto = self.presupuesto or _presupuesto
+        for intento in range(1, self.intentos + 1):
+            inicio = time.perf_counter()
+            try:
+                resultado = accion()
+                if reintentar_si is None or not reintentar_si(resultado):
+                    _registrar(paso, 0.0, exito=True)
+                    return resultado
+                motivo = f"resultado no válido ({resultado!r})"
+                error = None
+            except Exception as e:
+                if not self.es_reintentable(e):
+                    _registrar(paso, time.perf_counter() - inicio, exito=False)
+                    raise
+                motivo = str(e)
+                error = e
+            duracion_fallida = time.perf_counter() - inicio
+
+            if intento == self.intentos:
+                _registrar(paso, duracion_fallida, exito=False)
+                logger.error(f"'{paso}' falló tras {intento} intentos: {motivo}")
+                if error is not None:
+                    raise error
+                return resultado
+
+            espera = self.espera(intento)
+            if presupuesto is not None and not presupuesto.consumir(espera):
+                _registrar(paso, duracion_fallida, exito=False)
+                logger.error(f"Presupuesto de reintentos agotado en '{paso}': {motivo}")
+                raise PresupuestoAgotado(f"Presupuesto de reintentos agotado en '{paso}': {motivo}") from error
+
+            logger.warning(f"'{paso}' falló (intento {intento}/{self.intentos}): {motivo}. Reintento en {espera:.1f} s")
+            time.sleep(espera)
+            if antes_de_reintentar is not None:
+                try:
+                    antes_de_reintentar()
+                except Exception as e:
+                    logger.warning(f"Error preparando el reintento de '{paso}': {e}")
+            _registrar(paso, time.perf_counter() - inicio, exito=None)
+
+def configurar_presupuesto(cfg, factor=1):
+    """
+    Crea un presupuesto nuevo para la ejecución actual con los valores de [reintentos].
+    Se llama al inicio de cada ciclo (y de cada bot en los procesos del modo paralelo).
+
+    Args:
+        cfg: Configuración cargada
+        factor (int): Ejecuciones que cubre el presupuesto (el backfill usa uno por tramo)
+
+    Returns:
+        PresupuestoReintentos: Presupuesto activo
+    """
+    global _presupuesto
+    _presupuesto = PresupuestoReintentos(
+        int(cfg['reintentos']['presupuesto_reintentos']) * factor, float(cfg['reintentos']['presupuesto_segundos']) * factor
+    )
+    return _presupuesto
+
+def crear_politica(cfg, intentos=None, **kwargs):
+    """
+    Crea una política con los parámetros de backoff de [reintentos].
+
+    Args:
+        cfg: Configuración cargada
+        intentos (int): Intentos totales; por defecto reintentos_max
+        **kwargs: Parámetros adicionales de PoliticaReintentos (reintentables, no_reintentables...)
+
+    Returns:
+        PoliticaReintentos
+    """
+    parametros = {
+        "intentos": intentos if intentos is not None else cfg['reintentos']['reintentos_max'],
+        "espera_base": cfg['reintentos']['espera_base'],
+        "espera_maxima": cfg['reintentos']['espera_maxima'],
+        "jitter": cfg['reintentos']['jitter'],
+    }
+    parametros.update(kwargs)
+    return PoliticaReintentos(**parametros)
+
+def _registrar(paso, segundos, exito):
+    """
+    exito=True/False cierra la ejecución del paso; exito=None registra un reintento.
+    'segundos' es el tiempo perdido: intento fallido más espera y preparación del reintento.
+    """
+    _registros.agregar(paso, segundos, exito)
+
+def resumen_reintentos(reiniciar=False):
+    """
+    Returns:
+        dict: Por paso: ejecuciones, reintentos, fallos y segundos gastados en intentos fallidos y esperas
+    """
+    resumen = {}
+    for paso, segundos, exito in _registros.tomar(reiniciar):
+        item = resumen.setdefault(paso, {"ejecuciones": 0, "reintentos": 0, "fallos": 0, "segundos_reintentando": 0.0})
+        item["segundos_reintentando"] += segundos
+        if exito is None:
+            item["reintentos"] += 1
+            continue
+        item["ejecuciones"] += 1
+        if not exito:
+            item["fallos"] += 1
+    for item in resumen.values():
+        item["segundos_reintentando"] = round(item["segundos_reintentando"], 1)
+    return resumen
+
+def registrar_resumen_reintentos(titulo="Reintentos"):
+    """
+    Escribe en el log los pasos que necesitaron reintentos y vacía las estadísticas.
+    """
+    resumen = resumen_reintentos(reiniciar=True)
+    con_reintentos = {paso: item for paso, item in resumen.items() if item["reintentos"] or item["fallos"]}
+    total_reintentos = sum(item["reintentos"] for item in resumen.values())
+    total_segundos = sum(item["segundos_reintentando"] for item in resumen.values())
+    restante = _presupuesto.disponible() if _presupuesto else None
+    logger.info(f"{titulo}: {total_reintentos} reintentos, {total_segundos:.1f} s reintentando, presupuesto restante {restante}")
+    for paso, item in con_reintentos.items():
+        logger.info(f"  {paso}: {item}")
+    return resumen
+
+registrar_resumen("Reintentos", registrar_resumen_reintentos)
@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from utilidades.trazas import trazar
+
+logger = logging.getLogger("Utils - Sesiones")
+
+# Campos que acepta Network.setCookies de los que devuelve Network.getAllCookies
+CAMPOS_COOKIE = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+SCRIPT_LEER_STORAGE = """
+var leer = function(storage) {
+    var datos = {};
+    for (var i = 0; i < storage.length; i++) {
+        var clave = storage.key(i);
+        datos[clave] = storage.getItem(clave);
+    }
+    return datos;
+};
+return {origen: window.location.origin, local: leer(window.localStorage), session: leer(window.sessionStorage)};
+"""
+
+class AlmacenSesiones:
+    """
+    Guarda en disco las cookies y el storage de un login exitoso y los restaura en el siguiente
+    arriendo del navegador, para evitar repetir el login completo mientras la sesión siga viva.
+    """
+
+    def __init__(self, ruta_sesiones, ttl_minutos=240):
+        """
+        Args:
+            ruta_sesiones (str): Carpeta donde se guardan los archivos de sesión
+            ttl_minutos (float): Antigüedad máxima de una sesión guardada
+        """
+        self.ruta_sesiones = Path(ruta_sesiones)
+        self.ttl_segundos = float(ttl_minutos) * 60
+
+    def _archivo(self, clave):
+        return self.ruta_sesiones / f"{clave}.json"
+
+    def guardar(self, driver, clave):
+        """
+        Guarda cookies (de todos los dominios), localStorage, sessionStorage y la URL actual.
+
+        Args:
+            driver (webdriver.Chrome): Driver con la sesión autenticada
+            clave (str): Identificador de la sesión (por ejemplo 'bcp' o 'bbva')
+        """
+        try:
+            cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+            storage = driver.execute_script(SCRIPT_LEER_STORAGE)
+            datos = {
+                "guardada": time.time(),
+                "url": driver.current_url,
+                "cookies": [{k: c[k] for k in CAMPOS_COOKIE if k in c and not (k == "expires" and c.get("session"))} for c in cookies],
+                "storage": storage,
+            }
+            self.ruta_sesiones.mkdir(parents=True, exist_ok=True)
+            archivo = self._archivo(clave)
+            temporal = archivo.with_suffix(".tmp")
+            temporal.unlink(missing_ok=True)
+            # Las cookies dan acceso a la banca: el archivo nace legible solo por el usuario del proceso
+            descriptor = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                json.dump(datos, f)
+            # Reemplazo atómico: una ejecución interrumpida no deja una sesión a medias
+            os.replace(temporal, archivo)
+            logger.info(f"Sesión '{clave}' guardada ({len(datos['cookies'])} cookies)")
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la sesión '{clave}': {e}")
+
+    def restaurar(self, driver, clave):
+        """
+        Carga cookies y storage guardados y navega a la última URL autenticada.
+        No comprueba si la sesión sigue viva: eso lo hace la sonda de cada banco.
+
+        Args:
+            driver (webdriver.Chrome): Driver recién arrendado
+            clave (str): Identificador de la sesión
+
+        Returns:
+            bool: True si había una sesión vigente y se restauró
+        """
+        archivo = self._archivo(clave)
+        if not archivo.exists():
+            logger.info(f"No hay sesión guardada para '{clave}'")
+            return False
+        try:
+            with open(archivo, encoding="utf-8") as f:
+                datos = json.load(f)
+            antiguedad = time.time() - datos["guardada"]
+            if antiguedad > self.ttl_segundos:
+                logger.info(f"Sesión '{clave}' caducada ({antiguedad / 60:.0f} min)")
+                self.invalidar(clave)
+                return False
+
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": datos["cookies"]})
+
+            # El storage se inyecta antes de que corran los scripts de la página, así basta una navegación
+            storage = datos.get("storage") or {}
+            script = (
+                "if (window.location.origin === %s) {"
+                " var l = %s, s = %s;"
+                " for (var k in l) { window.localStorage.setItem(k, l[k]); }"
+                " for (var k in s) { window.sessionStorage.setItem(k, s[k]); }"
+                "}"
+            ) % (json.dumps(storage.get("origen")), json.dumps(storage.get("local", {})), json.dumps(storage.get("session", {})))
+            inyeccion = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": script})
+            try:
+                driver.get(datos["url"])
+            finally:
+                driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": inyeccion["identifier"]})
+            logger.info(f"Sesión '{clave}' restaurada ({antiguedad / 60:.0f} min de antigüedad)")
+            return True
+        except Exception as e:
+            logger.warning(f"No se pudo restaurar la sesión '{clave}': {e}")
+            return False
+
+    def invalidar(self, clave):
+        """
+        Elimina la sesión guardada.
+        """
+        try:
+            self._archivo(clave).unlink()
+            logger.info(f"Sesión '{clave}' invalidada")
+        except FileNotFoundError:
+            pass
+
+@trazar(categoria="sesiones")
+def iniciar_sesion(driver, cfg, clave, sonda, login):
+    """
+    Intenta reutilizar la sesión guardada y solo hace el login completo si la sonda indica
+    que ya no está autenticada. Tras un login completo guarda la nueva sesión.
+
+    Args:
+        driver (webdriver.Chrome): Driver arrendado
+        cfg: Configuración cargada
+        clave (str): Identificador de la sesión ('bcp' o 'bbva')
+        sonda (callable): Función sin argumentos y de solo lectura que devuelve True si la página
+            muestra una sesión autenticada; si lanza una excepción, la sesión se da por vencida
+        login (callable): Función sin argumentos que hace el login completo
+
+    Returns:
+        bool: True si se reutilizó la sesión, False si se hizo login completo
+    """
+    habilitado = str(cfg['sesiones']['habilitado']).lower() == "true"
+    almacen = AlmacenSesiones(cfg['rutas']['ruta_sesiones'], cfg['sesiones']['ttl_minutos'])
+    if habilitado and almacen.restaurar(driver, clave):
+        inicio_sonda = time.perf_counter()
+        try:
+            autenticada = sonda()
+        except Exception as e:
+            logger.warning(f"La sonda de la sesión '{clave}' falló: {e}")
+            autenticada = False
+        if autenticada:
+            logger.info(f"Sesión '{clave}' reutilizada, se omite el login (sonda {time.perf_counter() - inicio_sonda:.1f} s)")
+            return True
+        logger.info(f"La sesión '{clave}' ya no está autenticada, se hace login completo")
+        almacen.invalidar(clave)
+
+    login()
+    if habilitado:
+        almacen.guardar(driver, clave)
+    return False
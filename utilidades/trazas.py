@@ -0,0 +1,148 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger("Utils - Trazas")
+
+_eventos = []
+_bloqueo_eventos = threading.Lock()
+_hilos_nombrados = set()
+
+def _ahora_us():
+    # Reloj de pared en microsegundos: es comparable entre los procesos del modo paralelo
+    return time.time_ns() // 1000
+
+@contextmanager
+def span(nombre, categoria="bot", **atributos):
+    """
+    Mide un paso lógico y lo registra como evento completo ("ph": "X") del formato Chrome trace.
+
+    Args:
+        nombre (str): Nombre del paso (por ejemplo 'login' o 'descarga_fichero')
+        categoria (str): Categoría del evento (bot, entrega, orquestador...)
+        **atributos: Atributos adicionales que se guardan en 'args'
+
+    Yields:
+        dict: Atributos del span; se pueden agregar valores durante el paso
+    """
+    hilo = threading.current_thread()
+    inicio_us = _ahora_us()
+    inicio = time.perf_counter()
+    try:
+        yield atributos
+    except BaseException as e:
+        atributos["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        evento = {
+            "name": nombre,
+            "cat": categoria,
+            "ph": "X",
+            "ts": inicio_us,
+            "dur": int((time.perf_counter() - inicio) * 1_000_000),
+            "pid": os.getpid(),
+            "tid": hilo.ident,
+            "args": {k: v if isinstance(v, (int, float, bool, type(None))) else str(v) for k, v in atributos.items()},
+        }
+        with _bloqueo_eventos:
+            if (evento["pid"], evento["tid"]) not in _hilos_nombrados:
+                _hilos_nombrados.add((evento["pid"], evento["tid"]))
+                _eventos.append({"name": "thread_name", "ph": "M", "pid": evento["pid"], "tid": evento["tid"],
+                                 "args": {"name": hilo.name}})
+            _eventos.append(evento)
+
+def trazar(nombre=None, categoria="bot"):
+    """
+    Decorador que envuelve cada llamada de la función en un span con su nombre.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with span(nombre or funcion.__name__, categoria):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+def exportar_eventos(reiniciar=True):
+    """
+    Devuelve los eventos registrados en este proceso. Los procesos del modo paralelo
+    los devuelven al orquestador para incorporarlos a la traza del ciclo.
+
+    Returns:
+        list: Eventos en formato Chrome trace
+    """
+    with _bloqueo_eventos:
+        eventos = list(_eventos)
+        if reiniciar:
+            _eventos.clear()
+            _hilos_nombrados.clear()
+    return eventos
+
+def incorporar_eventos(eventos):
+    """
+    Agrega a este proceso eventos exportados por otro proceso.
+    """
+    with _bloqueo_eventos:
+        _eventos.extend(eventos)
+
+def resumen_spans(eventos):
+    """
+    Aplana los spans a una lista legible y acumula totales por nombre.
+
+    Returns:
+        dict: {"spans": [...], "por_paso": {"categoria/nombre": {veces, total_seg, max_seg, errores}}}
+    """
+    spans = []
+    por_paso = {}
+    for evento in sorted((e for e in eventos if e["ph"] == "X"), key=lambda e: e["ts"]):
+        segundos = evento["dur"] / 1_000_000
+        spans.append({
+            "nombre": evento["name"],
+            "categoria": evento["cat"],
+            "inicio": datetime.fromtimestamp(evento["ts"] / 1_000_000).isoformat(timespec="milliseconds"),
+            "duracion_seg": round(segundos, 3),
+            "pid": evento["pid"],
+            "atributos": evento["args"],
+        })
+        item = por_paso.setdefault(f"{evento['cat']}/{evento['name']}", {"veces": 0, "total_seg": 0.0, "max_seg": 0.0, "errores": 0})
+        item["veces"] += 1
+        item["total_seg"] = round(item["total_seg"] + segundos, 3)
+        item["max_seg"] = round(max(item["max_seg"], segundos), 3)
+        item["errores"] += 1 if "error" in evento["args"] else 0
+    return {"spans": spans, "por_paso": por_paso}
+
+def guardar_traza(cfg):
+    """
+    Escribe la traza del ciclo (traza_<fecha>.json, se abre en chrome://tracing o Perfetto)
+    y su resumen plano (resumen_<fecha>.json) en ruta_trazas, y vacía los eventos.
+
+    Returns:
+        Path: Ruta del archivo de traza, o None si las trazas están deshabilitadas o no hay eventos
+    """
+    eventos = exportar_eventos(reiniciar=True)
+    if str(cfg['trazas']['habilitado']).lower() != "true" or not eventos:
+        return None
+    try:
+        carpeta = Path(cfg['rutas']['ruta_trazas'])
+        carpeta.mkdir(parents=True, exist_ok=True)
+        sello = datetime.now().strftime("%Y%m%d_%H%M%S")
+        for pid in {e["pid"] for e in eventos}:
+            eventos.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                            "args": {"name": "orquestador" if pid == os.getpid() else f"trabajador {pid}"}})
+
+        archivo_traza = carpeta / f"traza_{sello}.json"
+        with open(archivo_traza, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": eventos, "displayTimeUnit": "ms"}, f)
+        with open(carpeta / f"resumen_{sello}.json", "w", encoding="utf-8") as f:
+            json.dump(resumen_spans(eventos), f, ensure_ascii=False, indent=2)
+        logger.info(f"Traza del ciclo guardada en {archivo_traza}")
+        return archivo_traza
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la traza: {e}")
+        return None